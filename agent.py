@@ -6,7 +6,7 @@ import logging
 # Add the current directory to the Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from app.controllers.rag_controller import ask_question, get_context
+from app.controllers.rag_controller import answer_with_context
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -33,12 +33,15 @@ def run(env: Environment):
         logger.info(f"Received user query: '{query}'")
         
         try:
-            # Step 1: Retrieve relevant context chunks FIRST - this is the critical RAG step
+            # Step 1: Retrieve context and answer from it in one go - a single retrieval per turn
             logger.info(f"Retrieving context for query")
-            context_chunks = get_context(query, k=5)
+            rag_result = answer_with_context(query, k=5)
+            context_chunks = [chunk.text for chunk in rag_result["chunks"]]
             
             # Step 2: Check if we have any relevant context
-            if not context_chunks or len(context_chunks) == 0:
+            if rag_result["error"]:
+                raise RuntimeError(rag_result["error"])
+            elif not context_chunks:
                 logger.warning("No relevant context found in vector store")
                 # If no context is found, respond with "I don't know"
                 no_info_message = {
@@ -47,13 +50,13 @@ def run(env: Environment):
                 }
                 result = env.completion([system_prompt, no_info_message] + env.list_messages())
             else:
-                # Step 3: Only when we have context, get a direct answer
-                logger.info(f"Found {len(context_chunks)} relevant chunks, getting direct answer")
-                direct_answer = ask_question(query)
+                # Step 3: Use the direct answer built from the same chunks
+                logger.info(f"Found {len(context_chunks)} relevant chunks")
+                direct_answer = rag_result["answer"]
                 
                 # Log chunks for debugging
-                for i, chunk in enumerate(context_chunks):
-                    logger.debug(f"Context chunk {i+1}: {chunk[:100]}...")
+                for i, chunk in enumerate(rag_result["chunks"]):
+                    logger.debug(f"Context chunk {i+1} (score {chunk.score:.3f}, {chunk.source}): {chunk.text[:100]}...")
                 
                 # Step 4: Create context message with both the direct answer and supporting chunks
                 context_message = {
@@ -0,0 +1,95 @@
+from quart import Quart, jsonify, render_template
+import os
+import sys
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config.config import (FLASK_HOST, FLASK_PORT, FLASK_DEBUG, WARM_UP_ON_START, WARM_UP_IN_BACKGROUND,
+                               validate_config)
+from app.controllers.vector_controller import warm_up_vector_db, start_background_warm_up, get_readiness
+from app.utils.memory import process_memory
+from app.routes.async_routes import async_rag_blueprint, async_vector_blueprint
+
+def create_async_app(warm_up=WARM_UP_ON_START, background_warm_up=WARM_UP_IN_BACKGROUND):
+    """
+    Create and configure the async (ASGI) application
+
+    Serves the same routes as app.server.create_app, but request handlers
+    await embedding and vector store lookups on bounded executors instead
+    of blocking a worker thread each.
+
+    Args:
+        warm_up: Whether to build the shared vector database client now
+        background_warm_up: Warm up on a background thread instead of blocking
+
+    Returns:
+        Quart application instance
+    """
+    app = Quart(__name__,
+                static_folder='static',
+                template_folder='templates')
+
+    # Register blueprints
+    app.register_blueprint(async_rag_blueprint, url_prefix='/api/rag')
+    app.register_blueprint(async_vector_blueprint, url_prefix='/api/vector')
+
+    # Load the embedding model once, before the first request arrives
+    if warm_up and background_warm_up:
+        start_background_warm_up()
+    elif warm_up:
+        warm_up_vector_db()
+
+    # Home route for the chat interface
+    @app.route('/', methods=['GET'])
+    async def home():
+        return await render_template('chat.html')
+
+    # Health check endpoint, doubling as the readiness probe: 503 until warm-up finishes
+    @app.route('/health', methods=['GET'])
+    async def health_check():
+        ready, details = get_readiness()
+        if not ready:
+            return jsonify({"status": details["state"], "error": details.get("error"), "pid": os.getpid()}), 503
+        return jsonify({"status": "healthy", "pid": os.getpid()}), 200
+
+    # Memory of the worker process that handled the request
+    @app.route('/health/memory', methods=['GET'])
+    async def memory_usage():
+        memory = process_memory()
+        if memory is None:
+            return jsonify({"error": "Memory accounting requires /proc"}), 501
+        return jsonify(memory), 200
+
+    # Error handlers
+    @app.errorhandler(404)
+    async def not_found(error):
+        return jsonify({"error": "Not found"}), 404
+
+    @app.errorhandler(500)
+    async def server_error(error):
+        return jsonify({"error": "Internal server error"}), 500
+
+    return app
+
+def main():
+    """
+    Main entry point for the async server
+
+    For deployment, serve the app with an ASGI server instead, e.g.
+    hypercorn "app.async_server:create_async_app()"
+    """
+    try:
+        # Validate configuration
+        validate_config()
+
+        # Create and run the app
+        app = create_async_app()
+        app.run(host=FLASK_HOST, port=FLASK_PORT, debug=FLASK_DEBUG)
+
+    except Exception as e:
+        print(f"Error starting server: {str(e)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -9,17 +9,127 @@ PINECONE_API_KEY = os.environ.get('PINECONE_API_KEY', '')
 PINECONE_ENVIRONMENT = os.environ.get('PINECONE_ENVIRONMENT', 'gcp-starter')
 PINECONE_INDEX_NAME = os.environ.get('PINECONE_INDEX_NAME', 'sfold')
 
+# Vector index backend: 'pinecone' (hosted) or 'local' (in-process exact search
+# over a memory-mapped NumPy matrix, no network needed)
+VECTOR_BACKEND = os.environ.get('VECTOR_BACKEND', 'pinecone').lower()
+LOCAL_INDEX_PATH = os.environ.get('LOCAL_INDEX_PATH', os.path.join('local_index', PINECONE_INDEX_NAME))
+# Approximate search for the local backend: 'ivf' or 'none' (exact). NLIST=0 picks ~sqrt(n) lists;
+# higher NPROBE scans more lists per query for better recall at higher latency
+LOCAL_INDEX_ANN = os.environ.get('LOCAL_INDEX_ANN', 'none').lower()
+LOCAL_INDEX_NLIST = int(os.environ.get('LOCAL_INDEX_NLIST', '0'))
+LOCAL_INDEX_NPROBE = int(os.environ.get('LOCAL_INDEX_NPROBE', '8'))
+# Compact codes the local backend ranks the corpus with: 'none', 'int8' or 'binary'.
+# The best top_k * RESCORE_FACTOR rows are rescored with the float32 vectors
+# (0 picks a default per quantization: 4 for int8, 16 for binary)
+LOCAL_INDEX_QUANTIZATION = os.environ.get('LOCAL_INDEX_QUANTIZATION', 'none').lower()
+LOCAL_INDEX_RESCORE_FACTOR = int(os.environ.get('LOCAL_INDEX_RESCORE_FACTOR', '0'))
+
+# Embedding model and how it runs: 'torch' (full-precision PyTorch), or 'onnx' /
+# 'onnx-int8' (ONNX Runtime on CPU, float32 or dynamic int8 quantization). ONNX
+# exports are written to EMBEDDING_ONNX_DIR on first use and checked against
+# the PyTorch model. EMBEDDING_THREADS fixes the inference threads (0 for the
+# library default, one per core)
+EMBEDDING_MODEL = os.environ.get('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+EMBEDDING_BACKEND = os.environ.get('EMBEDDING_BACKEND', 'torch').lower()
+EMBEDDING_THREADS = int(os.environ.get('EMBEDDING_THREADS', '0'))
+EMBEDDING_ONNX_DIR = os.environ.get('EMBEDDING_ONNX_DIR', 'onnx_models')
+
+# BM25 index over the same chunks, built during ingestion (empty to disable it)
+LEXICAL_INDEX_PATH = os.environ.get('LEXICAL_INDEX_PATH', os.path.join('lexical_index', PINECONE_INDEX_NAME))
+# Default retrieval mode: 'dense' (embeddings only) or 'hybrid' (dense fused with
+# BM25 by reciprocal rank fusion); /api/rag/context can pick one per request
+RETRIEVAL_MODES = ('dense', 'hybrid')
+RETRIEVAL_MODE = os.environ.get('RETRIEVAL_MODE', 'dense').lower()
+# Time BM25 scoring may take per hybrid query before remaining query terms are skipped
+HYBRID_BUDGET_MS = float(os.environ.get('HYBRID_BUDGET_MS', '3'))
+HYBRID_RRF_K = int(os.environ.get('HYBRID_RRF_K', '60'))
+
+# Optional cross-encoder re-ranking: over-fetch RERANK_CANDIDATES chunks, re-score
+# them in batches and keep the best k; if scoring would exceed RERANK_BUDGET_MS the
+# bi-encoder order is returned instead
+RERANK_ENABLED = os.environ.get('RERANK_ENABLED', 'False').lower() == 'true'
+RERANK_MODEL = os.environ.get('RERANK_MODEL', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+RERANK_CANDIDATES = int(os.environ.get('RERANK_CANDIDATES', '20'))
+RERANK_BATCH_SIZE = int(os.environ.get('RERANK_BATCH_SIZE', '16'))
+RERANK_BUDGET_MS = float(os.environ.get('RERANK_BUDGET_MS', '150'))
+# Number of (query, chunk) scores kept in memory (0 disables the cache)
+RERANK_CACHE_SIZE = int(os.environ.get('RERANK_CACHE_SIZE', '8192'))
+
 # Directory containing PDF files
 PDF_DIRECTORY = os.environ.get('PDF_DIRECTORY', 'sFold-Data')
 
+# On-disk cache of extracted text and chunk embeddings used during ingestion
+# (set INGEST_CACHE_DIR to an empty string to disable it)
+INGEST_CACHE_DIR = os.environ.get('INGEST_CACHE_DIR', '.ingest_cache')
+INGEST_CACHE_MAX_MB = int(os.environ.get('INGEST_CACHE_MAX_MB', 1024))
+
+# Local record of the chunk IDs held by the index, used by sync mode
+INDEX_MANIFEST_PATH = os.environ.get('INDEX_MANIFEST_PATH', f'index_manifest_{PINECONE_INDEX_NAME}.json')
+
+# Progress journal of uploads, read back by --resume after an interrupted run
+INGEST_CHECKPOINT_PATH = os.environ.get('INGEST_CHECKPOINT_PATH', f'.ingest_checkpoint_{PINECONE_INDEX_NAME}.jsonl')
+
+# Number of query embeddings kept in memory by PineconeVectorDB (0 disables the cache)
+QUERY_EMBEDDING_CACHE_SIZE = int(os.environ.get('QUERY_EMBEDDING_CACHE_SIZE', 1024))
+
+# Retrieval results cache; entries expire after the TTL and are dropped whenever
+# ingestion bumps the index version file
+RETRIEVAL_CACHE_TTL = float(os.environ.get('RETRIEVAL_CACHE_TTL', 300))
+RETRIEVAL_CACHE_MAX_MB = int(os.environ.get('RETRIEVAL_CACHE_MAX_MB', 64))
+INDEX_VERSION_PATH = os.environ.get('INDEX_VERSION_PATH', f'.index_version_{PINECONE_INDEX_NAME}')
+
+# Micro-batching of query embeddings across concurrent requests: wait up to
+# MAX_WAIT_MS for up to MAX_BATCH queries, then encode them together
+# (EMBED_BATCHER_MAX_BATCH=1 disables it)
+EMBED_BATCHER_MAX_BATCH = int(os.environ.get('EMBED_BATCHER_MAX_BATCH', '32'))
+EMBED_BATCHER_MAX_WAIT_MS = float(os.environ.get('EMBED_BATCHER_MAX_WAIT_MS', '5'))
+
+# Maximum number of queries accepted by /api/vector/query_batch
+QUERY_BATCH_MAX_SIZE = int(os.environ.get('QUERY_BATCH_MAX_SIZE', '64'))
+
+# Async serving mode (main.py --api --async): threads encoding queries and
+# threads waiting on vector store lookups
+EMBED_EXECUTOR_WORKERS = int(os.environ.get('EMBED_EXECUTOR_WORKERS', '2'))
+VECTOR_IO_WORKERS = int(os.environ.get('VECTOR_IO_WORKERS', '16'))
+
 # Flask Configuration
 FLASK_HOST = os.environ.get('FLASK_HOST', '0.0.0.0')
 FLASK_PORT = int(os.environ.get('FLASK_PORT', 5000))
 FLASK_DEBUG = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
 
+# Load the embedding model and connect to the index when the app is created,
+# instead of on the first request
+WARM_UP_ON_START = os.environ.get('WARM_UP_ON_START', 'True').lower() == 'true'
+# Start listening right away and warm up on a background thread; /health
+# answers 503 until the model is loaded
+WARM_UP_IN_BACKGROUND = os.environ.get('WARM_UP_IN_BACKGROUND', 'False').lower() == 'true'
+
+# Production server (main.py --api --production, see gunicorn.conf.py)
+SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', min(4, os.cpu_count() or 1)))
+SERVER_THREADS = int(os.environ.get('SERVER_THREADS', '4'))
+SERVER_TIMEOUT = int(os.environ.get('SERVER_TIMEOUT', '120'))
+# Embedding inference threads per worker, torch or ONNX Runtime (0 splits the
+# cores evenly between workers)
+TORCH_THREADS_PER_WORKER = int(os.environ.get('TORCH_THREADS_PER_WORKER', '0'))
+
 # Check if required configuration is present
 def validate_config():
-    if not PINECONE_API_KEY:
+    if VECTOR_BACKEND not in ('pinecone', 'local'):
+        raise ValueError(f"VECTOR_BACKEND must be 'pinecone' or 'local', got '{VECTOR_BACKEND}'")
+    
+    if LOCAL_INDEX_ANN not in ('none', 'ivf'):
+        raise ValueError(f"LOCAL_INDEX_ANN must be 'none' or 'ivf', got '{LOCAL_INDEX_ANN}'")
+    
+    if LOCAL_INDEX_QUANTIZATION not in ('none', 'int8', 'binary'):
+        raise ValueError(f"LOCAL_INDEX_QUANTIZATION must be 'none', 'int8' or 'binary', got '{LOCAL_INDEX_QUANTIZATION}'")
+    
+    if EMBEDDING_BACKEND not in ('torch', 'onnx', 'onnx-int8'):
+        raise ValueError(f"EMBEDDING_BACKEND must be 'torch', 'onnx' or 'onnx-int8', got '{EMBEDDING_BACKEND}'")
+    
+    if RETRIEVAL_MODE not in RETRIEVAL_MODES:
+        raise ValueError(f"RETRIEVAL_MODE must be one of {', '.join(RETRIEVAL_MODES)}, got '{RETRIEVAL_MODE}'")
+    
+    if VECTOR_BACKEND == 'pinecone' and not PINECONE_API_KEY:
         raise ValueError("PINECONE_API_KEY environment variable is not set")
     
     if not os.path.isdir(PDF_DIRECTORY):
@@ -0,0 +1,223 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from app.config.config import EMBED_EXECUTOR_WORKERS, VECTOR_IO_WORKERS, RETRIEVAL_MODE
+from app.controllers.vector_controller import (get_vector_db, is_vector_db_ready, store_retrieval,
+                                               lookup_retrieval_cache, query_vector_store_batch)
+from app.controllers.rag_controller import answer_from_context, unavailable_answer
+from app.utils.errors import VectorStoreError
+from app.utils.coalesce import InFlightCoalescer
+
+# Configure logging
+logger = logging.getLogger('async_controller')
+
+# CPU-bound encoding runs on a small pool so concurrent requests queue for the
+# model instead of oversubscribing the cores; index lookups spend their time
+# waiting on the network and get a larger pool of their own.
+_embed_executor = ThreadPoolExecutor(max_workers=EMBED_EXECUTOR_WORKERS, thread_name_prefix='embed')
+_io_executor = ThreadPoolExecutor(max_workers=VECTOR_IO_WORKERS, thread_name_prefix='vector-io')
+# Executor of each stage of PineconeVectorDB.retrieval_steps(); the
+# cross-encoder is CPU-bound like the query encoder, so it shares that pool
+_stage_executors = {'embed': _embed_executor, 'search': _io_executor, 'rerank': _embed_executor}
+
+# Identical retrievals in flight at the same time share one lookup
+_coalescer = InFlightCoalescer()
+
+async def _run(executor, func, *args):
+    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+async def get_vector_db_async():
+    """
+    Get the shared PineconeVectorDB instance without blocking the event loop
+    while it is first built
+
+    Returns:
+        PineconeVectorDB instance
+    """
+    if is_vector_db_ready():
+        return get_vector_db()
+    return await _run(_embed_executor, get_vector_db)
+
+async def _run_steps(vector_db, steps):
+    # Async counterpart of vector.run_steps(): each step runs on the executor
+    # of its stage, so the event loop is never blocked
+    result, error = None, None
+    while True:
+        try:
+            stage, function, args = steps.send(result) if error is None else steps.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            if stage == 'embed' and vector_db.query_batcher is not None:
+                # The micro-batcher encodes on its own thread; just await the result
+                result = await asyncio.wrap_future(vector_db.submit_query_embedding(*args))
+            else:
+                result = await _run(_stage_executors[stage], function, *args)
+            error = None
+        except Exception as e:
+            result, error = None, e
+
+async def cached_query_async(query_text, k=5, mode=None):
+    """
+    Async counterpart of vector_controller.cached_query
+
+    Runs the same retrieval steps as PineconeVectorDB.query(), each on the
+    executor of its stage, and shares identical lookups in flight.
+
+    Args:
+        query_text: The query text
+        k: Number of chunks to retrieve
+        mode: 'dense' or 'hybrid' (RETRIEVAL_MODE if None)
+
+    Returns:
+        List of RetrievedChunk results, most relevant first
+
+    Raises:
+        VectorStoreError: If the query fails (failures are never cached)
+    """
+    mode = mode or RETRIEVAL_MODE
+    vector_db = await get_vector_db_async()
+    key, chunks = lookup_retrieval_cache(vector_db, query_text, k, mode)
+    if chunks is not None:
+        return chunks
+
+    chunks = await _coalescer.run(key, lambda: _run_steps(vector_db, vector_db.retrieval_steps(query_text, k, mode)))
+    store_retrieval(key, chunks)
+
+    return list(chunks)
+
+async def query_vector_store_async(query_text, k=5):
+    """
+    Query the vector store for relevant chunks
+
+    Args:
+        query_text: The query text
+        k: Number of chunks to retrieve
+
+    Returns:
+        List of RetrievedChunk results, most relevant first
+
+    Raises:
+        VectorStoreError: If the query fails
+    """
+    if not query_text or not isinstance(query_text, str):
+        raise ValueError("Query must be a non-empty string")
+
+    return await cached_query_async(query_text, k)
+
+async def query_vector_store_batch_async(query_texts, k=5):
+    """
+    Query the vector store for several queries, reporting failures per item
+
+    The batch is already embedded in one forward pass, so it runs as a
+    single call on the embedding executor.
+
+    Args:
+        query_texts: List of query texts
+        k: Number of chunks to retrieve per query
+
+    Returns:
+        List with one {"query", "chunks"} or {"query", "error"} entry per query
+    """
+    return await _run(_embed_executor, query_vector_store_batch, query_texts, k)
+
+async def _answer_async(question, chunks):
+    # The answer waits on the language model over HTTP, so it runs on the I/O pool
+    return await _run(_io_executor, answer_from_context, question, [chunk.text for chunk in chunks],
+                      await get_vector_db_async())
+
+async def answer_with_context_async(question, k=5):
+    """
+    Async counterpart of rag_controller.answer_with_context
+
+    Args:
+        question: The question to ask
+        k: Number of chunks to retrieve
+
+    Returns:
+        Dictionary with "answer", "chunks" (list of RetrievedChunk results) and "error"
+    """
+    if not question or not isinstance(question, str):
+        raise ValueError("Question must be a non-empty string")
+
+    logger.info(f"Retrieving context for question: '{question}'")
+    try:
+        chunks = await cached_query_async(question, k)
+    except VectorStoreError as e:
+        logger.error(f"Error querying vector store: {str(e)}")
+        return {"answer": unavailable_answer(e), "chunks": [], "error": str(e)}
+
+    answer = await _answer_async(question, chunks)
+    return {"answer": answer, "chunks": chunks, "error": None}
+
+async def ask_question_async(question):
+    """
+    Ask a question to the RAG system without blocking the event loop
+
+    Args:
+        question: The question to ask
+
+    Returns:
+        Answer to the question based on retrieved context, or "I don't know" message
+    """
+    return (await answer_with_context_async(question))["answer"]
+
+async def stream_answer_async(question, k=5):
+    """
+    Async counterpart of rag_controller.stream_answer
+
+    Args:
+        question: The question to ask
+        k: Number of chunks to retrieve
+
+    Yields:
+        ("context", {"chunks": [result dict, ...]}) followed by ("answer", {"answer": "..."})
+    """
+    if not question or not isinstance(question, str):
+        raise ValueError("Question must be a non-empty string")
+
+    try:
+        chunks = await cached_query_async(question, k)
+    except VectorStoreError as e:
+        logger.error(f"Error querying vector store: {str(e)}")
+        yield "context", {"chunks": []}
+        yield "answer", {"answer": unavailable_answer(e)}
+        return
+
+    yield "context", {"chunks": [chunk.to_dict() for chunk in chunks]}
+
+    yield "answer", {"answer": await _answer_async(question, chunks)}
+
+async def get_context_async(query, k=5, mode=None):
+    """
+    Get relevant context for a query
+
+    Args:
+        query: The query text
+        k: Number of chunks to retrieve
+        mode: 'dense' or 'hybrid' retrieval (RETRIEVAL_MODE if None)
+
+    Returns:
+        List of RetrievedChunk results, most relevant first
+
+    Raises:
+        VectorStoreError: If the vector store query fails
+    """
+    if not query or not isinstance(query, str):
+        raise ValueError("Query must be a non-empty string")
+
+    context = await cached_query_async(query, k, mode)
+
+    if not context:
+        logger.warning(f"No context found for query: '{query}'")
+
+    return context
+
+def get_coalescing_stats():
+    """
+    Get in-flight coalescing counters
+
+    Returns:
+        Dictionary of coalescing statistics
+    """
+    return _coalescer.stats()
@@ -1,18 +1,37 @@
-from app.controllers.vector_controller import get_vector_db
+from app.controllers.vector_controller import get_vector_db, cached_query
+from app.utils.errors import VectorStoreError
 import logging
 
 # Configure logging
 logger = logging.getLogger('rag_controller')
 
-def ask_question(question):
+def unavailable_answer(error):
     """
-    Ask a question to the RAG system using proper RAG flow
+    Answer returned in place of a real one when retrieval failed
+    
+    Args:
+        error: The VectorStoreError raised by the retrieval
+    
+    Returns:
+        Apology message including the error
+    """
+    return f"I'm sorry, I'm currently unable to access my knowledge base. The server returned the following error: {str(error)}"
+
+def answer_with_context(question, k=5):
+    """
+    Answer a question with exactly one retrieval, returning the answer
+    together with the scored chunks it was based on
+    
+    This is the entry point for every caller (API, chat UI, CLI, agent), so
+    a turn never pays for a second retrieval to show or reuse its context.
     
     Args:
         question: The question to ask
+        k: Number of chunks to retrieve
     
     Returns:
-        Answer to the question based on retrieved context, or "I don't know" message
+        Dictionary with "answer", "chunks" (list of RetrievedChunk results)
+        and "error" (None, or the message if the knowledge base was unreachable)
     """
     if not question or not isinstance(question, str):
         raise ValueError("Question must be a non-empty string")
@@ -22,12 +41,44 @@ def ask_question(question):
     
     # Step 2: Get relevant context chunks FIRST
     logger.info(f"Retrieving context for question: '{question}'")
-    context_chunks = vector_db.query(question, k=5)
+    try:
+        chunks = cached_query(question, k)
+    except VectorStoreError as e:
+        logger.error(f"Error querying vector store: {str(e)}")
+        return {"answer": unavailable_answer(e), "chunks": [], "error": str(e)}
+    
+    answer = answer_from_context(question, [chunk.text for chunk in chunks], vector_db)
+    return {"answer": answer, "chunks": chunks, "error": None}
+
+def ask_question(question):
+    """
+    Ask a question to the RAG system using proper RAG flow
+    
+    Args:
+        question: The question to ask
+    
+    Returns:
+        Answer to the question based on retrieved context, or "I don't know" message
+    """
+    return answer_with_context(question)["answer"]
+
+def answer_from_context(question, context_chunks, vector_db=None):
+    """
+    Turn retrieved context chunks into the answer returned to the user
     
-    # Check if API returned an error
-    if context_chunks and len(context_chunks) == 1 and context_chunks[0].startswith("API_ERROR:"):
-        logger.error(f"API error occurred: {context_chunks[0]}")
-        return f"I'm sorry, I'm currently unable to access my knowledge base. The server returned the following error: {context_chunks[0].replace('API_ERROR: ', '')}"
+    Shared by the threaded and async serving paths, which only differ in
+    how the chunks are retrieved.
+    
+    Args:
+        question: The question being answered
+        context_chunks: Texts of the chunks retrieved for the question
+        vector_db: PineconeVectorDB instance (the shared one if None)
+    
+    Returns:
+        Answer to the question based on the context, or "I don't know" message
+    """
+    if vector_db is None:
+        vector_db = get_vector_db()
     
     # Step 3: Check if we have any relevant context
     if not context_chunks or len(context_chunks) == 0:
@@ -42,11 +93,6 @@ def ask_question(question):
     # Step 5: Only when we have context, ask the question WITH the context
     answer = vector_db.ask_question(question, context_chunks=context_chunks)
     
-    # Check if API returned an error
-    if answer and answer.startswith("API_ERROR:"):
-        logger.error(f"API error occurred: {answer}")
-        return f"I'm sorry, I'm currently unable to generate an answer. The server returned the following error: {answer.replace('API_ERROR: ', '')}"
-    
     # Step 6: Final check on the answer
     if not answer or len(answer.strip()) < 20 or "I don't have" in answer or "I don't know" in answer:
         logger.warning(f"Received empty or generic answer from vector DB: '{answer}'")
@@ -55,31 +101,62 @@ def ask_question(question):
     # Return the context-based answer
     return answer
 
-def get_context(query, k=5):
+def stream_answer(question, k=5):
+    """
+    Retrieve context and answer a question, yielding each part as soon as it is ready
+    
+    Retrieval runs once and feeds both the context and the answer, so a
+    client rendering the stream does not need a separate /context request.
+    
+    Args:
+        question: The question to ask
+        k: Number of chunks to retrieve
+    
+    Yields:
+        (event, payload) tuples: ("context", {"chunks": [result dict, ...]})
+        followed by ("answer", {"answer": "..."})
+    """
+    if not question or not isinstance(question, str):
+        raise ValueError("Question must be a non-empty string")
+    
+    vector_db = get_vector_db()
+    
+    logger.info(f"Retrieving context for streamed question: '{question}'")
+    try:
+        chunks = cached_query(question, k)
+    except VectorStoreError as e:
+        # Retrieval errors are reported through the answer, not shown as sources
+        logger.error(f"Error querying vector store: {str(e)}")
+        yield "context", {"chunks": []}
+        yield "answer", {"answer": unavailable_answer(e)}
+        return
+    
+    yield "context", {"chunks": [chunk.to_dict() for chunk in chunks]}
+    
+    yield "answer", {"answer": answer_from_context(question, [chunk.text for chunk in chunks], vector_db)}
+
+def get_context(query, k=5, mode=None):
     """
     Get relevant context for a query
     
     Args:
         query: The query text
         k: Number of chunks to retrieve
+        mode: 'dense' or 'hybrid' retrieval (RETRIEVAL_MODE if None)
     
     Returns:
-        List of relevant text chunks
+        List of RetrievedChunk results, most relevant first
+    
+    Raises:
+        VectorStoreError: If the vector store query fails
     """
     if not query or not isinstance(query, str):
         raise ValueError("Query must be a non-empty string")
     
-    vector_db = get_vector_db()
-    context = vector_db.query(query, k)
-    
-    # Check if API returned an error
-    if context and len(context) == 1 and context[0].startswith("API_ERROR:"):
-        logger.error(f"API error occurred: {context[0]}")
-        # Return the API error message
-        return context
+    context = cached_query(query, k, mode)
     
     # Log when no context is found
-    if not context or len(context) == 0:
+    if not context:
         logger.warning(f"No context found for query: '{query}'")
     
-    return context
\ No newline at end of file
+    return context
@@ -1,29 +1,364 @@
 import os
+import time
+import logging
+import threading
+from app.config.config import (RETRIEVAL_CACHE_TTL, RETRIEVAL_CACHE_MAX_MB, INDEX_VERSION_PATH, QUERY_BATCH_MAX_SIZE,
+                               RETRIEVAL_MODE)
 from app.utils.vector import PineconeVectorDB
+from app.utils.cache import RetrievalCache
+from app.utils.errors import VectorStoreError
+from app.utils.results import RerankFallback
+from app.utils.index_version import IndexVersionWatcher
+
+# Configure logging
+logger = logging.getLogger('vector_controller')
+
+# Process-wide vector database client, shared by every request thread.
+# Building a PineconeVectorDB loads the embedding model and opens the index,
+# so it must happen once per process rather than once per request.
+_vector_db = None
+_vector_db_lock = threading.Lock()
+
+# Warm-up progress reported by /health: 'idle' (lazy initialization),
+# 'warming_up', 'ready' or 'failed'
+_warm_up_state = {"state": "idle", "error": None}
+
+# Retrieval results shared by all requests; dropped whenever ingestion bumps the index version
+_retrieval_cache = RetrievalCache(
+    ttl=RETRIEVAL_CACHE_TTL,
+    max_bytes=RETRIEVAL_CACHE_MAX_MB * 1024 * 1024,
+    version_fn=IndexVersionWatcher(INDEX_VERSION_PATH).get
+)
 
-# Initialize the vector database client
 def get_vector_db():
     """
-    Get the PineconeVectorDB instance
+    Get the shared PineconeVectorDB instance, creating it on first use
+
+    Returns:
+        PineconeVectorDB instance
+    """
+    global _vector_db
+
+    vector_db = _vector_db
+    if vector_db is not None:
+        return vector_db
+
+    with _vector_db_lock:
+        # Another thread may have finished initialization while we waited
+        if _vector_db is None:
+            logger.info("Initializing shared PineconeVectorDB instance")
+            start_time = time.time()
+            _vector_db = PineconeVectorDB()  # No parameters needed, defaults from config
+            logger.info(f"Shared PineconeVectorDB ready in {time.time() - start_time:.2f}s")
+        return _vector_db
+
+def is_vector_db_ready():
+    """
+    Check whether the shared instance has been built
     
+    Returns:
+        True if get_vector_db() will return without initializing
+    """
+    return _vector_db is not None
+
+def warm_up_vector_db():
+    """
+    Eagerly create the shared instance and run one query embedding so the
+    first user request does not pay for model loading
+
     Returns:
         PineconeVectorDB instance
     """
-    return PineconeVectorDB()  # No parameters needed, defaults from config
+    _warm_up_state.update(state="warming_up", error=None)
+    try:
+        vector_db = get_vector_db()
 
-def query_vector_store(query_text, k=5):
+        start_time = time.time()
+        vector_db.embedding_model.encode("warm-up")
+        logger.info(f"Embedding model warm-up completed in {time.time() - start_time:.2f}s")
+
+        if vector_db.reranker is not None:
+            start_time = time.time()
+            vector_db.reranker.warm_up()
+            logger.info(f"Re-ranking model warm-up completed in {time.time() - start_time:.2f}s")
+    except Exception as e:
+        _warm_up_state.update(state="failed", error=str(e))
+        raise
+
+    _warm_up_state.update(state="ready")
+    return vector_db
+
+def start_background_warm_up():
     """
-    Query the vector store for relevant chunks
+    Warm up on a background thread so the server can start listening (and
+    answer /health with "warming_up") while the model loads
+    
+    Returns:
+        The warm-up thread
+    """
+    _warm_up_state.update(state="warming_up", error=None)
+    
+    def run():
+        try:
+            warm_up_vector_db()
+        except Exception as e:
+            logger.error(f"Warm-up failed: {str(e)}")
+    
+    thread = threading.Thread(target=run, name='warm-up', daemon=True)
+    thread.start()
+    return thread
+
+def get_readiness():
+    """
+    Report whether this process can serve queries
+    
+    Returns:
+        Tuple of (ready, details); not ready while warming up or after a failed warm-up
+    """
+    state = _warm_up_state["state"]
+    details = {"state": state}
+    if _warm_up_state["error"]:
+        details["error"] = _warm_up_state["error"]
+    return state in ("idle", "ready"), details
+
+def reload_vector_db():
+    """
+    Replace the shared instance with a freshly constructed one
+
+    The new client is fully built before it is swapped in, so requests
+    running concurrently keep using the old instance until the swap.
+
+    Returns:
+        The new PineconeVectorDB instance
+    """
+    global _vector_db
+
+    logger.info("Reloading shared PineconeVectorDB instance")
+    new_vector_db = PineconeVectorDB()
+
+    with _vector_db_lock:
+        _vector_db = new_vector_db
+
+    # Results may depend on client settings such as the relevance threshold
+    _retrieval_cache.clear()
+
+    return new_vector_db
+
+def reset_vector_db():
+    """
+    Drop the shared instance so the next call to get_vector_db() rebuilds it
+    """
+    global _vector_db
+
+    with _vector_db_lock:
+        _vector_db = None
+
+def get_retrieval_cache():
+    """
+    Get the shared retrieval results cache
+    
+    Returns:
+        RetrievalCache instance
+    """
+    return _retrieval_cache
+
+def lookup_retrieval_cache(vector_db, query_text, k, mode):
+    """
+    Look up a retrieval in the shared cache, for cached_query() and its async counterpart
     
     Args:
+        vector_db: PineconeVectorDB instance
         query_text: The query text
         k: Number of chunks to retrieve
+        mode: 'dense' or 'hybrid'
     
     Returns:
-        List of relevant text chunks
+        Tuple of (cache key, cached list of RetrievedChunk results or None on a miss)
     """
-    if not query_text or not isinstance(query_text, str):
-        raise ValueError("Query must be a non-empty string")
+    key = _retrieval_cache.make_key(query_text, k, vector_db.relevance_threshold, mode)
+    chunks = _retrieval_cache.get(key)
+    if chunks is not None:
+        logger.info(f"Retrieval cache hit for query: '{query_text}', k={k}, mode={mode}")
+    return key, chunks
+
+def store_retrieval(key, chunks):
+    """
+    Cache a retrieval result, unless re-ranking fell back to bi-encoder order
+    
+    Re-ranking scores are cached per (query, chunk), so a repeated query
+    gets further through the re-ranker; caching its fallback result would
+    serve the un-reranked order for the whole TTL instead.
+    
+    Args:
+        key: Key from lookup_retrieval_cache()
+        chunks: List of RetrievedChunk results
+    """
+    if isinstance(chunks, RerankFallback):
+        logger.info("Not caching a result whose re-ranking fell back to bi-encoder order")
+        return
+    _retrieval_cache.put(key, chunks)
+
+def cached_query(query_text, k=5, mode=None):
+    """
+    Query the shared vector database, serving repeated (query, k, threshold,
+    mode) requests from the retrieval cache
+    
+    Args:
+        query_text: The query text
+        k: Number of chunks to retrieve
+        mode: 'dense' or 'hybrid' (RETRIEVAL_MODE if None)
+    
+    Returns:
+        List of RetrievedChunk results, most relevant first
+    
+    Raises:
+        VectorStoreError: If the query fails (failures are never cached)
+    """
+    mode = mode or RETRIEVAL_MODE
+    vector_db = get_vector_db()
+    key, chunks = lookup_retrieval_cache(vector_db, query_text, k, mode)
+    if chunks is not None:
+        return chunks
     
+    chunks = vector_db.query(query_text, k, mode)
+    store_retrieval(key, chunks)
+    
+    return chunks
+
+def cached_query_many(query_texts, k=5, mode=None):
+    """
+    Query the shared vector database for several queries, serving repeated
+    ones from the retrieval cache and sending the rest as one batch
+    
+    Args:
+        query_texts: The query texts
+        k: Number of chunks to retrieve per query
+        mode: 'dense' or 'hybrid' (RETRIEVAL_MODE if None)
+    
+    Returns:
+        One entry per query, in order: its list of RetrievedChunk results, or
+        the VectorStoreError that made it fail
+    """
+    mode = mode or RETRIEVAL_MODE
     vector_db = get_vector_db()
-    return vector_db.query(query_text, k)
\ No newline at end of file
+    keys = [_retrieval_cache.make_key(text, k, vector_db.relevance_threshold, mode) for text in query_texts]
+    results = [_retrieval_cache.get(key) for key in keys]
+    
+    # Identical queries in one batch are only looked up once
+    missing = {}
+    for i, chunks in enumerate(results):
+        if chunks is None:
+            missing.setdefault(keys[i], []).append(i)
+    
+    if missing:
+        positions = list(missing.values())
+        fetched = vector_db.query_many([query_texts[group[0]] for group in positions], k, mode)
+        for group, chunks in zip(positions, fetched):
+            # Never cache failures, so the next request retries the vector store
+            if not isinstance(chunks, VectorStoreError):
+                store_retrieval(keys[group[0]], chunks)
+            for i in group:
+                results[i] = chunks
+    
+    looked_up = sum(len(group) for group in missing.values())
+    logger.info(f"Batch of {len(query_texts)} queries: {len(query_texts) - looked_up} served from "
+                f"the retrieval cache, {len(missing)} distinct queries looked up")
+    return results
+
+def get_cache_stats():
+    """
+    Get statistics for the retrieval and query embedding caches
+    
+    Returns:
+        Dictionary of cache statistics
+    """
+    stats = {"retrieval": _retrieval_cache.stats()}
+    
+    # Only report the embedding cache if the client exists; don't build it just for stats
+    vector_db = _vector_db
+    if vector_db is not None:
+        stats["query_embedding"] = vector_db.query_embedding_cache.stats()
+    
+    return stats
+
+def get_embedding_stats():
+    """
+    Get statistics of the query embedding micro-batcher
+    
+    Returns:
+        Dictionary with batch-size and latency histograms, or {"enabled": False}
+    """
+    vector_db = _vector_db
+    if vector_db is None or vector_db.query_batcher is None:
+        return {"enabled": False}
+    
+    return {"enabled": True, **vector_db.query_batcher.stats()}
+
+def get_rerank_stats():
+    """
+    Get statistics of the cross-encoder re-ranking stage
+    
+    Returns:
+        Dictionary with fallback, cache and latency counters, or {"enabled": False}
+    """
+    vector_db = _vector_db
+    if vector_db is None or vector_db.reranker is None:
+        return {"enabled": False}
+    
+    return {"enabled": True, **vector_db.reranker.stats()}
+
+def query_vector_store(query_text, k=5):
+    """
+    Query the vector store for relevant chunks
+
+    Args:
+        query_text: The query text
+        k: Number of chunks to retrieve
+
+    Returns:
+        List of RetrievedChunk results, most relevant first
+
+    Raises:
+        VectorStoreError: If the query fails
+    """
+    if not query_text or not isinstance(query_text, str):
+        raise ValueError("Query must be a non-empty string")
+
+    return cached_query(query_text, k)
+
+def query_vector_store_batch(query_texts, k=5):
+    """
+    Query the vector store for several queries, reporting failures per item
+
+    Args:
+        query_texts: List of query texts
+        k: Number of chunks to retrieve per query
+
+    Returns:
+        List with one entry per query, in order: {"query", "chunks"} (a list
+        of RetrievedChunk results) on success or {"query", "error"} if that
+        query failed
+    """
+    if not isinstance(query_texts, list) or not query_texts:
+        raise ValueError("Queries must be a non-empty list")
+
+    if len(query_texts) > QUERY_BATCH_MAX_SIZE:
+        raise ValueError(f"At most {QUERY_BATCH_MAX_SIZE} queries are allowed per batch")
+
+    results = [None] * len(query_texts)
+    valid = []
+    for i, query_text in enumerate(query_texts):
+        if not query_text or not isinstance(query_text, str):
+            results[i] = {"query": query_text, "error": "Query must be a non-empty string"}
+        else:
+            valid.append(i)
+
+    if valid:
+        fetched = cached_query_many([query_texts[i] for i in valid], k)
+        for i, chunks in zip(valid, fetched):
+            if isinstance(chunks, VectorStoreError):
+                results[i] = {"query": query_texts[i], "error": str(chunks)}
+            else:
+                results[i] = {"query": query_texts[i], "chunks": chunks}
+
+    return results
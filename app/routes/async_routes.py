@@ -0,0 +1,203 @@
+from quart import Blueprint, Response, request, jsonify
+from app.controllers.async_controller import (answer_with_context_async, get_context_async, stream_answer_async,
+                                              query_vector_store_async, query_vector_store_batch_async,
+                                              get_coalescing_stats)
+from app.utils.sse import format_sse, SSE_HEADERS
+from app.controllers.vector_controller import get_cache_stats, get_embedding_stats, get_rerank_stats
+from app.routes.validation import (InvalidRequest, parse_ask, parse_context, parse_stream, parse_query,
+                                   parse_query_batch, batch_results_to_json)
+from app.utils.errors import VectorStoreError
+from app.utils.results import chunks_to_json
+
+# Async counterparts of rag_routes and vector_routes; requests are parsed by
+# the same app.routes.validation functions, so the contracts cannot drift
+async_rag_blueprint = Blueprint('async_rag', __name__)
+async_vector_blueprint = Blueprint('async_vector', __name__)
+
+@async_rag_blueprint.route('/ask', methods=['POST'])
+async def ask():
+    """
+    Endpoint to ask a question to the RAG system
+
+    Request JSON:
+    {
+        "question": "Your question here"
+    }
+
+    Returns:
+        JSON response with the answer and the scored chunks it was based on
+    """
+    try:
+        result = await answer_with_context_async(parse_ask(await request.get_json()))
+
+        return jsonify({"answer": result["answer"], "chunks": chunks_to_json(result["chunks"], detailed=True)}), 200
+
+    except InvalidRequest as e:
+        return jsonify({"error": str(e)}), 400
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@async_rag_blueprint.route('/context', methods=['POST'])
+async def context():
+    """
+    Endpoint to get relevant context for a query
+
+    Request JSON:
+    {
+        "query": "Your query here",
+        "k": 5,  # optional, number of chunks to retrieve
+        "detailed": false,  # optional, return id, score, source and chunk_index with each chunk
+        "mode": "hybrid"  # optional, "dense" or "hybrid" (dense fused with BM25), default RETRIEVAL_MODE
+    }
+
+    Returns:
+        JSON response with the context chunks
+    """
+    try:
+        query, k, mode, detailed = parse_context(await request.get_json())
+        context = await get_context_async(query, k, mode)
+
+        return jsonify({"context": chunks_to_json(context, detailed)}), 200
+
+    except InvalidRequest as e:
+        return jsonify({"error": str(e)}), 400
+
+    except VectorStoreError as e:
+        return jsonify({"error": str(e)}), 503
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@async_rag_blueprint.route('/stream', methods=['POST'])
+async def stream():
+    """
+    Endpoint streaming the context and then the answer for a question as
+    server-sent events
+
+    Request JSON:
+    {
+        "question": "Your question here",
+        "k": 5  # optional, number of chunks to retrieve
+    }
+
+    Returns:
+        text/event-stream with "context", "answer" and "done" events, or an
+        "error" event if something fails mid-stream
+    """
+    try:
+        question, k = parse_stream(await request.get_json(silent=True))
+    except InvalidRequest as e:
+        return jsonify({"error": str(e)}), 400
+
+    async def generate():
+        try:
+            async for event, payload in stream_answer_async(question, k):
+                yield format_sse(event, payload)
+            yield format_sse("done", {})
+        except Exception as e:
+            yield format_sse("error", {"error": str(e)})
+
+    return Response(generate(), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+@async_vector_blueprint.route('/query', methods=['POST'])
+async def query():
+    """
+    Endpoint to query the vector store for relevant chunks
+
+    Request JSON:
+    {
+        "query": "Your query here",
+        "k": 5,  # optional, number of chunks to retrieve
+        "detailed": false  # optional, return id, score, source and chunk_index with each chunk
+    }
+
+    Returns:
+        JSON response with the chunks
+    """
+    try:
+        query_text, k, detailed = parse_query(await request.get_json())
+        chunks = await query_vector_store_async(query_text, k)
+
+        return jsonify({"chunks": chunks_to_json(chunks, detailed)}), 200
+
+    except InvalidRequest as e:
+        return jsonify({"error": str(e)}), 400
+
+    except VectorStoreError as e:
+        return jsonify({"error": str(e)}), 503
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@async_vector_blueprint.route('/query_batch', methods=['POST'])
+async def query_batch():
+    """
+    Endpoint to query the vector store for several queries at once
+
+    Request JSON:
+    {
+        "queries": ["First query", "Second query"],
+        "k": 5,  # optional, number of chunks to retrieve per query
+        "detailed": false  # optional, return id, score, source and chunk_index with each chunk
+    }
+
+    Returns:
+        JSON response with one result per query, in order
+    """
+    try:
+        queries, k, detailed = parse_query_batch(await request.get_json())
+        results = await query_vector_store_batch_async(queries, k)
+
+        return jsonify({"results": batch_results_to_json(results, detailed)}), 200
+
+    except ValueError as e:
+        # InvalidRequest, or a malformed list of queries
+        return jsonify({"error": str(e)}), 400
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@async_vector_blueprint.route('/cache/stats', methods=['GET'])
+async def cache_stats():
+    """
+    Endpoint to inspect the retrieval and query embedding caches
+
+    Returns:
+        JSON response with cache counters plus in-flight coalescing counters
+    """
+    try:
+        stats = get_cache_stats()
+        stats["coalescing"] = get_coalescing_stats()
+        return jsonify(stats), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@async_vector_blueprint.route('/embedding/stats', methods=['GET'])
+async def embedding_stats():
+    """
+    Endpoint to inspect the query embedding micro-batcher
+
+    Returns:
+        JSON response with batch-size and latency histograms and p50/p90/p99 latency
+    """
+    try:
+        return jsonify(get_embedding_stats()), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@async_vector_blueprint.route('/rerank/stats', methods=['GET'])
+async def rerank_stats():
+    """
+    Endpoint to inspect the cross-encoder re-ranking stage
+
+    Returns:
+        JSON response with fallback and cache counters and p50/p90/p99 latency
+    """
+    try:
+        return jsonify(get_rerank_stats()), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
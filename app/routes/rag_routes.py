@@ -1,5 +1,9 @@
-from flask import Blueprint, request, jsonify
-from app.controllers.rag_controller import ask_question, get_context
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from app.controllers.rag_controller import answer_with_context, get_context, stream_answer
+from app.utils.sse import format_sse, SSE_HEADERS
+from app.routes.validation import InvalidRequest, parse_ask, parse_context, parse_stream
+from app.utils.errors import VectorStoreError
+from app.utils.results import chunks_to_json
 
 # Create blueprint for RAG-related routes
 rag_blueprint = Blueprint('rag', __name__)
@@ -15,18 +19,16 @@ def ask():
     }
     
     Returns:
-        JSON response with the answer
+        JSON response with the answer and the scored chunks it was based on
     """
     try:
-        data = request.get_json()
+        question = parse_ask(request.get_json())
+        result = answer_with_context(question)
         
-        if not data or 'question' not in data:
-            return jsonify({"error": "Missing 'question' field in request"}), 400
-        
-        question = data['question']
-        answer = ask_question(question)
-        
-        return jsonify({"answer": answer}), 200
+        return jsonify({"answer": result["answer"], "chunks": chunks_to_json(result["chunks"], detailed=True)}), 200
+    
+    except InvalidRequest as e:
+        return jsonify({"error": str(e)}), 400
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -39,27 +41,57 @@ def context():
     Request JSON:
     {
         "query": "Your query here",
-        "k": 5  # optional, number of chunks to retrieve
+        "k": 5,  # optional, number of chunks to retrieve
+        "detailed": false,  # optional, return id, score, source and chunk_index with each chunk
+        "mode": "hybrid"  # optional, "dense" or "hybrid" (dense fused with BM25), default RETRIEVAL_MODE
     }
     
     Returns:
         JSON response with the context chunks
     """
     try:
-        data = request.get_json()
-        
-        if not data or 'query' not in data:
-            return jsonify({"error": "Missing 'query' field in request"}), 400
-        
-        query = data['query']
-        k = data.get('k', 5)
+        query, k, mode, detailed = parse_context(request.get_json())
+        context = get_context(query, k, mode)
         
-        if not isinstance(k, int) or k < 1:
-            return jsonify({"error": "Parameter 'k' must be a positive integer"}), 400
-        
-        context = get_context(query, k)
-        
-        return jsonify({"context": context}), 200
+        return jsonify({"context": chunks_to_json(context, detailed)}), 200
+    
+    except InvalidRequest as e:
+        return jsonify({"error": str(e)}), 400
+    
+    except VectorStoreError as e:
+        return jsonify({"error": str(e)}), 503
     
     except Exception as e:
-        return jsonify({"error": str(e)}), 500 
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500 
+
+@rag_blueprint.route('/stream', methods=['POST'])
+def stream():
+    """
+    Endpoint streaming the context and then the answer for a question as
+    server-sent events
+    
+    Request JSON:
+    {
+        "question": "Your question here",
+        "k": 5  # optional, number of chunks to retrieve
+    }
+    
+    Returns:
+        text/event-stream with a "context" event ({"chunks": [...]}), an
+        "answer" event ({"answer": "..."}) and a final "done" event, or an
+        "error" event ({"error": "..."}) if something fails mid-stream
+    """
+    try:
+        question, k = parse_stream(request.get_json(silent=True))
+    except InvalidRequest as e:
+        return jsonify({"error": str(e)}), 400
+    
+    def generate():
+        try:
+            for event, payload in stream_answer(question, k):
+                yield format_sse(event, payload)
+            yield format_sse("done", {})
+        except Exception as e:
+            yield format_sse("error", {"error": str(e)})
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=SSE_HEADERS)
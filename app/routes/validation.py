@@ -0,0 +1,116 @@
+from typing import Any, Dict, List, Tuple
+from app.config.config import RETRIEVAL_MODE, RETRIEVAL_MODES
+from app.utils.results import chunks_to_json
+
+# Request parsing shared by the Flask blueprints and their async (Quart)
+# counterparts, so both serve the same contract from one definition
+
+DEFAULT_K = 5
+
+class InvalidRequest(ValueError):
+    """
+    A request body that fails validation; answered with 400 and the message
+    """
+
+def _require(data: Any, field: str) -> Any:
+    if not data or field not in data:
+        raise InvalidRequest(f"Missing '{field}' field in request")
+    return data[field]
+
+def _k(data: Dict) -> int:
+    k = data.get('k', DEFAULT_K)
+    if not isinstance(k, int) or k < 1:
+        raise InvalidRequest("Parameter 'k' must be a positive integer")
+    return k
+
+def _detailed(data: Dict) -> bool:
+    return bool(data.get('detailed', False))
+
+def parse_ask(data: Any) -> str:
+    """
+    Parse the body of /api/rag/ask
+
+    Returns:
+        The question
+
+    Raises:
+        InvalidRequest: If the question is missing
+    """
+    return _require(data, 'question')
+
+def parse_context(data: Any) -> Tuple[str, int, str, bool]:
+    """
+    Parse the body of /api/rag/context
+
+    Returns:
+        (query, k, mode, detailed)
+
+    Raises:
+        InvalidRequest: If the query is missing or k or mode is invalid
+    """
+    query = _require(data, 'query')
+    k = _k(data)
+    mode = data.get('mode', RETRIEVAL_MODE)
+    if mode not in RETRIEVAL_MODES:
+        raise InvalidRequest(f"Parameter 'mode' must be one of {', '.join(RETRIEVAL_MODES)}")
+    return query, k, mode, _detailed(data)
+
+def parse_stream(data: Any) -> Tuple[str, int]:
+    """
+    Parse the body of /api/rag/stream, which is checked in full before the stream starts
+
+    Returns:
+        (question, k)
+
+    Raises:
+        InvalidRequest: If the question is missing or empty, or k is invalid
+    """
+    _require(data, 'question')
+    k = _k(data)
+    question = data['question']
+    if not question or not isinstance(question, str):
+        raise InvalidRequest("Question must be a non-empty string")
+    return question, k
+
+def parse_query(data: Any) -> Tuple[str, int, bool]:
+    """
+    Parse the body of /api/vector/query
+
+    Returns:
+        (query, k, detailed)
+
+    Raises:
+        InvalidRequest: If the query is missing or k is invalid
+    """
+    query = _require(data, 'query')
+    return query, _k(data), _detailed(data)
+
+def parse_query_batch(data: Any) -> Tuple[Any, int, bool]:
+    """
+    Parse the body of /api/vector/query_batch; the queries themselves are
+    checked by query_vector_store_batch()
+
+    Returns:
+        (queries, k, detailed)
+
+    Raises:
+        InvalidRequest: If the queries are missing or k is invalid
+    """
+    queries = _require(data, 'queries')
+    return queries, _k(data), _detailed(data)
+
+def batch_results_to_json(results: List[Dict], detailed: bool) -> List[Dict]:
+    """
+    Serialize the chunks of each successful result of a query batch
+
+    Args:
+        results: Entries from query_vector_store_batch()
+        detailed: Whether to include id, score, source and chunk_index
+
+    Returns:
+        The same entries, with chunks as JSON-ready values
+    """
+    for result in results:
+        if "chunks" in result:
+            result["chunks"] = chunks_to_json(result["chunks"], detailed)
+    return results
@@ -1,5 +1,9 @@
 from flask import Blueprint, request, jsonify
-from app.controllers.vector_controller import query_vector_store
+from app.controllers.vector_controller import (query_vector_store, query_vector_store_batch, get_cache_stats,
+                                               get_embedding_stats, get_rerank_stats)
+from app.routes.validation import InvalidRequest, parse_query, parse_query_batch, batch_results_to_json
+from app.utils.errors import VectorStoreError
+from app.utils.results import chunks_to_json
 
 # Create blueprint for vector-related routes
 vector_blueprint = Blueprint('vector', __name__)
@@ -12,27 +16,95 @@ def query():
     Request JSON:
     {
         "query": "Your query here",
-        "k": 5  # optional, number of chunks to retrieve
+        "k": 5,  # optional, number of chunks to retrieve
+        "detailed": false  # optional, return id, score, source and chunk_index with each chunk
     }
     
     Returns:
         JSON response with the chunks
     """
     try:
-        data = request.get_json()
-        
-        if not data or 'query' not in data:
-            return jsonify({"error": "Missing 'query' field in request"}), 400
-        
-        query_text = data['query']
-        k = data.get('k', 5)
-        
-        if not isinstance(k, int) or k < 1:
-            return jsonify({"error": "Parameter 'k' must be a positive integer"}), 400
-        
+        query_text, k, detailed = parse_query(request.get_json())
         chunks = query_vector_store(query_text, k)
         
-        return jsonify({"chunks": chunks}), 200
+        return jsonify({"chunks": chunks_to_json(chunks, detailed)}), 200
+    
+    except InvalidRequest as e:
+        return jsonify({"error": str(e)}), 400
+    
+    except VectorStoreError as e:
+        return jsonify({"error": str(e)}), 503
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@vector_blueprint.route('/query_batch', methods=['POST'])
+def query_batch():
+    """
+    Endpoint to query the vector store for several queries at once
+    
+    Request JSON:
+    {
+        "queries": ["First query", "Second query"],
+        "k": 5,  # optional, number of chunks to retrieve per query
+        "detailed": false  # optional, return id, score, source and chunk_index with each chunk
+    }
+    
+    Returns:
+        JSON response with one result per query, in order; each result has
+        either "chunks" or an "error" for that query
+    """
+    try:
+        queries, k, detailed = parse_query_batch(request.get_json())
+        results = query_vector_store_batch(queries, k)
+        
+        return jsonify({"results": batch_results_to_json(results, detailed)}), 200
+    
+    except ValueError as e:
+        # InvalidRequest, or a malformed list of queries
+        return jsonify({"error": str(e)}), 400
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@vector_blueprint.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """
+    Endpoint to inspect the retrieval and query embedding caches
+    
+    Returns:
+        JSON response with hit/miss counters, sizes and the current index version
+    """
+    try:
+        return jsonify(get_cache_stats()), 200
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500 
+
+@vector_blueprint.route('/embedding/stats', methods=['GET'])
+def embedding_stats():
+    """
+    Endpoint to inspect the query embedding micro-batcher
+    
+    Returns:
+        JSON response with batch-size and latency histograms and p50/p90/p99 latency
+    """
+    try:
+        return jsonify(get_embedding_stats()), 200
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@vector_blueprint.route('/rerank/stats', methods=['GET'])
+def rerank_stats():
+    """
+    Endpoint to inspect the cross-encoder re-ranking stage
+    
+    Returns:
+        JSON response with fallback and cache counters and p50/p90/p99 latency
+    """
+    try:
+        return jsonify(get_rerank_stats()), 200
     
     except Exception as e:
-        return jsonify({"error": str(e)}), 500 
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
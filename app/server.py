@@ -5,15 +5,22 @@ import sys
 # Add the current directory to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.config.config import FLASK_HOST, FLASK_PORT, FLASK_DEBUG, validate_config
+from app.config.config import (FLASK_HOST, FLASK_PORT, FLASK_DEBUG, WARM_UP_ON_START, WARM_UP_IN_BACKGROUND,
+                               validate_config)
+from app.controllers.vector_controller import warm_up_vector_db, start_background_warm_up, get_readiness
+from app.utils.memory import process_memory
 from app.routes.rag_routes import rag_blueprint
 from app.routes.vector_routes import vector_blueprint
 from app.middleware.auth import request_logger
 
-def create_app():
+def create_app(warm_up=WARM_UP_ON_START, background_warm_up=WARM_UP_IN_BACKGROUND):
     """
     Create and configure the Flask application
     
+    Args:
+        warm_up: Whether to build the shared vector database client now
+        background_warm_up: Warm up on a background thread instead of blocking
+    
     Returns:
         Flask application instance
     """
@@ -28,15 +35,32 @@ def create_app():
     app.register_blueprint(rag_blueprint, url_prefix='/api/rag')
     app.register_blueprint(vector_blueprint, url_prefix='/api/vector')
     
+    # Load the embedding model once, before the first request arrives
+    if warm_up and background_warm_up:
+        start_background_warm_up()
+    elif warm_up:
+        warm_up_vector_db()
+    
     # Home route for the chat interface
     @app.route('/', methods=['GET'])
     def home():
         return render_template('chat.html')
     
-    # Create a simple health check endpoint
+    # Health check endpoint, doubling as the readiness probe: 503 until warm-up finishes
     @app.route('/health', methods=['GET'])
     def health_check():
-        return jsonify({"status": "healthy"}), 200
+        ready, details = get_readiness()
+        if not ready:
+            return jsonify({"status": details["state"], "error": details.get("error"), "pid": os.getpid()}), 503
+        return jsonify({"status": "healthy", "pid": os.getpid()}), 200
+    
+    # Memory of the worker process that handled the request
+    @app.route('/health/memory', methods=['GET'])
+    def memory_usage():
+        memory = process_memory()
+        if memory is None:
+            return jsonify({"error": "Memory accounting requires /proc"}), 501
+        return jsonify(memory), 200
     
     # Error handlers
     @app.errorhandler(404)
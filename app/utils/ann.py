@@ -0,0 +1,242 @@
+import os
+import math
+import logging
+import tempfile
+import numpy as np
+from typing import Dict, List, Optional
+
+logger = logging.getLogger('ann')
+
+DEFAULT_NPROBE = 8
+DEFAULT_KMEANS_ITERATIONS = 10
+DEFAULT_MAX_TRAINING_POINTS = 50000
+ASSIGN_BLOCK_SIZE = 4096
+
+def auto_nlist(count: int) -> int:
+    """
+    Default number of inverted lists for a corpus size (about sqrt(n))
+
+    Args:
+        count: Number of vectors
+
+    Returns:
+        Number of lists, at least 1
+    """
+    return max(1, int(math.sqrt(count)))
+
+class IVFFlatIndex:
+    """
+    Inverted-file index over the rows of an embedding matrix.
+
+    Vectors are clustered with spherical k-means; each row is stored in the
+    list of its nearest centroid. A query only scores the rows of the
+    nprobe lists whose centroids are closest to it, so latency grows with
+    n * nprobe / nlist instead of n. Raising nprobe trades latency for
+    recall; nprobe == nlist is exact search.
+
+    The index stores row numbers only, not vectors: callers score the
+    returned candidates against their own matrix. Rows are added, moved and
+    removed incrementally; centroids stay fixed until the next train().
+    """
+    def __init__(self, nlist: Optional[int] = None, nprobe: int = DEFAULT_NPROBE):
+        """
+        Initialize an untrained index
+
+        Args:
+            nlist: Number of inverted lists (chosen from the corpus size at training if None)
+            nprobe: Number of lists scanned per query
+        """
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.centroids: Optional[np.ndarray] = None
+        self.labels = np.empty(0, dtype=np.int32)
+        self.trained_count = 0
+        self._lists: List[List[int]] = []
+        self._arrays: Dict[int, np.ndarray] = {}
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self, vectors: np.ndarray, iterations: int = DEFAULT_KMEANS_ITERATIONS,
+              max_points: int = DEFAULT_MAX_TRAINING_POINTS, seed: int = 0):
+        """
+        Learn centroids with spherical k-means and assign every row to a list
+
+        Args:
+            vectors: L2-normalized vectors, row i of the index is vectors[i]
+            iterations: Number of k-means iterations
+            max_points: Train on a random sample of at most this many rows
+            seed: Random seed for sampling and initialization
+        """
+        count = vectors.shape[0]
+        if count == 0:
+            raise ValueError("Cannot train an IVF index without vectors")
+
+        rng = np.random.default_rng(seed)
+        nlist = min(self.nlist or auto_nlist(count), count)
+
+        sample = vectors
+        if count > max_points:
+            sample = vectors[np.sort(rng.choice(count, max_points, replace=False))]
+        sample = np.ascontiguousarray(sample, dtype=np.float32)
+
+        centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = self._nearest(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            sizes = np.bincount(assignments, minlength=nlist)
+
+            # Re-seed empty lists with random points so no centroid is wasted
+            empty = np.flatnonzero(sizes == 0)
+            if len(empty):
+                sums[empty] = sample[rng.choice(sample.shape[0], len(empty), replace=False)]
+
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.maximum(norms, 1e-12)
+
+        self.centroids = centroids.astype(np.float32)
+        self.nlist = nlist
+        self.trained_count = count
+        self._set_labels(self._nearest(vectors, self.centroids))
+        logger.info(f"Trained IVF index with {nlist} lists on {sample.shape[0]} of {count} vectors")
+
+    @staticmethod
+    def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        # Blocked so assigning a large matrix does not materialize n x nlist scores at once
+        labels = np.empty(vectors.shape[0], dtype=np.int32)
+        for start in range(0, vectors.shape[0], ASSIGN_BLOCK_SIZE):
+            block = np.asarray(vectors[start:start + ASSIGN_BLOCK_SIZE], dtype=np.float32)
+            labels[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        return labels
+
+    def _set_labels(self, labels: np.ndarray):
+        self.labels = labels.astype(np.int32)
+        self._lists = [[] for _ in range(self.nlist)]
+        order = np.argsort(self.labels, kind='stable')
+        bounds = np.searchsorted(self.labels[order], np.arange(self.nlist + 1))
+        for list_id in range(self.nlist):
+            self._lists[list_id] = order[bounds[list_id]:bounds[list_id + 1]].tolist()
+        self._arrays = {}
+
+    def set_rows(self, rows: np.ndarray, vectors: np.ndarray):
+        """
+        Insert new rows or re-assign overwritten ones
+
+        Args:
+            rows: Row numbers; new rows must extend the index contiguously
+            vectors: L2-normalized vectors of those rows
+        """
+        if not self.is_trained or len(rows) == 0:
+            return
+
+        labels = self._nearest(vectors, self.centroids)
+        end = int(np.max(rows)) + 1
+        if end > len(self.labels):
+            grown = np.full(end, -1, dtype=np.int32)
+            grown[:len(self.labels)] = self.labels
+            self.labels = grown
+
+        for row, label in zip(rows.tolist(), labels.tolist()):
+            old = self.labels[row]
+            if old == label:
+                continue
+            if old >= 0:
+                self._lists[old].remove(row)
+                self._arrays.pop(old, None)
+            self._lists[label].append(row)
+            self._arrays.pop(label, None)
+            self.labels[row] = label
+
+    def swap_remove(self, row: int):
+        """
+        Remove a row, moving the last row into its place
+
+        Mirrors how the local backend keeps its matrix contiguous on delete.
+
+        Args:
+            row: Row number to remove
+        """
+        if not self.is_trained or row >= len(self.labels):
+            return
+
+        last = len(self.labels) - 1
+        label = self.labels[row]
+        if label >= 0:
+            self._lists[label].remove(row)
+            self._arrays.pop(label, None)
+
+        if row != last:
+            moved_label = self.labels[last]
+            if moved_label >= 0:
+                moved_list = self._lists[moved_label]
+                moved_list[moved_list.index(last)] = row
+                self._arrays.pop(moved_label, None)
+            self.labels[row] = moved_label
+
+        self.labels = self.labels[:last]
+
+    def _list_array(self, list_id: int) -> np.ndarray:
+        array = self._arrays.get(list_id)
+        if array is None:
+            array = np.asarray(self._lists[list_id], dtype=np.int64)
+            self._arrays[list_id] = array
+        return array
+
+    def candidates(self, query: np.ndarray, nprobe: Optional[int] = None) -> np.ndarray:
+        """
+        Rows stored in the lists closest to a query
+
+        Args:
+            query: L2-normalized query vector
+            nprobe: Number of lists to scan (defaults to self.nprobe)
+
+        Returns:
+            Array of row numbers to score exactly
+        """
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        scores = self.centroids @ query
+        if nprobe < self.nlist:
+            probes = np.argpartition(-scores, nprobe - 1)[:nprobe]
+        else:
+            probes = np.arange(self.nlist)
+        arrays = [self._list_array(list_id) for list_id in probes.tolist()]
+        return np.concatenate(arrays) if arrays else np.empty(0, dtype=np.int64)
+
+    def save(self, path: str):
+        """
+        Write centroids and row assignments atomically to a .npz file
+
+        Args:
+            path: Destination path
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                np.savez(file, centroids=self.centroids, labels=self.labels,
+                         nprobe=self.nprobe, trained_count=self.trained_count)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> 'IVFFlatIndex':
+        """
+        Load an index written by save()
+
+        Args:
+            path: Path to the .npz file
+
+        Returns:
+            IVFFlatIndex instance
+        """
+        with np.load(path) as stored:
+            index = cls(nlist=stored['centroids'].shape[0], nprobe=int(stored['nprobe']))
+            index.centroids = stored['centroids'].astype(np.float32)
+            index.trained_count = int(stored['trained_count'])
+            index._set_labels(stored['labels'])
+        return index
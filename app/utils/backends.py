@@ -0,0 +1,878 @@
+import os
+import glob
+import json
+import mmap
+import uuid
+import logging
+import tempfile
+import time
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+from app.utils.ann import IVFFlatIndex, DEFAULT_NPROBE
+from app.utils.chunk_store import ChunkTextStore
+from app.utils.quantization import create_quantizer, DEFAULT_RESCORE_FACTORS
+from app.utils.errors import IndexSchemaError, VectorStoreError
+
+logger = logging.getLogger('backends')
+
+# Below this many vectors exact search is already fast, so the ANN index is not trained
+DEFAULT_ANN_MIN_TRAIN_SIZE = 4096
+# Retrain the ANN index once the corpus has grown this much since the last training
+ANN_RETRAIN_GROWTH = 4
+# Concurrent lookups when a batch of queries is sent to Pinecone
+DEFAULT_QUERY_WORKERS = 8
+# Similarity the embeddings are compared with; the local backend only supports cosine
+DEFAULT_INDEX_METRIC = 'cosine'
+# Where new Pinecone indexes are created
+DEFAULT_PINECONE_CLOUD = 'aws'
+DEFAULT_PINECONE_REGION = 'us-east-1'
+# Longest wait for a new Pinecone index to report ready
+DEFAULT_INDEX_READY_TIMEOUT = 120
+# Files of local indexes saved before every file was named after its generation
+LEGACY_VECTORS_FILE = 'vectors.npy'
+LEGACY_IVF_FILE = 'ivf.npz'
+# Times a reader retries when a save replaces the generation it was loading
+LOAD_ATTEMPTS = 5
+
+def advise_random(array):
+    """
+    Tell the kernel a memory-mapped array is read at random, so page faults
+    do not read the neighbouring pages ahead
+
+    Args:
+        array: Array returned by np.load(..., mmap_mode='r') (anything else is ignored)
+    """
+    mapping = getattr(array, '_mmap', None)
+    if mapping is not None and hasattr(mmap, 'MADV_RANDOM'):
+        try:
+            mapping.madvise(mmap.MADV_RANDOM)
+        except (OSError, ValueError):
+            pass
+
+class VectorBackend:
+    """
+    Interface of the vector index underneath PineconeVectorDB.
+
+    Methods mirror the subset of the Pinecone Index API the project uses, so
+    a Pinecone index handle and the local backend are interchangeable.
+    """
+    def upsert(self, vectors: Sequence[Tuple]):
+        """
+        Insert or overwrite vectors given as (id, values, metadata) tuples
+        """
+        raise NotImplementedError
+
+    def query(self, vector: Sequence[float], top_k: int, include_metadata: bool = True) -> Dict:
+        """
+        Return {'matches': [{'id', 'score', 'metadata'}, ...]} ordered by descending score
+        """
+        raise NotImplementedError
+
+    def query_many(self, vectors: Sequence[Sequence[float]], top_k: int, include_metadata: bool = True) -> List:
+        """
+        Run several queries
+
+        Args:
+            vectors: Query vectors
+            top_k: Number of matches per query
+            include_metadata: Whether to return match metadata
+
+        Returns:
+            One entry per query, in order: the query() result, or the
+            exception raised for that query
+        """
+        results = []
+        for vector in vectors:
+            try:
+                results.append(self.query(vector, top_k, include_metadata))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def delete(self, ids: Sequence[str]):
+        """
+        Delete vectors by ID
+        """
+        raise NotImplementedError
+
+    def describe_index_stats(self) -> Dict:
+        """
+        Return index statistics, including 'dimension' and 'total_vector_count'
+        """
+        raise NotImplementedError
+
+    def flush(self):
+        """
+        Persist buffered writes (a no-op for backends that write through)
+        """
+
+    def describe_index(self) -> Dict:
+        """
+        Return the index schema: {'dimension', 'metric'}, either None when unknown
+        """
+        stats = self.describe_index_stats()
+        return {'dimension': _field(stats, 'dimension'), 'metric': None}
+
+    def recreate(self, dimension: int, metric: str = DEFAULT_INDEX_METRIC):
+        """
+        Delete every vector and recreate the index for the given schema
+        """
+        raise NotImplementedError
+
+def _field(obj, name: str):
+    # Pinecone responses are objects in some client versions and dicts in others
+    value = getattr(obj, name, None)
+    if value is None and isinstance(obj, dict):
+        value = obj.get(name)
+    return value
+
+def create_serverless_index(pc, index_name: str, dimension: int, metric: str = DEFAULT_INDEX_METRIC,
+                            cloud: str = DEFAULT_PINECONE_CLOUD, region: str = DEFAULT_PINECONE_REGION,
+                            timeout: float = DEFAULT_INDEX_READY_TIMEOUT):
+    """
+    Create a serverless Pinecone index and wait until it accepts requests
+
+    Args:
+        pc: Pinecone client
+        index_name: Name of the new index
+        dimension: Vector dimension, i.e. the embedding model's output size
+        metric: Similarity metric
+        cloud: Cloud provider hosting the index
+        region: Region hosting the index
+        timeout: Longest wait in seconds for the index to report ready
+    """
+    from pinecone import ServerlessSpec
+
+    logger.info(f"Creating index '{index_name}' (dimension={dimension}, metric={metric})")
+    pc.create_index(name=index_name, dimension=dimension, metric=metric,
+                    spec=ServerlessSpec(cloud=cloud, region=region))
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = _field(pc.describe_index(index_name), 'status')
+        if status is not None and _field(status, 'ready'):
+            logger.info(f"Index '{index_name}' is ready")
+            return
+        time.sleep(1)
+    logger.warning(f"Index '{index_name}' not ready after {timeout}s, continuing anyway")
+
+def check_index_schema(index: VectorBackend, dimension: int, metric: str = DEFAULT_INDEX_METRIC) -> Dict:
+    """
+    Check that an index stores vectors the embedding model can write and query
+
+    Done once before ingesting or serving: a mismatched index rejects
+    every request, so it is better reported up front than per batch.
+
+    Args:
+        index: Backend to check
+        dimension: Dimension of the embedding model's vectors
+        metric: Similarity metric the embeddings are meant for
+
+    Returns:
+        The index schema from describe_index()
+
+    Raises:
+        IndexSchemaError: If the index dimension or metric differs
+    """
+    schema = index.describe_index()
+    index_dimension = schema.get('dimension')
+    index_metric = schema.get('metric')
+    if index_dimension is not None and int(index_dimension) != dimension:
+        raise IndexSchemaError(f"Index dimension {index_dimension} does not match the {dimension}-dimensional "
+                               f"embedding model")
+    if index_metric is not None and str(index_metric).lower() != metric:
+        raise IndexSchemaError(f"Index metric '{index_metric}' does not match the '{metric}' similarity the "
+                               f"embeddings are meant for")
+    return schema
+
+class PineconeBackend(VectorBackend):
+    """
+    Backend forwarding to a hosted Pinecone index
+    """
+    def __init__(self, api_key: str, index_name: str, query_workers: int = DEFAULT_QUERY_WORKERS):
+        """
+        Connect to a Pinecone index
+
+        Args:
+            api_key: Pinecone API key
+            index_name: Pinecone index name
+            query_workers: Number of concurrent lookups in query_many()
+        """
+        from pinecone import Pinecone
+
+        self.pc = Pinecone(api_key=api_key)
+        self.index_name = index_name
+        self.index = self.pc.Index(index_name)
+        self.query_workers = query_workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def upsert(self, vectors):
+        return self.index.upsert(vectors=vectors)
+
+    def query(self, vector, top_k, include_metadata=True):
+        return self.index.query(vector=vector, top_k=top_k, include_metadata=include_metadata)
+
+    def query_many(self, vectors, top_k, include_metadata=True):
+        # Each lookup is a network round-trip, so send them concurrently
+        if len(vectors) <= 1:
+            return super().query_many(vectors, top_k, include_metadata)
+
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.query_workers,
+                                                    thread_name_prefix='pinecone-query')
+
+        futures = [self._executor.submit(self.query, vector, top_k, include_metadata) for vector in vectors]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def delete(self, ids):
+        return self.index.delete(ids=ids)
+
+    def describe_index_stats(self):
+        return self.index.describe_index_stats()
+
+    def describe_index(self):
+        description = self.pc.describe_index(self.index_name)
+        return {'dimension': _field(description, 'dimension'), 'metric': _field(description, 'metric')}
+
+    def recreate(self, dimension, metric=DEFAULT_INDEX_METRIC):
+        logger.warning(f"Deleting Pinecone index '{self.index_name}' to recreate it")
+        self.pc.delete_index(self.index_name)
+        create_serverless_index(self.pc, self.index_name, dimension, metric)
+        self.index = self.pc.Index(self.index_name)
+
+def read_local_vectors(path: str) -> Optional[np.ndarray]:
+    """
+    Memory-map the embedding matrix of a local index, e.g. for benchmarks
+
+    Args:
+        path: Directory of the local index
+
+    Returns:
+        Matrix of normalized embeddings, or None if there is no saved index
+    """
+    try:
+        with open(os.path.join(path, 'metadata.json'), 'r', encoding='utf-8') as file:
+            stored = json.load(file)
+    except FileNotFoundError:
+        return None
+    return np.load(os.path.join(path, stored.get('vectors', LEGACY_VECTORS_FILE)), mmap_mode='r')
+
+class LocalBackend(VectorBackend):
+    """
+    In-process search backend.
+
+    Embeddings live in one contiguous float32 matrix of L2-normalized rows,
+    so cosine similarity is a single matrix-vector product and top-k is an
+    argpartition. The matrix is persisted as a .npy file that is
+    memory-mapped on load, and IDs/metadata as JSON next to it. Changes
+    saved by another process (e.g. an ingestion script) are picked up on
+    the next query.
+
+    Every save writes the matrix, texts, codes and IVF index to new files
+    named after a fresh generation, and then replaces metadata.json, which
+    names them. Replacing metadata.json is the commit point: a reader
+    always sees the files of one generation together.
+
+    With ann='ivf', queries on corpora of at least min_train_size vectors
+    only score the rows an IVFFlatIndex selects, trading a little recall
+    for latency that no longer grows linearly with the corpus.
+
+    With quantization='int8' or 'binary', queries rank the corpus by
+    compact codes held next to the matrix and only rescore the best
+    top_k * rescore_factor rows with the float32 vectors, so a serving
+    process reads a handful of rows of the memory-mapped matrix per query
+    instead of all of it. Chunk texts are kept out of the metadata in a
+    separate memory-mapped file and only read for returned matches.
+    """
+    def __init__(self, path: str, dimension: Optional[int] = None, autosave: bool = True,
+                 ann: Optional[str] = None, nlist: Optional[int] = None, nprobe: int = DEFAULT_NPROBE,
+                 min_train_size: int = DEFAULT_ANN_MIN_TRAIN_SIZE, quantization: Optional[str] = None,
+                 rescore_factor: Optional[int] = None):
+        """
+        Open or create a local index
+
+        Args:
+            path: Directory holding the index files
+            dimension: Vector dimension (taken from the first upsert if omitted)
+            autosave: Whether to persist after every upsert/delete (otherwise call flush())
+            ann: Approximate search method, 'ivf' or None for exact search
+            nlist: Number of IVF lists (about sqrt(n) if None)
+            nprobe: Number of IVF lists scanned per query
+            min_train_size: Number of vectors from which the IVF index is used
+            quantization: Compact codes used to shortlist candidates, 'int8', 'binary' or None
+            rescore_factor: Candidates rescored at full precision per requested match
+                (a per-quantization default if None)
+        """
+        if ann not in (None, 'none', 'ivf'):
+            raise ValueError(f"Unknown ANN method '{ann}', expected 'ivf' or None")
+        quantizer = create_quantizer(quantization)
+
+        self.path = path
+        self.dimension = dimension
+        self.autosave = autosave
+        self.ann = ann if ann != 'none' else None
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.quantization = quantizer.kind if quantizer else None
+        self.rescore_factor = max(1, rescore_factor or DEFAULT_RESCORE_FACTORS.get(self.quantization, 1))
+        self.metadata_path = os.path.join(path, 'metadata.json')
+        self._ivf: Optional[IVFFlatIndex] = None
+        self._quantizer = quantizer
+        self._quantized_count = 0
+        self._codes: Optional[np.ndarray] = None
+        self._texts = ChunkTextStore()
+        # Generation of the files metadata.json named when last loaded or saved
+        self._generation = None
+        # Indexes saved before the matrix was generation-named use these files
+        self._legacy_files = False
+
+        self._matrix = np.zeros((0, dimension or 0), dtype=np.float32)
+        self._count = 0
+        self._ids: List[str] = []
+        self._metadata: List[Dict] = []
+        self._rows: Dict[str, int] = {}
+        self._loaded_mtime = None
+        self._dirty = False
+        self._lock = threading.RLock()
+        # Queries score a snapshot of the arrays outside the lock. Writers
+        # replace arrays, or bump the version before changing rows a snapshot
+        # may cover in place, so a query can tell its snapshot went stale
+        self._version = 0
+
+        os.makedirs(path, exist_ok=True)
+        self.load()
+
+    def _file_mtime(self):
+        # metadata.json is replaced last by every save; its inode tells replacements
+        # apart even when they land within the file system's timestamp resolution
+        try:
+            stat = os.stat(self.metadata_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_ino
+
+    def _read_stored(self):
+        # Caller holds the lock. Read metadata.json and memory-map the matrix it
+        # names; if a writer removed that generation meanwhile, read the newer one
+        for _ in range(LOAD_ATTEMPTS):
+            mtime = self._file_mtime()
+            if mtime is None:
+                return None, None, None
+            try:
+                with open(self.metadata_path, 'r', encoding='utf-8') as file:
+                    stored = json.load(file)
+                matrix = np.load(os.path.join(self.path, stored.get('vectors', LEGACY_VECTORS_FILE)), mmap_mode='r')
+                return mtime, stored, matrix
+            except FileNotFoundError:
+                continue
+        raise VectorStoreError(f"Local index at {self.path} kept changing while it was being loaded")
+
+    def load(self):
+        """
+        Load the index from disk, memory-mapping the embedding matrix
+        """
+        with self._lock:
+            mtime, stored, matrix = self._read_stored()
+            if stored is None:
+                return
+
+            count = min(len(stored['ids']), matrix.shape[0])
+            if count != len(stored['ids']) or count != matrix.shape[0]:
+                logger.warning(f"Local index at {self.path} has mismatched files, keeping the first {count} vectors")
+
+            self._version += 1
+            self._matrix = matrix
+            self._count = count
+            self._ids = stored['ids'][:count]
+            self._metadata = stored['metadata'][:count]
+            self._rows = {vector_id: row for row, vector_id in enumerate(self._ids)}
+            self.dimension = matrix.shape[1] if matrix.ndim == 2 else self.dimension
+            self._loaded_mtime = mtime
+            self._generation = stored.get('generation')
+            self._legacy_files = 'vectors' not in stored
+
+            texts = stored.get('texts')
+            if texts:
+                self._texts.open(os.path.join(self.path, texts['file']), texts['offsets'], count)
+            else:
+                # Written before texts were split out: move them out of the metadata
+                self._texts.reset([metadata.pop('text', None) for metadata in self._metadata])
+            self._load_codes(stored.get('quantization'))
+            if self._codes is not None:
+                # Only the shortlisted rows are read, so skip the kernel's read-around
+                advise_random(matrix)
+            logger.info(f"Loaded local index from {self.path} with {count} vectors")
+
+            self._ivf = None
+            ann_path = os.path.join(self.path, stored.get('ivf') or LEGACY_IVF_FILE)
+            if self.ann and os.path.exists(ann_path):
+                ivf = IVFFlatIndex.load(ann_path)
+                if len(ivf.labels) == count:
+                    ivf.nprobe = self.nprobe
+                    self._ivf = ivf
+                else:
+                    logger.warning(f"IVF index at {ann_path} is out of date, retraining")
+            self._maybe_train()
+
+    def _load_codes(self, stored: Optional[Dict]):
+        # Caller holds the lock
+        if self._quantizer is None:
+            return
+        self._codes = None
+        self._quantized_count = 0
+        codes_path = os.path.join(self.path, stored['codes']) if stored else None
+        if stored and stored.get('type') == self.quantization and os.path.exists(codes_path):
+            codes = np.load(codes_path, mmap_mode='r')
+            if codes.shape[0] == self._count:
+                self._quantizer = create_quantizer(self.quantization, stored)
+                self._codes = codes
+                self._quantized_count = stored.get('fitted_count', self._count)
+                return
+        if self._count:
+            logger.warning(f"Quantized codes at {self.path} are missing or out of date, re-encoding "
+                           f"{self._count} vectors as {self.quantization}")
+            self._fit_quantizer()
+
+    def _fit_quantizer(self):
+        # Caller holds the lock
+        self._version += 1
+        matrix = self._matrix[:self._count]
+        self._quantizer.fit(matrix)
+        codes = self._quantizer.encode_all(matrix)
+        if self._codes is not None and not isinstance(self._codes, np.memmap) \
+                and self._codes.shape[0] >= self._count:
+            self._codes[:self._count] = codes
+        else:
+            self._codes = codes
+        self._quantized_count = self._count
+
+    def _maybe_fit_quantizer(self):
+        # Caller holds the lock; like the IVF centroids, int8 scales are
+        # refitted (and every row re-encoded) once the corpus has grown enough
+        if self._quantizer is None or not self._quantizer.trainable or self._count == 0:
+            return
+        if self._quantizer.is_fitted and self._count < ANN_RETRAIN_GROWTH * self._quantized_count:
+            return
+        self._fit_quantizer()
+
+    def _maybe_train(self):
+        # Caller holds the lock
+        if not self.ann or self._count < self.min_train_size:
+            return
+        if self._ivf is not None and self._count < ANN_RETRAIN_GROWTH * self._ivf.trained_count:
+            return
+        ivf = IVFFlatIndex(nlist=self.nlist, nprobe=self.nprobe)
+        ivf.train(self._matrix[:self._count])
+        self._ivf = ivf
+
+    def train_ann(self):
+        """
+        Retrain the ANN index on the current vectors, e.g. after large deletions
+        """
+        with self._lock:
+            if not self.ann or self._count == 0:
+                return
+            ivf = IVFFlatIndex(nlist=self.nlist, nprobe=self.nprobe)
+            ivf.train(self._matrix[:self._count])
+            self._ivf = ivf
+            self._dirty = True
+
+    def save(self):
+        """
+        Persist the index atomically: the files of a new generation first,
+        then metadata.json, which names them
+        """
+        with self._lock:
+            previous_generation = self._generation
+            generation = uuid.uuid4().hex[:16]
+            stored = {'ids': self._ids, 'metadata': self._metadata, 'generation': generation}
+
+            vectors_file = f'vectors-{generation}.npy'
+            matrix = np.ascontiguousarray(self._matrix[:self._count], dtype=np.float32)
+            self._write_atomic(os.path.join(self.path, vectors_file), 'wb', lambda file: np.save(file, matrix))
+            stored['vectors'] = vectors_file
+
+            texts_file = f'texts-{generation}.bin'
+            offsets = []
+            self._write_atomic(os.path.join(self.path, texts_file), 'wb',
+                               lambda file: offsets.extend(self._texts.write(file)))
+            stored['texts'] = {'file': texts_file, 'offsets': offsets}
+
+            if self._quantizer is not None and self._codes is not None and self._quantizer.is_fitted:
+                codes_file = f'codes-{generation}.npy'
+                codes = np.ascontiguousarray(self._codes[:self._count])
+                self._write_atomic(os.path.join(self.path, codes_file), 'wb', lambda file: np.save(file, codes))
+                stored['quantization'] = {**self._quantizer.state(), 'codes': codes_file,
+                                          'fitted_count': self._quantized_count}
+
+            if self._ivf is not None:
+                ivf_file = f'ivf-{generation}.npz'
+                self._ivf.save(os.path.join(self.path, ivf_file))
+                stored['ivf'] = ivf_file
+
+            # The commit point: readers only ever load the files metadata.json names
+            self._write_atomic(self.metadata_path, 'w', lambda file: json.dump(stored, file))
+            self._loaded_mtime = self._file_mtime()
+            self._dirty = False
+
+            # Read saved texts from the new file instead of holding them in memory
+            self._texts.open(os.path.join(self.path, texts_file), offsets, self._count)
+            self._generation = generation
+            self._remove_stale_files({generation, previous_generation}, keep_legacy=self._legacy_files)
+            self._legacy_files = False
+
+    def _remove_stale_files(self, keep, keep_legacy: bool = False):
+        # Files of the previous generation are kept for processes that have
+        # read the old metadata.json but not opened its files yet
+        for pattern in ('vectors-*.npy', 'texts-*.bin', 'codes-*.npy', 'ivf-*.npz'):
+            for path in glob.glob(os.path.join(self.path, pattern)):
+                generation = os.path.splitext(os.path.basename(path))[0].split('-', 1)[1]
+                if generation not in keep:
+                    self._remove_file(path)
+        if not keep_legacy:
+            for name in (LEGACY_VECTORS_FILE, LEGACY_IVF_FILE):
+                if os.path.exists(os.path.join(self.path, name)):
+                    self._remove_file(os.path.join(self.path, name))
+
+    @staticmethod
+    def _remove_file(path: str):
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f"Could not remove stale index file {path}: {str(e)}")
+
+    def flush(self):
+        with self._lock:
+            if self._dirty:
+                self.save()
+
+    def _write_atomic(self, path, mode, write):
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, mode) as file:
+                write(file)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _refresh(self):
+        # Pick up changes written by another process, unless we hold unsaved writes
+        mtime = self._file_mtime()
+        if mtime is not None and mtime != self._loaded_mtime and not self._dirty:
+            self.load()
+
+    def _ensure_writable(self, extra_rows: int):
+        # Grow geometrically so repeated upserts are amortized O(1) per row;
+        # this also copies a memory-mapped matrix into private memory
+        needed = self._count + extra_rows
+        codes_ready = self._quantizer is None or self._is_writable(self._codes, needed)
+        if self._is_writable(self._matrix, needed) and codes_ready:
+            return
+        capacity = max(needed, 2 * self._matrix.shape[0], 64)
+        self._matrix = self._grow(self._matrix, capacity, self.dimension, np.float32)
+        if self._quantizer is not None:
+            self._codes = self._grow(self._codes, capacity, self._quantizer.code_size(self.dimension),
+                                     self._quantizer.dtype)
+
+    @staticmethod
+    def _is_writable(array: Optional[np.ndarray], rows: int) -> bool:
+        return array is not None and not isinstance(array, np.memmap) and rows <= array.shape[0] \
+            and array.flags.writeable
+
+    def _grow(self, array: Optional[np.ndarray], capacity: int, width: int, dtype) -> np.ndarray:
+        grown = np.zeros((capacity, width), dtype=dtype)
+        if self._count and array is not None:
+            grown[:self._count] = array[:self._count]
+        return grown
+
+    @staticmethod
+    def _normalize(values) -> np.ndarray:
+        array = np.asarray(values, dtype=np.float32)
+        norms = np.linalg.norm(array, axis=-1, keepdims=True)
+        return array / np.maximum(norms, 1e-12)
+
+    def upsert(self, vectors):
+        with self._lock:
+            self._refresh()
+            if not vectors:
+                return {'upserted_count': 0}
+
+            values = self._normalize([vector[1] for vector in vectors])
+            if self.dimension is None or self._count == 0:
+                self.dimension = self.dimension or values.shape[1]
+            if values.shape[1] != self.dimension:
+                raise ValueError(f"Vector dimension {values.shape[1]} does not match the dimension of the index {self.dimension}")
+
+            self._ensure_writable(len(vectors))
+            rows = np.empty(len(vectors), dtype=np.int64)
+            for position, ((vector_id, _, metadata), row_values) in enumerate(zip(vectors, values)):
+                # The chunk text goes to the text store, not the metadata
+                metadata = dict(metadata or {})
+                text = metadata.pop('text', None)
+                row = self._rows.get(vector_id)
+                if row is None:
+                    row = self._count
+                    self._count += 1
+                    self._rows[vector_id] = row
+                    self._ids.append(vector_id)
+                    self._metadata.append(metadata)
+                    self._texts.append(text)
+                else:
+                    # Rewritten in place, unlike appended rows
+                    self._version += 1
+                    self._metadata[row] = metadata
+                    self._texts.set(row, text)
+                self._matrix[row] = row_values
+                rows[position] = row
+
+            if self._ivf is not None:
+                self._ivf.set_rows(rows, values)
+            if self._quantizer is not None and self._quantizer.is_fitted:
+                self._codes[rows] = self._quantizer.encode(values)
+            self._dirty = True
+            self._maybe_train()
+            self._maybe_fit_quantizer()
+            if self.autosave:
+                self.save()
+            return {'upserted_count': len(vectors)}
+
+    def delete(self, ids):
+        with self._lock:
+            self._refresh()
+            rows = [self._rows[vector_id] for vector_id in ids if vector_id in self._rows]
+            if not rows:
+                return {}
+
+            self._ensure_writable(0)
+            self._version += 1
+            # Fill each hole with the current last row to keep the matrix contiguous
+            for row in sorted(rows, reverse=True):
+                last = self._count - 1
+                removed_id = self._ids[row]
+                if self._ivf is not None:
+                    self._ivf.swap_remove(row)
+                self._texts.swap_remove(row)
+                if row != last:
+                    self._matrix[row] = self._matrix[last]
+                    if self._codes is not None:
+                        self._codes[row] = self._codes[last]
+                    self._ids[row] = self._ids[last]
+                    self._metadata[row] = self._metadata[last]
+                    self._rows[self._ids[row]] = row
+                self._ids.pop()
+                self._metadata.pop()
+                del self._rows[removed_id]
+                self._count -= 1
+
+            self._dirty = True
+            if self.autosave:
+                self.save()
+            return {}
+
+    def _snapshot(self) -> Tuple:
+        # Caller holds the lock. Everything a search reads outside of it
+        return self._version, self._count, self._matrix, self._codes, self._quantizer
+
+    def _candidates(self, query_vector: np.ndarray, top_k: int, nprobe: Optional[int]) -> Optional[np.ndarray]:
+        # Caller holds the lock: the IVF lists are updated in place
+        if self._ivf is None:
+            return None
+        rows = self._ivf.candidates(query_vector, nprobe)
+        # Too few candidates in the probed lists, fall back to exact search
+        return rows if len(rows) >= top_k else None
+
+    def _search(self, query_vector: np.ndarray, top_k: int, snapshot: Tuple,
+                rows: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        # Needs no lock. Best rows of the snapshot and their scores, best first;
+        # rows=None searches all of them
+        _, count, matrix, codes, quantizer = snapshot
+        if codes is not None:
+            rows, scores = self._rescore(query_vector, rows, count, top_k, matrix, codes, quantizer)
+        elif rows is None:
+            rows = np.arange(count)
+            scores = matrix[:count] @ query_vector
+        else:
+            scores = matrix[rows] @ query_vector
+
+        k = min(top_k, len(rows))
+        if k < len(rows):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(rows))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return rows[top], scores[top]
+
+    def query(self, vector, top_k, include_metadata=True, nprobe=None):
+        query_vector = self._normalize(vector)
+
+        with self._lock:
+            self._refresh()
+            if self._count == 0 or top_k <= 0:
+                return {'matches': []}
+            snapshot = self._snapshot()
+            rows = self._candidates(query_vector, top_k, nprobe)
+
+        # Scoring runs outside the lock, so concurrent queries do not wait for each other
+        rows, scores = self._search(query_vector, top_k, snapshot, rows)
+
+        with self._lock:
+            if self._version != snapshot[0]:
+                # A writer moved or rewrote rows meanwhile; search again holding the lock
+                if self._count == 0:
+                    return {'matches': []}
+                rows, scores = self._search(query_vector, top_k, self._snapshot(),
+                                            self._candidates(query_vector, top_k, nprobe))
+            matches = []
+            for row, score in zip(rows, scores):
+                match = {'id': self._ids[row], 'score': float(score)}
+                if include_metadata:
+                    match['metadata'] = self._match_metadata(row)
+                matches.append(match)
+            return {'matches': matches}
+
+    def _rescore(self, query_vector: np.ndarray, rows: Optional[np.ndarray], count: int, top_k: int,
+                 matrix: np.ndarray, codes: np.ndarray, quantizer) -> Tuple[np.ndarray, np.ndarray]:
+        # Shortlist by the compact codes, then score the shortlist exactly;
+        # rows=None ranks the whole corpus
+        codes = codes[:count] if rows is None else codes[rows]
+        approximate = quantizer.scores(codes, query_vector)
+        pool = min(len(approximate), top_k * self.rescore_factor)
+        if pool < len(approximate):
+            shortlist = np.argpartition(-approximate, pool - 1)[:pool]
+        else:
+            shortlist = np.arange(len(approximate))
+        if rows is not None:
+            shortlist = rows[shortlist]
+        # Sorted, so the memory-mapped matrix is read in file order
+        shortlist = np.sort(shortlist)
+        return shortlist, matrix[shortlist] @ query_vector
+
+    def _match_metadata(self, row: int) -> Dict:
+        # Caller holds the lock
+        text = self._texts.get(row)
+        if text is None:
+            return self._metadata[row]
+        return {**self._metadata[row], 'text': text}
+
+    @staticmethod
+    def _search_many(query_matrix: np.ndarray, top_k: int, snapshot: Tuple) -> List[Tuple[np.ndarray, np.ndarray]]:
+        # Needs no lock. Best rows and scores of the snapshot per query, best first
+        _, count, matrix, _, _ = snapshot
+        # One matrix product scores every query against every row
+        scores = matrix[:count] @ query_matrix.T
+
+        k = min(top_k, count)
+        if k < count:
+            top = np.argpartition(-scores, k - 1, axis=0)[:k]
+        else:
+            top = np.tile(np.arange(count)[:, None], (1, len(query_matrix)))
+
+        results = []
+        for column in range(len(query_matrix)):
+            rows = top[:, column]
+            rows = rows[np.argsort(-scores[rows, column], kind='stable')]
+            results.append((rows, scores[rows, column]))
+        return results
+
+    def query_many(self, vectors, top_k, include_metadata=True):
+        if self.ann or self._quantizer is not None:
+            # IVF candidates and rescoring shortlists differ per query, so there is no shared matrix product
+            return super().query_many(vectors, top_k, include_metadata)
+
+        query_matrix = self._normalize(vectors)
+        if query_matrix.ndim != 2 or len(query_matrix) == 0:
+            return []
+
+        with self._lock:
+            self._refresh()
+            if self._count == 0 or top_k <= 0:
+                return [{'matches': []} for _ in range(len(query_matrix))]
+            snapshot = self._snapshot()
+
+        ranked = self._search_many(query_matrix, top_k, snapshot)
+
+        with self._lock:
+            if self._version != snapshot[0]:
+                if self._count == 0:
+                    return [{'matches': []} for _ in range(len(query_matrix))]
+                ranked = self._search_many(query_matrix, top_k, self._snapshot())
+            results = []
+            for rows, scores in ranked:
+                matches = []
+                for row, score in zip(rows, scores):
+                    match = {'id': self._ids[row], 'score': float(score)}
+                    if include_metadata:
+                        match['metadata'] = self._match_metadata(row)
+                    matches.append(match)
+                results.append({'matches': matches})
+            return results
+
+    def describe_index_stats(self):
+        with self._lock:
+            self._refresh()
+            return {
+                'dimension': self.dimension,
+                'total_vector_count': self._count,
+                'namespaces': {'': {'vector_count': self._count}}
+            }
+
+    def describe_index(self):
+        with self._lock:
+            self._refresh()
+            # Rows are L2-normalized and scored by dot product, i.e. cosine similarity
+            return {'dimension': self.dimension, 'metric': DEFAULT_INDEX_METRIC}
+
+    def recreate(self, dimension, metric=DEFAULT_INDEX_METRIC):
+        if metric != DEFAULT_INDEX_METRIC:
+            raise ValueError(f"The local backend only supports the '{DEFAULT_INDEX_METRIC}' metric, got '{metric}'")
+        with self._lock:
+            logger.warning(f"Clearing local index at {self.path} to recreate it with dimension {dimension}")
+            self._version += 1
+            self.dimension = dimension
+            self._matrix = np.zeros((0, dimension), dtype=np.float32)
+            self._count = 0
+            self._ids = []
+            self._metadata = []
+            self._rows = {}
+            self._texts = ChunkTextStore()
+            self._codes = None
+            self._quantized_count = 0
+            self._quantizer = create_quantizer(self.quantization)
+            self._ivf = None
+            self.save()
+
+def create_backend(backend: str, index_name: str, api_key: str = '', local_path: Optional[str] = None,
+                   **local_options) -> VectorBackend:
+    """
+    Create the vector backend selected in the configuration
+
+    Args:
+        backend: 'pinecone' or 'local'
+        index_name: Index name (Pinecone index, or default local directory name)
+        api_key: Pinecone API key
+        local_path: Directory of the local index
+        **local_options: Extra LocalBackend arguments (ann, nlist, nprobe, quantization, rescore_factor)
+
+    Returns:
+        VectorBackend instance
+    """
+    backend = (backend or 'pinecone').lower()
+    if backend == 'pinecone':
+        return PineconeBackend(api_key=api_key, index_name=index_name)
+    if backend == 'local':
+        # Writes are buffered until flush() so bulk ingestion does not rewrite the matrix per batch
+        return LocalBackend(local_path or os.path.join('local_index', index_name), autosave=False, **local_options)
+    raise ValueError(f"Unknown vector backend '{backend}', expected 'pinecone' or 'local'")
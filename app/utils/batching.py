@@ -0,0 +1,205 @@
+import os
+import time
+import queue
+import logging
+import threading
+import numpy as np
+from collections import Counter, deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger('batching')
+
+DEFAULT_MAX_BATCH = 32
+DEFAULT_MAX_WAIT_MS = 5.0
+DEFAULT_LATENCY_WINDOW = 10000
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+_STOP = object()
+
+class _Request:
+    __slots__ = ('item', 'future', 'submitted')
+
+    def __init__(self, item: Any):
+        self.item = item
+        self.future = Future()
+        self.submitted = time.perf_counter()
+
+class MicroBatcher:
+    """
+    Collect items submitted by concurrent callers into batches.
+
+    A single background thread takes the first waiting item, keeps
+    collecting until max_batch items are queued or max_wait_ms has passed,
+    then calls process_batch once for the whole batch and resolves each
+    caller's future with its own result. Under load this turns many
+    one-item calls into a few large ones; a lone request waits at most
+    max_wait_ms extra.
+    """
+    def __init__(self,
+                 process_batch: Callable[[List[Any]], List[Any]],
+                 max_batch: int = DEFAULT_MAX_BATCH,
+                 max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+                 name: str = 'micro-batcher',
+                 latency_window: int = DEFAULT_LATENCY_WINDOW):
+        """
+        Initialize the batcher; the worker thread starts on first use
+
+        Args:
+            process_batch: Maps a list of items to a list of results of the same length
+            max_batch: Maximum number of items per batch
+            max_wait_ms: Longest time the first item of a batch waits for others
+            name: Name of the worker thread
+            latency_window: Number of recent request latencies kept for percentiles
+        """
+        self.process_batch = process_batch
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+        self.batches = 0
+        self.items = 0
+        self.errors = 0
+        self._batch_sizes = Counter()
+        self._latencies = deque(maxlen=latency_window)
+        self._stats_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+
+    def _ensure_started(self):
+        # Threads do not survive fork(), so a preforked worker starts its own
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        """
+        Queue an item for the next batch
+
+        Args:
+            item: The item to process
+
+        Returns:
+            Future resolved with the item's result
+        """
+        self._ensure_started()
+        request = _Request(item)
+        self._queue.put(request)
+        return request.future
+
+    def process(self, item: Any, timeout: Optional[float] = None) -> Any:
+        """
+        Process one item as part of a batch, blocking until its result is ready
+
+        Args:
+            item: The item to process
+            timeout: Seconds to wait for the result
+
+        Returns:
+            The item's result
+        """
+        return self.submit(item).result(timeout)
+
+    def close(self):
+        """
+        Stop the worker thread after the batches already queued
+        """
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid():
+                self._queue.put(_STOP)
+                self._thread.join()
+            self._thread = None
+
+    def _collect(self, first: _Request) -> Tuple[List[_Request], bool]:
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is _STOP:
+                return batch, True
+            batch.append(request)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch, stopping = self._collect(first)
+
+            # Skip callers that gave up while waiting
+            batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            try:
+                results = self.process_batch([request.item for request in batch])
+                if len(results) != len(batch):
+                    raise ValueError(f"Batch function returned {len(results)} results for {len(batch)} items")
+            except Exception as e:
+                logger.error(f"Error processing batch of {len(batch)} items: {str(e)}")
+                for request in batch:
+                    request.future.set_exception(e)
+                with self._stats_lock:
+                    self.errors += 1
+                continue
+
+            done = time.perf_counter()
+            for request, result in zip(batch, results):
+                request.future.set_result(result)
+
+            with self._stats_lock:
+                self.batches += 1
+                self.items += len(batch)
+                self._batch_sizes[len(batch)] += 1
+                self._latencies.extend(done - request.submitted for request in batch)
+
+    def stats(self) -> Dict:
+        """
+        Batch-size histogram and request latency percentiles
+
+        Latency is measured from submit() until the result is set, so it
+        includes the time spent waiting for the batch to fill.
+
+        Returns:
+            Dictionary of batching statistics
+        """
+        with self._stats_lock:
+            latencies_ms = np.array(self._latencies) * 1000
+            batch_sizes = dict(sorted(self._batch_sizes.items()))
+            stats = {
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches": self.batches,
+                "items": self.items,
+                "errors": self.errors,
+                "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+                "batch_size_histogram": batch_sizes,
+            }
+
+        if len(latencies_ms):
+            stats["latency_ms"] = {
+                "p50": float(np.percentile(latencies_ms, 50)),
+                "p90": float(np.percentile(latencies_ms, 90)),
+                "p99": float(np.percentile(latencies_ms, 99)),
+                "max": float(latencies_ms.max()),
+            }
+            edges = np.array(LATENCY_BUCKETS_MS + (np.inf,))
+            counts = np.bincount(np.searchsorted(edges, latencies_ms), minlength=len(edges))
+            stats["latency_histogram_ms"] = {
+                (f"<={int(edge)}" if np.isfinite(edge) else f">{LATENCY_BUCKETS_MS[-1]}"): int(count)
+                for edge, count in zip(edges, counts)
+            }
+        return stats
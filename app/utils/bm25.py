@@ -0,0 +1,436 @@
+import os
+import re
+import glob
+import json
+import time
+import uuid
+import logging
+import tempfile
+import threading
+import numpy as np
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.utils.results import RetrievedChunk
+from app.utils.errors import VectorStoreError
+
+logger = logging.getLogger('bm25')
+
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+# Replaced last by every save; names the chunk and postings files of the current generation
+INDEX_FILE = 'index.json'
+# Files of indexes saved before the files were named after their generation
+LEGACY_CHUNKS_FILE = 'chunks.json'
+LEGACY_POSTINGS_FILE = 'postings.npz'
+# Times a reader retries when a save replaces the generation it was loading
+LOAD_ATTEMPTS = 5
+
+# Lowercased alphanumeric runs, so "STarMir", "Bin3" and "miR-21" stay searchable
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have if in into is it its of on or that the their there these
+they this to was were which will with what when where who how why does do can
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercased terms, without stopwords
+
+    Args:
+        text: The text to tokenize
+
+    Returns:
+        List of terms in order
+    """
+    return [term for term in TOKEN_PATTERN.findall(text.lower()) if term not in STOPWORDS]
+
+class _Postings:
+    """
+    Read-only inverted index in CSR form: the postings of term t are
+    docs[offsets[t]:offsets[t + 1]] with term frequencies tfs[...].
+    """
+    __slots__ = ('terms', 'offsets', 'docs', 'tfs', 'idf', 'doc_norms')
+
+    def __init__(self, terms: Dict[str, int], offsets: np.ndarray, docs: np.ndarray, tfs: np.ndarray,
+                 doc_lengths: np.ndarray, k1: float, b: float):
+        self.terms = terms
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs.astype(np.float32)
+
+        count = len(doc_lengths)
+        document_frequency = np.diff(offsets).astype(np.float32)
+        self.idf = np.log1p((count - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+
+        # Length normalization of the BM25 denominator, fixed per document
+        average_length = float(doc_lengths.mean()) if count else 0.0
+        self.doc_norms = (k1 * (1 - b + b * doc_lengths / max(average_length, 1e-9))).astype(np.float32)
+
+class BM25Index:
+    """
+    Okapi BM25 index over the chunks stored in the vector index.
+
+    Chunks are keyed by the same content-derived IDs as their vectors, so
+    lexical and dense results can be fused by ID. Ingestion adds and
+    removes chunks per source document; the inverted index is rebuilt in
+    CSR form on the next search or save. On disk it is two files: the
+    chunk texts (JSON) and the postings (int32 document numbers and uint16
+    term frequencies), which are loaded as-is without re-tokenizing.
+
+    Both files are named after the generation of the save that wrote them,
+    and index.json, replaced last, names the current pair, so a reader in
+    another process never pairs the chunks of one save with the postings
+    of another.
+    """
+    def __init__(self, path: str, k1: float = DEFAULT_K1, b: float = DEFAULT_B):
+        """
+        Initialize the index, loading it from disk if it exists
+
+        Args:
+            path: Directory holding the index files
+            k1: Term frequency saturation
+            b: Strength of the document length normalization
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.index_path = os.path.join(path, INDEX_FILE)
+        self.searches = 0
+        self.truncated = 0
+
+        # id -> (source, chunk_index, text), in insertion order
+        self._chunks: Dict[str, Tuple[Optional[str], Optional[int], str]] = {}
+        self._ids: List[str] = []
+        # Term numbers only ever grow; terms no chunk uses any more just have no postings
+        self._terms: Dict[str, int] = {}
+        # id -> (term numbers, term frequencies) of each chunk, rebuilt from the
+        # postings on the first change after loading
+        self._doc_terms: Optional[Dict[str, Tuple[np.ndarray, np.ndarray]]] = {}
+        self._postings: Optional[_Postings] = None
+        self._loaded_mtime = None
+        self._generation = None
+        # Indexes saved before the files were generation-named use the legacy files
+        self._legacy_files = False
+        self._dirty = False
+        self._lock = threading.RLock()
+
+        self.load()
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def _file_mtime(self):
+        # index.json is replaced last by every save; its inode tells replacements
+        # apart even when they land within the file system's timestamp resolution
+        for name in (INDEX_FILE, LEGACY_POSTINGS_FILE):
+            try:
+                stat = os.stat(os.path.join(self.path, name))
+            except OSError:
+                continue
+            return stat.st_mtime_ns, stat.st_ino
+        return None
+
+    def _read_stored(self):
+        # Caller holds the lock. Read the files index.json names; if a writer
+        # removed that generation meanwhile, read the newer one
+        for _ in range(LOAD_ATTEMPTS):
+            mtime = self._file_mtime()
+            if mtime is None:
+                return None, None, None, None
+            try:
+                if os.path.exists(self.index_path):
+                    with open(self.index_path, 'r', encoding='utf-8') as file:
+                        index = json.load(file)
+                else:
+                    index = {}
+                with open(os.path.join(self.path, index.get('chunks', LEGACY_CHUNKS_FILE)), 'r',
+                          encoding='utf-8') as file:
+                    stored = json.load(file)
+                with np.load(os.path.join(self.path, index.get('postings', LEGACY_POSTINGS_FILE))) as arrays:
+                    terms = {term: number for number, term in enumerate(arrays['terms'].tolist())}
+                    postings = _Postings(terms, arrays['offsets'], arrays['docs'], arrays['tfs'],
+                                         arrays['doc_lengths'].astype(np.float32), self.k1, self.b)
+                return mtime, index, stored, postings
+            except FileNotFoundError:
+                continue
+        raise VectorStoreError(f"BM25 index at {self.path} kept changing while it was being loaded")
+
+    def load(self):
+        """
+        Load the index from disk
+        """
+        with self._lock:
+            mtime, index, stored, postings = self._read_stored()
+            if stored is None:
+                return
+
+            self._chunks = {chunk_id: (source, chunk_index, text) for chunk_id, source, chunk_index, text
+                            in zip(stored['ids'], stored['sources'], stored['chunk_indexes'], stored['texts'])}
+            self._ids = list(self._chunks)
+            self._terms = dict(postings.terms)
+            self._doc_terms = None
+            self._postings = postings
+            self._loaded_mtime = mtime
+            self._generation = index.get('generation')
+            self._legacy_files = 'postings' not in index
+            self._dirty = False
+            logger.info(f"Loaded BM25 index from {self.path} with {len(self._ids)} chunks and {len(self._terms)} terms")
+
+    def _refresh(self):
+        # Pick up changes written by another process, unless we hold unsaved changes
+        mtime = self._file_mtime()
+        if mtime is not None and mtime != self._loaded_mtime and not self._dirty:
+            self.load()
+
+    def add(self, chunks: Iterable[Tuple[str, str, Optional[str], Optional[int]]]):
+        """
+        Insert or overwrite chunks
+
+        Args:
+            chunks: (id, text, source, chunk_index) tuples
+        """
+        with self._lock:
+            self._refresh()
+            doc_terms = self._editable_doc_terms()
+            for chunk_id, text, source, chunk_index in chunks:
+                self._chunks[chunk_id] = (source, chunk_index, text)
+                doc_terms[chunk_id] = self._encode(text)
+            self._invalidate()
+
+    def remove(self, ids: Iterable[str]):
+        """
+        Remove chunks by ID, ignoring unknown IDs
+        """
+        with self._lock:
+            self._refresh()
+            doc_terms = self._editable_doc_terms()
+            for chunk_id in ids:
+                if self._chunks.pop(chunk_id, None) is not None:
+                    del doc_terms[chunk_id]
+            self._invalidate()
+
+    def remove_source(self, source: str):
+        """
+        Remove every chunk of a source document
+        """
+        with self._lock:
+            self._refresh()
+            self.remove([chunk_id for chunk_id, chunk in self._chunks.items() if chunk[0] == source])
+
+    def clear(self):
+        """
+        Remove every chunk, e.g. when the vector index is rebuilt empty
+        """
+        with self._lock:
+            self._refresh()
+            self.remove(list(self._chunks))
+
+    def replace_source(self, source: str, chunks: Iterable[Tuple[str, str, Optional[str], Optional[int]]]):
+        """
+        Replace the chunks of a source document with its current chunks
+
+        Args:
+            source: Name of the source document
+            chunks: (id, text, source, chunk_index) tuples of the document
+        """
+        with self._lock:
+            self.remove_source(source)
+            self.add(chunks)
+
+    def _invalidate(self):
+        # Caller holds the lock
+        self._ids = list(self._chunks)
+        self._postings = None
+        self._dirty = True
+
+    def _encode(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        # Caller holds the lock
+        counts = Counter(tokenize(text))
+        terms = np.fromiter((self._terms.setdefault(term, len(self._terms)) for term in counts),
+                            dtype=np.int32, count=len(counts))
+        return terms, np.fromiter(counts.values(), dtype=np.int32, count=len(counts))
+
+    def _editable_doc_terms(self) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        # Caller holds the lock; inverts the loaded postings back into per-chunk terms
+        if self._doc_terms is None:
+            postings = self._postings
+            term_numbers = np.repeat(np.arange(len(postings.offsets) - 1, dtype=np.int32), np.diff(postings.offsets))
+            order = np.argsort(postings.docs, kind='stable')
+            bounds = np.searchsorted(postings.docs[order], np.arange(len(self._ids) + 1))
+            tfs = postings.tfs.astype(np.int32)
+            self._doc_terms = {chunk_id: (term_numbers[order[bounds[doc]:bounds[doc + 1]]],
+                                          tfs[order[bounds[doc]:bounds[doc + 1]]])
+                               for doc, chunk_id in enumerate(self._ids)}
+        return self._doc_terms
+
+    def _build(self) -> Tuple[_Postings, Tuple[np.ndarray, ...]]:
+        # Caller holds the lock
+        doc_terms = self._editable_doc_terms()
+        per_doc = [doc_terms[chunk_id] for chunk_id in self._ids]
+        sizes = np.array([len(terms) for terms, _ in per_doc], dtype=np.int64)
+        if per_doc:
+            term_numbers = np.concatenate([terms for terms, _ in per_doc])
+            frequencies = np.concatenate([tfs for _, tfs in per_doc])
+        else:
+            term_numbers = frequencies = np.zeros(0, dtype=np.int32)
+        doc_numbers = np.repeat(np.arange(len(per_doc), dtype=np.int32), sizes)
+        doc_lengths = np.array([int(tfs.sum()) for _, tfs in per_doc], dtype=np.int32)
+
+        order = np.argsort(term_numbers, kind='stable')
+        offsets = np.zeros(len(self._terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_numbers, minlength=len(self._terms)), out=offsets[1:])
+        docs = doc_numbers[order]
+        tfs = np.minimum(frequencies[order], np.iinfo(np.uint16).max).astype(np.uint16)
+
+        # The postings get their own vocabulary: later edits add terms they have no offsets for
+        postings = _Postings(dict(self._terms), offsets, docs, tfs, doc_lengths.astype(np.float32), self.k1, self.b)
+        return postings, (offsets, docs, tfs, doc_lengths)
+
+    def _current_postings(self) -> _Postings:
+        # Caller holds the lock
+        if self._postings is None:
+            self._postings = self._build()[0]
+        return self._postings
+
+    def save(self):
+        """
+        Persist the index atomically: the chunks and postings of a new
+        generation first, then index.json, which names them
+        """
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            previous_generation = self._generation
+            generation = uuid.uuid4().hex[:16]
+            self._postings, (offsets, docs, tfs, doc_lengths) = self._build()
+            terms = list(self._terms)
+            stored = {
+                'ids': self._ids,
+                'sources': [self._chunks[chunk_id][0] for chunk_id in self._ids],
+                'chunk_indexes': [self._chunks[chunk_id][1] for chunk_id in self._ids],
+                'texts': [self._chunks[chunk_id][2] for chunk_id in self._ids]
+            }
+            index = {'generation': generation, 'chunks': f'chunks-{generation}.json',
+                     'postings': f'postings-{generation}.npz'}
+            self._write_atomic(os.path.join(self.path, index['chunks']), 'w', lambda file: json.dump(stored, file))
+            self._write_atomic(os.path.join(self.path, index['postings']), 'wb', lambda file: np.savez(
+                file, terms=np.asarray(terms, dtype=str), offsets=offsets, docs=docs, tfs=tfs,
+                doc_lengths=doc_lengths))
+
+            # The commit point: readers only ever load the files index.json names
+            self._write_atomic(self.index_path, 'w', lambda file: json.dump(index, file))
+            self._loaded_mtime = self._file_mtime()
+            self._dirty = False
+            self._generation = generation
+            self._remove_stale_files({generation, previous_generation}, keep_legacy=self._legacy_files)
+            self._legacy_files = False
+
+    def _remove_stale_files(self, keep, keep_legacy: bool = False):
+        # Files of the previous generation are kept for processes that have
+        # read the old index.json but not opened its files yet
+        for pattern in ('chunks-*.json', 'postings-*.npz'):
+            for path in glob.glob(os.path.join(self.path, pattern)):
+                generation = os.path.splitext(os.path.basename(path))[0].split('-', 1)[1]
+                if generation not in keep:
+                    self._remove_file(path)
+        if not keep_legacy:
+            for name in (LEGACY_CHUNKS_FILE, LEGACY_POSTINGS_FILE):
+                if os.path.exists(os.path.join(self.path, name)):
+                    self._remove_file(os.path.join(self.path, name))
+
+    @staticmethod
+    def _remove_file(path: str):
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f"Could not remove stale BM25 index file {path}: {str(e)}")
+
+    def flush(self):
+        """
+        Save the index if it has unsaved changes
+        """
+        with self._lock:
+            if self._dirty:
+                self.save()
+
+    def _write_atomic(self, path, mode, write):
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, mode) as file:
+                write(file)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def search(self, query_text: str, top_k: int, budget_ms: Optional[float] = None) -> List[RetrievedChunk]:
+        """
+        Rank chunks by BM25 score
+
+        Query terms are scored rarest first. With a budget, scoring stops
+        once it is spent, so the most selective terms always count and the
+        common ones are dropped first.
+
+        Args:
+            query_text: The query text
+            top_k: Number of chunks to return
+            budget_ms: Time after which remaining query terms are skipped
+
+        Returns:
+            List of RetrievedChunk results with their BM25 score, best first
+        """
+        start = time.perf_counter()
+        with self._lock:
+            self._refresh()
+            postings = self._current_postings()
+            ids = self._ids
+            chunks = self._chunks
+
+        term_numbers = {postings.terms[term] for term in tokenize(query_text) if term in postings.terms}
+        if not term_numbers or top_k <= 0:
+            return []
+        term_numbers = sorted(term_numbers, key=lambda t: postings.offsets[t + 1] - postings.offsets[t])
+
+        scores = np.zeros(len(ids), dtype=np.float32)
+        for i, term in enumerate(term_numbers):
+            if budget_ms is not None and i > 0 and (time.perf_counter() - start) * 1000 > budget_ms:
+                logger.warning(f"BM25 budget of {budget_ms} ms spent, skipped {len(term_numbers) - i} "
+                               f"of {len(term_numbers)} query terms")
+                self.truncated += 1
+                break
+            begin, end = postings.offsets[term], postings.offsets[term + 1]
+            docs = postings.docs[begin:end]
+            tfs = postings.tfs[begin:end]
+            # Each document appears once per term, so plain fancy-index addition is safe
+            scores[docs] += postings.idf[term] * tfs * (self.k1 + 1) / (tfs + postings.doc_norms[docs])
+        self.searches += 1
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        matched = matched[np.argsort(-scores[matched], kind='stable')]
+
+        results = []
+        for doc in matched:
+            chunk_id = ids[doc]
+            chunk = chunks.get(chunk_id)
+            if chunk is None:
+                # Removed by a concurrent update since the postings were built
+                continue
+            source, chunk_index, text = chunk
+            results.append(RetrievedChunk(id=chunk_id, score=float(scores[doc]), text=text,
+                                          source=source, chunk_index=chunk_index))
+        return results
+
+    def stats(self) -> Dict:
+        """
+        Size and search counters of the index
+        """
+        with self._lock:
+            postings = self._postings
+            return {
+                "chunks": len(self._chunks),
+                "terms": len(postings.terms) if postings is not None else None,
+                "searches": self.searches,
+                "truncated_searches": self.truncated
+            }
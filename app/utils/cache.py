@@ -0,0 +1,283 @@
+import sys
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+DEFAULT_QUERY_EMBEDDING_CACHE_SIZE = 1024
+DEFAULT_RETRIEVAL_CACHE_TTL = 300.0
+DEFAULT_RETRIEVAL_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+def normalize_query(query_text: str) -> str:
+    """
+    Normalize a query for use as a cache key
+
+    Collapses whitespace, which the tokenizers discard anyway. Case is
+    kept: the embedding and rerank models are configurable and may be
+    cased, so queries differing in case can have different embeddings.
+
+    Args:
+        query_text: The raw query text
+
+    Returns:
+        The normalized query text
+    """
+    return " ".join(query_text.split())
+
+class QueryEmbeddingCache:
+    """
+    Bounded, thread-safe LRU cache mapping normalized query text to its embedding
+    """
+    def __init__(self, maxsize: int = DEFAULT_QUERY_EMBEDDING_CACHE_SIZE):
+        """
+        Initialize the cache
+
+        Args:
+            maxsize: Maximum number of embeddings kept (0 disables caching)
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, query_text: str) -> Optional[np.ndarray]:
+        """
+        Look up the embedding of a query
+
+        Args:
+            query_text: The query text
+
+        Returns:
+            The cached embedding (read-only), or None on a miss
+        """
+        key = normalize_query(query_text)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+
+    def put(self, query_text: str, embedding) -> np.ndarray:
+        """
+        Store the embedding of a query, evicting the least recently used entry if full
+
+        Args:
+            query_text: The query text
+            embedding: The query embedding
+
+        Returns:
+            The stored, read-only embedding
+        """
+        embedding = np.array(embedding, dtype=np.float32)
+        embedding.setflags(write=False)
+        if self.maxsize <= 0:
+            return embedding
+
+        key = normalize_query(query_text)
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return embedding
+
+    def get_or_compute(self, query_text: str, compute: Callable[[str], np.ndarray]) -> np.ndarray:
+        """
+        Return the cached embedding, computing and storing it on a miss
+
+        Concurrent misses for the same query may both compute; the result is
+        identical, so this only costs the duplicate work.
+
+        Args:
+            query_text: The query text
+            compute: Function embedding the query text
+
+        Returns:
+            The query embedding (read-only)
+        """
+        embedding = self.get(query_text)
+        if embedding is None:
+            embedding = self.put(query_text, compute(query_text))
+        return embedding
+
+    def clear(self):
+        """
+        Remove all entries and reset the counters
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict:
+        """
+        Hit/miss counters and current size
+
+        Returns:
+            Dictionary of cache statistics
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+def estimate_size(value: Any) -> int:
+    """
+    Rough memory footprint of a cached retrieval result
+
+    Args:
+        value: A list of chunks (strings, dicts or slotted result objects) or a single value
+
+    Returns:
+        Estimated size in bytes
+    """
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value.values())
+    slots = getattr(type(value), '__slots__', None)
+    if slots:
+        # getsizeof() only counts the slot pointers, not the values they hold
+        return sys.getsizeof(value) + sum(estimate_size(getattr(value, name, None)) for name in slots)
+    return sys.getsizeof(value)
+
+class RetrievalCache:
+    """
+    Thread-safe cache of retrieval results keyed by (query, k, threshold, mode).
+
+    Entries expire after a TTL, the least recently used entries are evicted
+    once the estimated memory use exceeds max_bytes, and the whole cache is
+    dropped whenever the index version reported by version_fn changes.
+    """
+    def __init__(self,
+                 ttl: float = DEFAULT_RETRIEVAL_CACHE_TTL,
+                 max_bytes: int = DEFAULT_RETRIEVAL_CACHE_MAX_BYTES,
+                 version_fn: Optional[Callable[[], Hashable]] = None):
+        """
+        Initialize the cache
+
+        Args:
+            ttl: Seconds an entry stays valid (0 disables caching)
+            max_bytes: Estimated memory above which entries are evicted
+            version_fn: Returns the current index version; a change invalidates every entry
+        """
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.version_fn = version_fn
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._bytes = 0
+        self._version = version_fn() if version_fn else None
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(query_text: str, k: int, threshold: float, mode: str = 'dense') -> Tuple[str, int, float, str]:
+        """
+        Build the cache key for a retrieval request
+        """
+        return (normalize_query(query_text), k, threshold, mode)
+
+    def _check_version(self):
+        # Caller holds the lock
+        if self.version_fn is None:
+            return
+        version = self.version_fn()
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._version = version
+
+    def get(self, key: Hashable) -> Optional[List]:
+        """
+        Look up a retrieval result
+
+        Args:
+            key: Key from make_key()
+
+        Returns:
+            A copy of the cached result, or None on a miss
+        """
+        with self._lock:
+            self._check_version()
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                    self._bytes -= entry[2]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[0])
+
+    def put(self, key: Hashable, value: List):
+        """
+        Store a retrieval result
+
+        Args:
+            key: Key from make_key()
+            value: The result list
+        """
+        if self.ttl <= 0:
+            return
+
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._check_version()
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (list(value), time.monotonic() + self.ttl, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Remove all entries
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        """
+        Hit/miss/eviction counters and current size
+
+        Returns:
+            Dictionary of cache statistics
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "index_version": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
@@ -0,0 +1,165 @@
+import os
+import json
+import logging
+from typing import Dict, Iterable, Optional, Set
+
+logger = logging.getLogger('checkpoint')
+
+class IngestCheckpoint:
+    """
+    Durable record of ingestion progress, so an interrupted upload can
+    resume where it stopped.
+
+    The checkpoint is a journal of JSON lines, appended and fsynced as work
+    completes: one line per upserted batch with its chunk IDs, and one
+    line per fully ingested document. Appending keeps every record cheap
+    however long the run, and a line torn by a crash is simply ignored.
+    Chunk IDs are derived from the chunk content, so a resumed run can
+    tell which chunks of a document are already in the index.
+
+    The first line records the ingestion parameters; a checkpoint written
+    with different parameters, or for a different version of a PDF, is
+    not reused.
+    """
+    def __init__(self, path: str, params: str, resume: bool = False):
+        """
+        Open the checkpoint
+
+        Args:
+            path: Path to the checkpoint file
+            params: Description of everything that changes what is written
+                (chunking, embedding model, target index)
+            resume: Load the progress of a previous run instead of starting over
+        """
+        self.path = path
+        self.params = params
+        # source -> {'content_hash': ..., 'complete': bool, 'chunk_ids': set}
+        self.documents: Dict[str, Dict] = {}
+        self._file = None
+
+        if resume and os.path.exists(path):
+            if self._load():
+                self._file = open(path, 'a', encoding='utf-8')
+                logger.info(f"Resuming from checkpoint {path}: {self.completed_count()} documents complete, "
+                            f"{sum(len(entry['chunk_ids']) for entry in self.documents.values())} chunks upserted")
+                return
+            logger.warning(f"Checkpoint {path} was written with different parameters, starting over")
+            self.documents = {}
+        elif resume:
+            logger.info(f"No checkpoint at {path}, starting from the beginning")
+
+        self._file = open(path, 'w', encoding='utf-8')
+        self._append({'params': params})
+
+    def _load(self) -> bool:
+        with open(self.path, 'rb') as file:
+            data = file.read()
+        # A crash while appending leaves at most a torn last line; cut it off
+        # so the next record starts on a line of its own
+        complete_length = data.rfind(b'\n') + 1
+        if complete_length < len(data):
+            logger.warning(f"Ignoring a partially written record at the end of {self.path}")
+            os.truncate(self.path, complete_length)
+
+        records = []
+        for line in data[:complete_length].decode('utf-8').splitlines():
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                logger.warning(f"Ignoring unreadable checkpoint line in {self.path}")
+        if not records or records[0].get('params') != self.params:
+            return False
+
+        for record in records[1:]:
+            source = record.get('source')
+            if source is None:
+                continue
+            entry = self.documents.get(source)
+            if entry is None or entry['content_hash'] != record.get('content_hash'):
+                # A new version of the document invalidates earlier progress
+                entry = {'content_hash': record.get('content_hash'), 'complete': False, 'chunk_ids': set()}
+                self.documents[source] = entry
+            entry['chunk_ids'].update(record.get('chunk_ids', []))
+            if record.get('complete'):
+                entry['complete'] = True
+                entry['chunk_ids'] = set()
+        return True
+
+    def _append(self, record: Dict):
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _entry(self, source: str, content_hash: Optional[str]) -> Optional[Dict]:
+        entry = self.documents.get(source)
+        if entry is None or content_hash is None or entry['content_hash'] != content_hash:
+            return None
+        return entry
+
+    def is_complete(self, source: str, content_hash: Optional[str]) -> bool:
+        """
+        Check whether a document was fully ingested with the same content
+        """
+        entry = self._entry(source, content_hash)
+        return entry is not None and entry['complete']
+
+    def done_ids(self, source: str, content_hash: Optional[str]) -> Set[str]:
+        """
+        Chunk IDs of a document already upserted
+        """
+        entry = self._entry(source, content_hash)
+        return set(entry['chunk_ids']) if entry is not None else set()
+
+    def completed_count(self) -> int:
+        return sum(1 for entry in self.documents.values() if entry['complete'])
+
+    def record_batch(self, source: str, content_hash: Optional[str], chunk_ids: Iterable[str]):
+        """
+        Record chunks the index has durably accepted
+
+        Args:
+            source: Name of the source document
+            content_hash: SHA-256 of the PDF content
+            chunk_ids: IDs of the upserted chunks
+        """
+        if content_hash is None:
+            return
+        chunk_ids = list(chunk_ids)
+        entry = self._entry(source, content_hash)
+        if entry is None:
+            entry = {'content_hash': content_hash, 'complete': False, 'chunk_ids': set()}
+            self.documents[source] = entry
+        entry['chunk_ids'].update(chunk_ids)
+        self._append({'source': source, 'content_hash': content_hash, 'chunk_ids': chunk_ids})
+
+    def record_complete(self, source: str, content_hash: Optional[str]):
+        """
+        Record that a document is fully ingested, so a resumed run skips it
+
+        Args:
+            source: Name of the source document
+            content_hash: SHA-256 of the PDF content
+        """
+        if content_hash is None:
+            return
+        entry = self._entry(source, content_hash)
+        if entry is None:
+            entry = {'content_hash': content_hash, 'complete': False, 'chunk_ids': set()}
+            self.documents[source] = entry
+        entry['complete'] = True
+        # The chunk IDs of a complete document are no longer needed in memory
+        entry['chunk_ids'] = set()
+        self._append({'source': source, 'content_hash': content_hash, 'complete': True})
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def clear(self):
+        """
+        Delete the checkpoint after a run that left nothing to retry
+        """
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,121 @@
+import os
+import mmap
+import logging
+from typing import List, Optional, Sequence, Union
+
+logger = logging.getLogger('chunk_store')
+
+class ChunkTextStore:
+    """
+    Chunk texts kept out of the vector payload, aligned with the rows of
+    the local index.
+
+    Saved texts live in one UTF-8 file that is memory-mapped and sliced by
+    byte offsets, so a query only reads the texts of the matches it
+    returns instead of holding every chunk in memory. Rows added or
+    overwritten since the last save are held in memory until the next
+    write(). Rows move exactly like the rows of the embedding matrix:
+    append, overwrite and swap-remove.
+    """
+    def __init__(self):
+        self._file = None
+        self._data: Optional[mmap.mmap] = None
+        self._offsets: List[int] = [0]
+        # Per row: index of the saved text in the data file, the pending text, or None
+        self._refs: List[Union[int, str, None]] = []
+
+    def __len__(self) -> int:
+        return len(self._refs)
+
+    def open(self, path: str, offsets: Sequence[int], count: int):
+        """
+        Memory-map a data file written by write()
+
+        Args:
+            path: Path to the data file
+            offsets: Byte offsets of the saved texts (one more than the number of texts)
+            count: Number of rows to expose
+        """
+        self.close()
+        self._offsets = list(offsets)
+        if os.path.getsize(path) > 0:
+            self._file = open(path, 'rb')
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if hasattr(mmap, 'MADV_RANDOM'):
+                # Texts are read one match at a time, never sequentially
+                self._data.madvise(mmap.MADV_RANDOM)
+        self._refs = list(range(min(count, len(self._offsets) - 1)))
+
+    def reset(self, texts: Sequence[Optional[str]]):
+        """
+        Replace every row with in-memory texts, e.g. when migrating metadata
+        that still carries the text
+
+        Args:
+            texts: One text (or None) per row
+        """
+        self.close()
+        self._offsets = [0]
+        self._refs = list(texts)
+
+    def close(self):
+        """
+        Release the memory-mapped data file
+        """
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def get(self, row: int) -> Optional[str]:
+        """
+        Text of a row
+
+        Args:
+            row: Row number
+
+        Returns:
+            The chunk text, or None if the row has none
+        """
+        ref = self._refs[row]
+        if ref is None or isinstance(ref, str):
+            return ref
+        return self._data[self._offsets[ref]:self._offsets[ref + 1]].decode('utf-8') if self._data else ''
+
+    def append(self, text: Optional[str]):
+        self._refs.append(text)
+
+    def set(self, row: int, text: Optional[str]):
+        self._refs[row] = text
+
+    def swap_remove(self, row: int):
+        """
+        Remove a row, moving the last row into its place
+
+        Args:
+            row: Row number to remove
+        """
+        last = len(self._refs) - 1
+        if row != last:
+            self._refs[row] = self._refs[last]
+        self._refs.pop()
+
+    def write(self, file) -> List[int]:
+        """
+        Write the text of every row, in row order
+
+        Args:
+            file: Binary file object to write to
+
+        Returns:
+            Byte offsets of the written texts, for open()
+        """
+        offsets = [0]
+        for row in range(len(self._refs)):
+            text = self.get(row)
+            data = text.encode('utf-8') if text else b''
+            file.write(data)
+            offsets.append(offsets[-1] + len(data))
+        return offsets
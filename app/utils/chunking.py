@@ -0,0 +1,190 @@
+import re
+import copy
+import logging
+from bisect import bisect_left, bisect_right
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger('chunking')
+
+CHUNK_UNITS = ('chars', 'tokens')
+# Bump whenever chunk boundaries change, so caches and the sync manifest
+# keyed on the chunking parameters are not reused across versions
+CHUNKER_VERSION = 2
+# Fraction of a chunk, at its end, searched for a paragraph or sentence end to cut at
+BOUNDARY_WINDOW = 0.25
+
+# Two plain patterns scan much faster than one alternation with groups
+_PARAGRAPH_END = re.compile(r'\n\n')
+_SENTENCE_END = re.compile(r'[.?!]\s')
+_SPACE = re.compile(r'\s')
+
+def chunking_key(chunk_size: int, chunk_overlap: int, chunk_unit: str = 'chars') -> str:
+    """
+    Identify the chunking parameters and chunker version, for cache and manifest keys
+
+    Args:
+        chunk_size: Chunk size
+        chunk_overlap: Overlap between chunks
+        chunk_unit: 'chars' or 'tokens'
+
+    Returns:
+        Key string
+    """
+    return f"{chunk_size}|{chunk_overlap}|{chunk_unit}|v{CHUNKER_VERSION}"
+
+def model_tokenizer(model, chunk_size: Optional[int] = None):
+    """
+    Tokenizer of a SentenceTransformer model, for chunking by tokens
+
+    Returns a private copy: a fast tokenizer raises if it is used while
+    the model's encode() changes its truncation settings on another thread.
+
+    Args:
+        model: SentenceTransformer model
+        chunk_size: Chunk size in tokens, checked against the model's sequence limit
+
+    Returns:
+        Fast tokenizer to pass to iter_chunks()
+    """
+    max_tokens = getattr(model, 'max_seq_length', None)
+    # Two positions go to the [CLS] and [SEP] tokens added around every chunk
+    if chunk_size is not None and max_tokens and chunk_size > max_tokens - 2:
+        logger.warning(f"chunk_size={chunk_size} tokens exceeds the {max_tokens - 2} tokens the embedding model "
+                       f"reads; the end of each chunk will be truncated")
+    return copy.deepcopy(model.tokenizer)
+
+class _CharUnits:
+    """
+    Measures text in characters
+    """
+    def __init__(self, text: str):
+        self.count = len(text)
+
+    def index(self, position: int) -> int:
+        return position
+
+    def position(self, index: int) -> int:
+        return index
+
+class _TokenUnits:
+    """
+    Measures text in tokenizer tokens, from the character offset of each token
+    """
+    def __init__(self, text: str, tokenizer):
+        if not getattr(tokenizer, 'is_fast', False):
+            raise ValueError("Chunking by tokens needs a fast tokenizer with offset mappings")
+        encoding = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True,
+                             return_attention_mask=False, return_token_type_ids=False, verbose=False)
+        self.starts = [start for start, _ in encoding['offset_mapping']]
+        self.count = len(self.starts)
+        self.length = len(text)
+
+    def index(self, position: int) -> int:
+        # Number of tokens starting before position
+        return bisect_left(self.starts, position)
+
+    def position(self, index: int) -> int:
+        return self.starts[index] if index < self.count else self.length
+
+def iter_chunk_spans(text: str, chunk_size: int, chunk_overlap: int, tokenizer=None) -> Iterator[Tuple[int, int]]:
+    """
+    Find the character spans of overlapping chunks of a text, lazily
+
+    Paragraph and sentence ends are located once, up front. Each
+    chunk then ends at the last paragraph end, else sentence end, else
+    whitespace in the final quarter of its size limit, or at the limit
+    itself, and never exceeds chunk_size. The next chunk starts chunk_overlap
+    units before that end, moved forward to the start of a word, so
+    consecutive chunks always overlap or touch: together the chunks
+    cover the whole text with no gaps.
+
+    Args:
+        text: The text to chunk
+        chunk_size: Maximum size of a chunk
+        chunk_overlap: Overlap between consecutive chunks, smaller than chunk_size
+        tokenizer: Optional fast (Hugging Face) tokenizer; sizes are then
+            counted in its tokens instead of characters, so chunks fit the
+            embedding model's sequence limit
+
+    Yields:
+        (start, end) character offsets of each chunk, in document order
+
+    Raises:
+        ValueError: If the sizes are invalid or the tokenizer cannot report offsets
+    """
+    if chunk_size <= 0 or chunk_overlap < 0 or chunk_overlap >= chunk_size:
+        raise ValueError(f"Need 0 <= chunk_overlap < chunk_size, got chunk_size={chunk_size}, "
+                         f"chunk_overlap={chunk_overlap}")
+    if not text:
+        return
+
+    units = _TokenUnits(text, tokenizer) if tokenizer is not None else _CharUnits(text)
+    paragraph_ends = [match.end() for match in _PARAGRAPH_END.finditer(text)]
+    sentence_ends = [match.end() for match in _SENTENCE_END.finditer(text)]
+
+    text_length = len(text)
+    window = max(1, int(chunk_size * BOUNDARY_WINDOW))
+    start = 0
+    while True:
+        first = units.index(start)
+        limit = units.position(min(first + chunk_size, units.count))
+        if limit >= text_length:
+            yield start, text_length
+            return
+
+        # Cut after the overlap, so the next chunk starts past this one's start
+        lowest = max(units.position(max(units.index(limit) - window, 0)), units.position(first + chunk_overlap) + 1)
+        end = _last_boundary(paragraph_ends, lowest, limit) or _last_boundary(sentence_ends, lowest, limit)
+        if end is None:
+            space = max(text.rfind(' ', lowest - 1, limit), text.rfind('\n', lowest - 1, limit))
+            end = space + 1 if space >= 0 else limit
+        end = max(end, start + 1)
+        yield start, end
+
+        next_start = units.position(max(units.index(end) - chunk_overlap, first + 1))
+        if 0 < next_start < end and not text[next_start - 1].isspace():
+            space = _SPACE.search(text, next_start, end)
+            if space is not None and space.end() < end:
+                next_start = space.end()
+        start = min(max(next_start, start + 1), end)
+
+def _last_boundary(boundaries: Sequence[int], lowest: int, highest: int) -> Optional[int]:
+    # Last boundary in [lowest, highest]
+    i = bisect_right(boundaries, highest)
+    if i and boundaries[i - 1] >= lowest:
+        return boundaries[i - 1]
+    return None
+
+def iter_chunks(text: str, chunk_size: int, chunk_overlap: int, tokenizer=None) -> Iterator[str]:
+    """
+    Split text into overlapping chunks, lazily
+
+    Args:
+        text: The text to chunk
+        chunk_size: Maximum size of a chunk
+        chunk_overlap: Overlap between consecutive chunks
+        tokenizer: Optional fast tokenizer to count sizes in tokens
+
+    Yields:
+        Text chunks in document order (see iter_chunk_spans())
+    """
+    for start, end in iter_chunk_spans(text, chunk_size, chunk_overlap, tokenizer):
+        yield text[start:end]
+
+def chunk_text(text: str, chunk_size: int, chunk_overlap: int, tokenizer=None) -> List[str]:
+    """
+    Split text into overlapping chunks
+
+    Args:
+        text: The text to chunk
+        chunk_size: Maximum size of a chunk
+        chunk_overlap: Overlap between consecutive chunks
+        tokenizer: Optional fast tokenizer to count sizes in tokens
+
+    Returns:
+        List of text chunks (see iter_chunks())
+    """
+    chunks = list(iter_chunks(text, chunk_size, chunk_overlap, tokenizer))
+    logger.info(f"Created {len(chunks)} chunks from text of length {len(text)} with chunk_size={chunk_size} "
+                f"{'tokens' if tokenizer is not None else 'chars'}, overlap={chunk_overlap}")
+    return chunks
@@ -0,0 +1,60 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+logger = logging.getLogger('coalesce')
+
+class InFlightCoalescer:
+    """
+    Share one execution between concurrent identical requests.
+
+    While a call for a key is running, further calls for the same key await
+    its result instead of starting their own. Once it finishes the key is
+    forgotten, so results are never reused after the fact (that is what the
+    retrieval cache is for). Must be used from a single event loop.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run compute() for a key, or join the run already in flight
+
+        Args:
+            key: Identifies identical requests
+            compute: Coroutine function producing the result
+
+        Returns:
+            The result of compute(); an exception it raises is raised for every waiter
+        """
+        self.calls += 1
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # Shield so one waiter being cancelled does not cancel the shared run
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(compute())
+        self._in_flight[key] = future
+        # Forget the key once the shared run is done, even if every waiter was cancelled
+        future.add_done_callback(lambda _: self._forget(key, future))
+        return await asyncio.shield(future)
+
+    def _forget(self, key: Hashable, future: asyncio.Future):
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+
+    def stats(self) -> Dict:
+        """
+        Call counters and the number of requests currently in flight
+
+        Returns:
+            Dictionary of coalescing statistics
+        """
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight)
+        }
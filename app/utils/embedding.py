@@ -0,0 +1,198 @@
+import time
+import logging
+import numpy as np
+from typing import Dict, Sequence
+
+logger = logging.getLogger('embedding')
+
+DEFAULT_EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+# Output size of DEFAULT_EMBEDDING_MODEL, for tools that check an index without loading the model
+DEFAULT_EMBEDDING_DIMENSION = 384
+DEFAULT_EMBED_BATCH_SIZE = 64
+
+# How embeddings are computed: full-precision PyTorch, or an ONNX Runtime
+# export on CPU, in float32 or with dynamic int8 quantization
+EMBEDDING_BACKENDS = ('torch', 'onnx', 'onnx-int8')
+DEFAULT_ONNX_DIR = 'onnx_models'
+# Least cosine similarity to the PyTorch embeddings of PARITY_TEXTS an ONNX
+# variant must reach; float32 differs by rounding only, int8 by a little more
+PARITY_MIN_COSINE = {'onnx': 0.9999, 'onnx-int8': 0.97}
+PARITY_TEXTS = [
+    "How does sFold predict RNA secondary structure?",
+    "Boltzmann-weighted sampling of the secondary structure ensemble",
+    "Target accessibility is a major determinant of siRNA efficacy.",
+    "STarMir models microRNA binding sites with logistic regression on structural and sequence features "
+    "such as seed match type, site accessibility, and AU content of the flanking regions.",
+    "Rapid generation of microRNA sponges",
+    "ok",
+]
+
+# Thread count fixed for the whole process, e.g. by a pre-forking server (0 when not set)
+_embedding_threads = 0
+
+def embedding_model_key(model_name: str, backend: str = 'torch') -> str:
+    """
+    Identify the embeddings a model and backend produce, for cache and manifest keys
+
+    ONNX float32 reproduces the PyTorch embeddings up to rounding, so the two
+    share cached embeddings; int8 embeddings differ slightly and do not.
+
+    Args:
+        model_name: SentenceTransformer model name
+        backend: One of EMBEDDING_BACKENDS
+
+    Returns:
+        Key string
+    """
+    return f"{model_name}+int8" if backend == 'onnx-int8' else model_name
+
+def set_embedding_threads(threads: int, model=None):
+    """
+    Fix the number of threads embedding inference uses in this process
+
+    Applies to torch, to models loaded afterwards (overriding their threads
+    argument), and to an already loaded ONNX model, whose session is recreated.
+
+    Args:
+        threads: Number of threads (0 keeps the library default)
+        model: Optional model returned by load_embedding_model()
+    """
+    global _embedding_threads
+    _embedding_threads = threads
+    if threads:
+        try:
+            import torch
+            torch.set_num_threads(threads)
+        except ImportError:
+            pass
+    if model is not None and hasattr(model, 'set_num_threads'):
+        model.set_num_threads(threads)
+
+def load_embedding_model(model_name: str = DEFAULT_EMBEDDING_MODEL,
+                         backend: str = 'torch',
+                         threads: int = 0,
+                         onnx_dir: str = DEFAULT_ONNX_DIR):
+    """
+    Load the embedding model for the configured backend
+
+    The ONNX backends export the model on first use (see
+    export_onnx_model()), and only keep an export whose embeddings match
+    the PyTorch model within PARITY_MIN_COSINE.
+
+    Args:
+        model_name: SentenceTransformer model name
+        backend: One of EMBEDDING_BACKENDS
+        threads: Threads used for inference, 0 for the library default; a
+            count fixed with set_embedding_threads() takes precedence
+        onnx_dir: Root directory of ONNX exports
+
+    Returns:
+        Model with SentenceTransformer's encode(), get_sentence_embedding_dimension(),
+        tokenizer and max_seq_length
+
+    Raises:
+        ValueError: If the backend is unknown or an ONNX export fails the parity check
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of {', '.join(EMBEDDING_BACKENDS)}")
+    threads = _embedding_threads or threads
+    start_time = time.time()
+
+    if backend == 'torch':
+        from sentence_transformers import SentenceTransformer
+
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        model = SentenceTransformer(model_name)
+    else:
+        from app.utils.onnx_embedding import OnnxEmbeddingModel, export_onnx_model
+
+        path = export_onnx_model(model_name, onnx_dir, quantize=backend == 'onnx-int8')
+        model = OnnxEmbeddingModel(path, quantized=backend == 'onnx-int8', threads=threads)
+
+    logger.info(f"Loaded embedding model {model_name} with the {backend} backend in {time.time() - start_time:.2f}s "
+                f"(threads={threads or 'default'})")
+    return model
+
+def check_parity(model, reference, variant: str, texts: Sequence[str] = PARITY_TEXTS) -> Dict[str, float]:
+    """
+    Compare a model's embeddings with those of a reference model
+
+    Args:
+        model: Model to check, e.g. an ONNX export
+        reference: The PyTorch SentenceTransformer it was made from
+        variant: Backend name, selecting the tolerance in PARITY_MIN_COSINE
+        texts: Texts embedded by both models
+
+    Returns:
+        Dictionary with the min and mean cosine similarity and the max absolute difference
+
+    Raises:
+        ValueError: If the min cosine similarity is below the variant's tolerance
+    """
+    expected = np.asarray(reference.encode(list(texts), convert_to_numpy=True, show_progress_bar=False), dtype=np.float32)
+    actual = np.asarray(model.encode(list(texts)), dtype=np.float32)
+    norms = np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1)
+    cosine = (expected * actual).sum(axis=1) / np.maximum(norms, 1e-12)
+    parity = {
+        'min_cosine': float(cosine.min()),
+        'mean_cosine': float(cosine.mean()),
+        'max_abs_diff': float(np.abs(expected - actual).max()),
+    }
+
+    tolerance = PARITY_MIN_COSINE.get(variant, PARITY_MIN_COSINE['onnx'])
+    if parity['min_cosine'] < tolerance:
+        raise ValueError(f"{variant} embeddings do not match the PyTorch model: min cosine similarity "
+                         f"{parity['min_cosine']:.5f} < {tolerance}")
+    logger.info(f"{variant} embeddings match the PyTorch model: min cosine similarity {parity['min_cosine']:.5f}, "
+                f"max abs difference {parity['max_abs_diff']:.2e}")
+    return parity
+
+def encode_batched(model,
+                   texts: Sequence[str],
+                   batch_size: int = DEFAULT_EMBED_BATCH_SIZE,
+                   sort_by_length: bool = True) -> np.ndarray:
+    """
+    Embed a list of texts in batches
+
+    Texts are grouped by length before batching so each batch is padded
+    to a similar length, then the embeddings are put back in input order.
+
+    Args:
+        model: SentenceTransformer model (anything with a compatible encode())
+        texts: Texts to embed
+        batch_size: Number of texts per forward pass
+        sort_by_length: Whether to group texts of similar length together
+
+    Returns:
+        float32 array of shape (len(texts), dimension)
+    """
+    if len(texts) == 0:
+        return np.zeros((0, 0), dtype=np.float32)
+
+    batch_size = max(1, batch_size)
+    start_time = time.time()
+
+    if sort_by_length:
+        order = np.argsort([-len(text) for text in texts], kind='stable')
+    else:
+        order = np.arange(len(texts))
+
+    batches = []
+    for i in range(0, len(texts), batch_size):
+        batch = [texts[j] for j in order[i:i + batch_size]]
+        batches.append(np.asarray(
+            model.encode(batch, batch_size=len(batch), convert_to_numpy=True, show_progress_bar=False),
+            dtype=np.float32
+        ))
+
+    sorted_embeddings = np.concatenate(batches, axis=0)
+    embeddings = np.empty_like(sorted_embeddings)
+    embeddings[order] = sorted_embeddings
+
+    elapsed = time.time() - start_time
+    rate = len(texts) / elapsed if elapsed > 0 else float('inf')
+    logger.info(f"Embedded {len(texts)} chunks in {elapsed:.2f}s ({rate:.1f} chunks/sec, batch_size={batch_size})")
+
+    return embeddings
@@ -0,0 +1,23 @@
+class VectorStoreError(Exception):
+    """
+    Base class for failures while retrieving chunks from the vector store
+    """
+
+class BackendUnavailableError(VectorStoreError):
+    """
+    The index backend could not be reached or failed to answer a query
+    """
+
+class EmbeddingError(VectorStoreError):
+    """
+    A query could not be turned into an embedding
+    """
+
+class IndexSchemaError(VectorStoreError):
+    """
+    The index stores vectors of a different dimension or metric than the
+    embedding model produces, so every write and query against it fails
+    """
+
+# Shown to users in place of an answer when retrieval fails
+UNAVAILABLE_MESSAGE = "Vector database API is currently unavailable. Please try again later."
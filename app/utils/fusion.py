@@ -0,0 +1,33 @@
+from typing import Dict, List, Sequence
+from app.utils.results import RetrievedChunk
+
+# Rank offset of reciprocal rank fusion; 60 is the value from the original paper
+DEFAULT_RRF_K = 60
+
+def reciprocal_rank_fusion(rankings: Sequence[List[RetrievedChunk]], top_k: int,
+                           rrf_k: int = DEFAULT_RRF_K) -> List[RetrievedChunk]:
+    """
+    Merge several rankings of the same chunks with reciprocal rank fusion
+
+    Each chunk scores sum(1 / (rrf_k + rank)) over the rankings it appears
+    in, so only ranks matter and BM25 and cosine scores need no calibration.
+
+    Args:
+        rankings: Lists of results, each ordered best first
+        top_k: Number of chunks to return
+        rrf_k: Rank offset; larger values flatten the difference between ranks
+
+    Returns:
+        List of RetrievedChunk results carrying their fused score, best first
+    """
+    fused: Dict[str, float] = {}
+    chunks: Dict[str, RetrievedChunk] = {}
+    for ranking in rankings:
+        for rank, chunk in enumerate(ranking, start=1):
+            fused[chunk.id] = fused.get(chunk.id, 0.0) + 1.0 / (rrf_k + rank)
+            chunks.setdefault(chunk.id, chunk)
+
+    best = sorted(fused, key=fused.get, reverse=True)[:top_k]
+    return [RetrievedChunk(id=chunk_id, score=fused[chunk_id], text=chunks[chunk_id].text,
+                           source=chunks[chunk_id].source, chunk_index=chunks[chunk_id].chunk_index)
+            for chunk_id in best]
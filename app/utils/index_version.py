@@ -0,0 +1,79 @@
+import os
+import time
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger('index_version')
+
+def read_index_version(path: str) -> int:
+    """
+    Read the current index version
+
+    Args:
+        path: Path to the version file
+
+    Returns:
+        The version, or 0 if the file does not exist yet
+    """
+    try:
+        with open(path, 'r') as file:
+            return int(file.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+def bump_index_version(path: str) -> int:
+    """
+    Record that the index contents changed
+
+    Ingestion calls this after writing or deleting vectors so that servers,
+    possibly in other processes, drop cached retrieval results. The new
+    version is never lower than the current time in nanoseconds, so two
+    writers racing on the file still both move the version forward.
+
+    Args:
+        path: Path to the version file
+
+    Returns:
+        The new version
+    """
+    version = max(read_index_version(path) + 1, time.time_ns())
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as file:
+        file.write(str(version))
+    os.replace(tmp_path, path)
+    logger.info(f"Index version bumped to {version}")
+    return version
+
+class IndexVersionWatcher:
+    """
+    Cheap repeated reads of the index version: the file is only re-read when
+    its modification time changes.
+    """
+    def __init__(self, path: str):
+        """
+        Initialize the watcher
+
+        Args:
+            path: Path to the version file
+        """
+        self.path = path
+        self._mtime = None
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def get(self) -> int:
+        """
+        Current index version
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+
+        with self._lock:
+            if mtime != self._mtime:
+                self._version = read_index_version(self.path) if mtime is not None else 0
+                self._mtime = mtime
+            return self._version
@@ -0,0 +1,261 @@
+import os
+import hashlib
+import logging
+import tempfile
+import numpy as np
+from typing import Iterator, Optional, Sequence, Tuple
+from app.utils.chunking import chunking_key
+
+logger = logging.getLogger('ingest_cache')
+
+DEFAULT_CACHE_DIR = '.ingest_cache'
+DEFAULT_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+def file_sha256(path: str) -> str:
+    """
+    Hash a file's content without reading it into memory at once
+
+    Args:
+        path: Path to the file
+
+    Returns:
+        Hex SHA-256 digest of the file content
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def embedding_cache_key(content_hash: str, chunk_size: int, chunk_overlap: int, model_name: str,
+                        chunk_unit: str = 'chars') -> str:
+    """
+    Build the cache key for the chunk embeddings of one document
+
+    Args:
+        content_hash: SHA-256 of the PDF content
+        chunk_size: Chunk size used to split the text
+        chunk_overlap: Overlap used to split the text
+        model_name: Name of the embedding model
+        chunk_unit: Unit of the chunk size and overlap, 'chars' or 'tokens'
+
+    Returns:
+        Hex digest identifying the embeddings
+    """
+    key = f"{content_hash}|{chunking_key(chunk_size, chunk_overlap, chunk_unit)}|{model_name}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+class IngestCache:
+    """
+    On-disk, content-addressed cache of extracted PDF text and chunk embeddings.
+
+    Text is stored as raw UTF-8 and embeddings as .npy float32 arrays that are
+    memory-mapped on read. Entries are evicted least-recently-used first once
+    the cache grows past max_bytes.
+    """
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        """
+        Initialize the cache
+
+        Args:
+            cache_dir: Directory holding the cache files
+            max_bytes: Total size above which old entries are evicted
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.text_dir = os.path.join(cache_dir, 'text')
+        self.embedding_dir = os.path.join(cache_dir, 'embeddings')
+        os.makedirs(self.text_dir, exist_ok=True)
+        os.makedirs(self.embedding_dir, exist_ok=True)
+
+    def _text_path(self, content_hash: str) -> str:
+        return os.path.join(self.text_dir, f"{content_hash}.txt")
+
+    def _embedding_path(self, key: str) -> str:
+        return os.path.join(self.embedding_dir, f"{key}.npy")
+
+    def _touch(self, path: str):
+        # Eviction order follows mtime, refreshed on every hit, since atime
+        # is often disabled on the mounts this runs on
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _write_atomic(self, path: str, write):
+        directory = os.path.dirname(path)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                write(file)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def get_text(self, content_hash: str) -> Optional[str]:
+        """
+        Look up the extracted text of a PDF
+
+        Args:
+            content_hash: SHA-256 of the PDF content
+
+        Returns:
+            The cached text, or None on a miss
+        """
+        path = self._text_path(content_hash)
+        try:
+            with open(path, 'rb') as file:
+                text = file.read().decode('utf-8')
+        except (OSError, UnicodeDecodeError):
+            return None
+        self._touch(path)
+        return text
+
+    def put_text(self, content_hash: str, text: str):
+        """
+        Store the extracted text of a PDF
+
+        Args:
+            content_hash: SHA-256 of the PDF content
+            text: Extracted text
+        """
+        data = text.encode('utf-8')
+        self._write_atomic(self._text_path(content_hash), lambda file: file.write(data))
+
+    def get_embeddings(self, key: str, expected_rows: Optional[int] = None) -> Optional[np.ndarray]:
+        """
+        Look up chunk embeddings as a read-only memory-mapped array
+
+        Args:
+            key: Key from embedding_cache_key()
+            expected_rows: Number of chunks the caller expects; other sizes count as a miss
+
+        Returns:
+            float32 array of shape (chunks, dimension), or None on a miss
+        """
+        path = self._embedding_path(key)
+        try:
+            embeddings = np.load(path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        if expected_rows is not None and embeddings.shape[0] != expected_rows:
+            return None
+        self._touch(path)
+        return embeddings
+
+    def put_embeddings(self, key: str, embeddings: np.ndarray):
+        """
+        Store chunk embeddings
+
+        Args:
+            key: Key from embedding_cache_key()
+            embeddings: Array of shape (chunks, dimension)
+        """
+        array = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self._write_atomic(self._embedding_path(key), lambda file: np.save(file, array))
+
+    def size_bytes(self) -> int:
+        """
+        Total size of all cache entries in bytes
+        """
+        return sum(size for _, _, size in self._entries())
+
+    def _entries(self):
+        entries = []
+        for directory in (self.text_dir, self.embedding_dir):
+            for name in os.listdir(directory):
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, path, stat.st_size))
+        return entries
+
+    def evict(self):
+        """
+        Delete least-recently-used entries until the cache fits in max_bytes
+        """
+        entries = self._entries()
+        total = sum(size for _, _, size in entries)
+        if total <= self.max_bytes:
+            return
+
+        for _, path, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                logger.info(f"Evicted {os.path.basename(path)} from ingest cache")
+            except OSError:
+                pass
+
+def iter_documents_cached(extractor, pdf_paths: Sequence[str], cache: Optional[IngestCache] = None,
+                          max_pending: Optional[int] = None) -> Iterator[Tuple[str, str, str]]:
+    """
+    Yield document text, serving unchanged PDFs from the cache and
+    extracting the rest with the extractor
+
+    Args:
+        extractor: PDFExtractor used for cache misses
+        pdf_paths: Paths to the PDF files
+        cache: Optional IngestCache; without one every file is extracted
+        max_pending: Maximum number of documents being extracted at once (default: all)
+
+    Yields:
+        (pdf_path, text, content_hash) tuples; content_hash is None for unreadable files
+    """
+    hashes = {}
+    for pdf_path in pdf_paths:
+        try:
+            hashes[pdf_path] = file_sha256(pdf_path)
+        except OSError as e:
+            logger.error(f"Error reading {pdf_path}: {str(e)}")
+            hashes[pdf_path] = None
+
+    misses = []
+    for pdf_path in pdf_paths:
+        text = None
+        if cache is not None and hashes[pdf_path] is not None:
+            text = cache.get_text(hashes[pdf_path])
+        if text is None:
+            misses.append(pdf_path)
+        else:
+            logger.info(f"Using cached text for {pdf_path}")
+            yield pdf_path, text, hashes[pdf_path]
+
+    for pdf_path, text in extractor.iter_documents(misses, max_pending=max_pending):
+        if cache is not None and text and hashes[pdf_path] is not None:
+            cache.put_text(hashes[pdf_path], text)
+        yield pdf_path, text, hashes[pdf_path]
+
+def embed_cached(embed_fn, texts: Sequence[str], key: Optional[str] = None,
+                 cache: Optional[IngestCache] = None) -> np.ndarray:
+    """
+    Embed texts, reusing embeddings cached under key when present
+
+    Args:
+        embed_fn: Function mapping a list of texts to a (len, dimension) array
+        texts: Texts to embed
+        key: Key from embedding_cache_key()
+        cache: Optional IngestCache
+
+    Returns:
+        Array of shape (len(texts), dimension)
+    """
+    if cache is not None and key is not None:
+        embeddings = cache.get_embeddings(key, expected_rows=len(texts))
+        if embeddings is not None:
+            logger.info(f"Using {len(texts)} cached embeddings")
+            return embeddings
+
+    embeddings = np.asarray(embed_fn(texts), dtype=np.float32)
+    if cache is not None and key is not None and len(texts) > 0:
+        cache.put_embeddings(key, embeddings)
+    return embeddings
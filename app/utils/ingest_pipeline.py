@@ -0,0 +1,252 @@
+import os
+import logging
+import numpy as np
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from app.utils.pipeline import Pipeline, Stage, DEFAULT_QUEUE_SIZE
+from app.utils.sync import make_chunk_id
+
+logger = logging.getLogger('ingest_pipeline')
+
+DEFAULT_CHUNK_WORKERS = 1
+DEFAULT_EMBED_WORKERS = 1
+# Whole documents are large compared to batches, so fewer of them wait in line
+DEFAULT_DOCUMENT_QUEUE_SIZE = 2
+
+class IngestDocument:
+    """
+    One PDF on its way through the ingestion pipeline.
+
+    Created by the chunk stage and split into ChunkBatches. Results of the
+    batches are recorded in the consumer's thread only, so the counters
+    need no locking.
+    """
+    def __init__(self, path: str, content_hash: Optional[str], chunks: List[str], extracted: bool = True):
+        self.path = path
+        self.source = os.path.basename(path)
+        self.content_hash = content_hash
+        self.chunks = chunks
+        self.extracted = extracted
+        # Positions of the chunks to embed and write, set by the plan function
+        self.positions: List[int] = []
+        # One row per chunk: precomputed (e.g. cached) or filled in as batches complete
+        self.embeddings: Optional[np.ndarray] = None
+        self.precomputed = False
+        # Free-form data attached by the plan function, e.g. sync bookkeeping
+        self.context: Dict[str, Any] = {}
+        self.batches = 0
+        self.completed = 0
+        self.embedded = 0
+        self.uploaded = 0
+        self.failed = 0
+        self.errors: List[str] = []
+
+    def use_embeddings(self, embeddings: np.ndarray):
+        """
+        Reuse embeddings computed earlier instead of running the model
+
+        Args:
+            embeddings: Array with one row per chunk
+        """
+        self.embeddings = embeddings
+        self.precomputed = True
+
+    @property
+    def done(self) -> bool:
+        return self.completed >= self.batches
+
+    def record(self, batch: 'ChunkBatch'):
+        """
+        Account for a batch that went through every stage
+
+        Args:
+            batch: Completed batch of this document
+        """
+        self.completed += 1
+        if not batch.positions:
+            return
+        if batch.error is None:
+            self.uploaded += len(batch.positions)
+        else:
+            self.failed += len(batch.positions)
+            self.errors.append(batch.error)
+
+        if batch.embeddings is not None and not self.precomputed:
+            if self.embeddings is None:
+                self.embeddings = np.zeros((len(self.chunks), batch.embeddings.shape[1]), dtype=np.float32)
+            self.embeddings[batch.positions] = batch.embeddings
+            self.embedded += len(batch.positions)
+
+    def embedding_matrix(self) -> Optional[np.ndarray]:
+        """
+        Embeddings of every chunk, e.g. for the embedding cache
+
+        Repeated chunks share the row of their first occurrence and blank
+        chunks get zeros, since neither is embedded.
+
+        Returns:
+            Array with one row per chunk, or None if some chunks were not embedded
+        """
+        if self.precomputed or not self.chunks:
+            return self.embeddings
+        if self.embeddings is None or self.embedded < len(self.positions):
+            return None
+
+        planned = set(self.positions)
+        rows = {make_chunk_id(self.source, self.chunks[position]): position for position in self.positions}
+        for position, chunk in enumerate(self.chunks):
+            if position in planned or not chunk.strip():
+                continue
+            first = rows.get(make_chunk_id(self.source, chunk))
+            if first is None:
+                return None
+            self.embeddings[position] = self.embeddings[first]
+        return self.embeddings
+
+class ChunkBatch:
+    """
+    Chunks of one document embedded and upserted together
+    """
+    __slots__ = ('document', 'positions', 'embeddings', 'vectors', 'error')
+
+    def __init__(self, document: IngestDocument, positions: List[int]):
+        self.document = document
+        self.positions = positions
+        self.embeddings: Optional[np.ndarray] = None
+        self.vectors: Optional[List[Tuple]] = None
+        self.error: Optional[str] = None
+
+def unique_positions(document: IngestDocument) -> List[int]:
+    """
+    Positions of the non-blank chunks of a document, keeping only the first
+    of chunks with identical text (they map to the same vector ID)
+
+    Args:
+        document: Chunked document
+
+    Returns:
+        Chunk positions in document order
+    """
+    positions = []
+    seen = set()
+    for position, chunk in enumerate(document.chunks):
+        if not chunk.strip():
+            continue
+        chunk_id = make_chunk_id(document.source, chunk)
+        if chunk_id not in seen:
+            seen.add(chunk_id)
+            positions.append(position)
+    return positions
+
+def build_ingest_pipeline(chunk_fn: Callable[[str], List[str]],
+                          embed_fn: Callable[[List[str]], Any],
+                          upsert_fn: Callable[[List[Tuple]], Optional[str]],
+                          plan_fn: Callable[[IngestDocument], Sequence[int]] = unique_positions,
+                          batch_size: int = 100,
+                          chunk_workers: int = DEFAULT_CHUNK_WORKERS,
+                          embed_workers: int = DEFAULT_EMBED_WORKERS,
+                          upsert_workers: int = 1,
+                          queue_size: int = DEFAULT_QUEUE_SIZE,
+                          document_queue_size: int = DEFAULT_DOCUMENT_QUEUE_SIZE) -> Pipeline:
+    """
+    Build the chunk -> embed -> upsert pipeline fed by extracted documents
+
+    Every boundary is a plain function, so each stage can be exercised
+    with a local fake (e.g. an embed_fn returning random vectors and an
+    upsert_fn writing to a dict).
+
+    Args:
+        chunk_fn: Splits a document's text into chunks
+        embed_fn: Maps a list of texts to an array of shape (len, dimension)
+        upsert_fn: Writes a list of (id, values, metadata) tuples; returns None
+            on success or an error message (e.g. BatchUpserter.upsert_batch)
+        plan_fn: Picks the positions of the chunks to write, and may attach
+            precomputed embeddings or context to the document
+        batch_size: Number of chunks per batch, i.e. per upsert request
+        chunk_workers: Threads splitting documents into chunks
+        embed_workers: Threads running the embedding model
+        upsert_workers: Threads sending upsert requests
+        queue_size: Capacity of the queues of batches between stages
+        document_queue_size: Capacity of the queue of extracted documents
+
+    Returns:
+        Pipeline taking (pdf_path, text, content_hash) tuples, to run with run_ingest()
+    """
+    batch_size = max(1, batch_size)
+
+    def chunk(item: Tuple[str, str, Optional[str]]) -> Iterator[ChunkBatch]:
+        pdf_path, text, content_hash = item
+        document = IngestDocument(pdf_path, content_hash, chunk_fn(text) if text else [], extracted=bool(text))
+        if document.chunks:
+            document.positions = list(plan_fn(document))
+
+        # A document with nothing to write still passes through as one empty
+        # batch, so the consumer sees every document exactly once
+        groups = [document.positions[i:i + batch_size] for i in range(0, len(document.positions), batch_size)]
+        groups = groups or [[]]
+        document.batches = len(groups)
+        for positions in groups:
+            yield ChunkBatch(document, positions)
+
+    def embed(batch: ChunkBatch) -> ChunkBatch:
+        document = batch.document
+        if not batch.positions:
+            return batch
+        try:
+            if document.precomputed:
+                embeddings = np.asarray(document.embeddings[batch.positions], dtype=np.float32)
+            else:
+                embeddings = np.asarray(embed_fn([document.chunks[position] for position in batch.positions]),
+                                        dtype=np.float32)
+        except Exception as e:
+            logger.error(f"Error embedding {len(batch.positions)} chunks from {document.source}: {str(e)}")
+            batch.error = str(e)
+            return batch
+
+        batch.embeddings = embeddings
+        batch.vectors = [
+            (make_chunk_id(document.source, document.chunks[position]), embedding.tolist(), {
+                "source": document.source,
+                "chunk_index": position,
+                "total_chunks": len(document.chunks),
+                "text": document.chunks[position]
+            })
+            for position, embedding in zip(batch.positions, embeddings)
+        ]
+        return batch
+
+    def upsert(batch: ChunkBatch) -> ChunkBatch:
+        if batch.vectors and batch.error is None:
+            batch.error = upsert_fn(batch.vectors)
+        # The payload is not needed downstream; drop it to keep memory flat
+        batch.vectors = None
+        return batch
+
+    def batch_size_of(batch: ChunkBatch) -> int:
+        return len(batch.positions)
+
+    return Pipeline([
+        Stage('chunk', chunk, workers=chunk_workers, queue_size=document_queue_size, fan_out=True),
+        Stage('embed', embed, workers=embed_workers, queue_size=queue_size, size=batch_size_of),
+        Stage('upsert', upsert, workers=upsert_workers, queue_size=queue_size, size=batch_size_of),
+    ], source_name='extract')
+
+def run_ingest(pipeline: Pipeline, documents: Iterable[Tuple[str, str, Optional[str]]],
+               on_batch: Optional[Callable[[ChunkBatch], None]] = None) -> Iterator[IngestDocument]:
+    """
+    Run documents through an ingestion pipeline
+
+    Args:
+        pipeline: Pipeline from build_ingest_pipeline()
+        documents: (pdf_path, text, content_hash) tuples, e.g. from iter_documents_cached()
+        on_batch: Optional function called with every completed batch, e.g. to checkpoint progress
+
+    Yields:
+        Each document once all of its batches went through every stage, in completion order
+    """
+    for batch in pipeline.run(documents):
+        document = batch.document
+        document.record(batch)
+        if on_batch is not None:
+            on_batch(batch)
+        if document.done:
+            yield document
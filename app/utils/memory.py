@@ -0,0 +1,52 @@
+import os
+from typing import Dict, Optional
+
+# Fields of /proc/<pid>/smaps_rollup reported by process_memory(), in kB
+SMAPS_FIELDS = {
+    'Rss': 'rss_mb',
+    'Pss': 'pss_mb',
+    'Shared_Clean': 'shared_clean_mb',
+    'Shared_Dirty': 'shared_dirty_mb',
+    'Private_Clean': 'private_clean_mb',
+    'Private_Dirty': 'private_dirty_mb',
+}
+
+def process_memory(pid: Optional[int] = None) -> Optional[Dict]:
+    """
+    Memory use of a process, split into shared and private pages
+
+    PSS (proportional set size) charges each shared page to the processes
+    mapping it in equal parts, so summing it over preforked workers gives
+    their real footprint, unlike RSS which counts the shared model once
+    per worker. Private_Dirty is what a worker has copied on write.
+
+    Args:
+        pid: Process ID (the current process if None)
+
+    Returns:
+        Dictionary of sizes in MB plus the pid, or None if /proc is unavailable
+    """
+    pid = pid or os.getpid()
+    memory = {'pid': pid}
+
+    try:
+        with open(f'/proc/{pid}/smaps_rollup', 'r') as file:
+            for line in file:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].rstrip(':') in SMAPS_FIELDS:
+                    memory[SMAPS_FIELDS[parts[0].rstrip(':')]] = round(int(parts[1]) / 1024, 1)
+        return memory
+    except (OSError, ValueError):
+        pass
+
+    # Kernels before 4.14 have no smaps_rollup; fall back to RSS only
+    try:
+        with open(f'/proc/{pid}/status', 'r') as file:
+            for line in file:
+                if line.startswith('VmRSS:'):
+                    memory['rss_mb'] = round(int(line.split()[1]) / 1024, 1)
+                    return memory
+    except (OSError, ValueError):
+        pass
+
+    return None
@@ -0,0 +1,274 @@
+import os
+import json
+import time
+import shutil
+import inspect
+import logging
+import threading
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Union
+
+logger = logging.getLogger('onnx_embedding')
+
+ONNX_FILE = 'model.onnx'
+ONNX_INT8_FILE = 'model-int8.onnx'
+EXPORT_CONFIG_FILE = 'embedding_config.json'
+# Bump whenever the export changes, so older exports are redone
+EXPORT_VERSION = 1
+ONNX_OPSET = 14
+# Inputs a BERT-style encoder may take, in the order of its forward() arguments
+_INPUT_NAMES = ('input_ids', 'attention_mask', 'token_type_ids')
+
+def export_path(export_dir: str, model_name: str) -> str:
+    """
+    Directory holding the ONNX export of a model
+
+    Args:
+        export_dir: Root directory of ONNX exports
+        model_name: SentenceTransformer model name
+
+    Returns:
+        Path of the model's export directory
+    """
+    return os.path.join(export_dir, model_name.replace('/', '__'))
+
+def read_export_config(path: str) -> Optional[Dict]:
+    """
+    Read the description written next to an export, or None if the export is missing or outdated
+    """
+    config_path = os.path.join(path, EXPORT_CONFIG_FILE)
+    if not os.path.exists(config_path):
+        return None
+    with open(config_path, 'r', encoding='utf-8') as file:
+        config = json.load(file)
+    if config.get('version') != EXPORT_VERSION:
+        return None
+    return config
+
+def _write_export_config(path: str, config: Dict):
+    tmp_path = os.path.join(path, EXPORT_CONFIG_FILE + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(config, file, indent=2)
+    os.replace(tmp_path, os.path.join(path, EXPORT_CONFIG_FILE))
+
+def _pooling_mode(pooling) -> str:
+    # sentence-transformers 2.x describes pooling with one flag per mode, later versions by name
+    config = pooling.get_config_dict()
+    if 'pooling_mode' in config:
+        return config['pooling_mode']
+    modes = [key[len('pooling_mode_'):] for key, value in config.items() if key.startswith('pooling_mode_') and value]
+    names = {'cls_token': 'cls', 'mean_tokens': 'mean'}
+    return names.get(modes[0], modes[0]) if len(modes) == 1 else '+'.join(modes)
+
+def export_onnx_model(model_name: str, export_dir: str, quantize: bool = False) -> str:
+    """
+    Export a SentenceTransformer model to ONNX, once
+
+    The transformer is exported on its own, producing token embeddings;
+    pooling and normalization are a few NumPy operations done by
+    OnnxEmbeddingModel. With quantize, the export is also converted to
+    dynamic int8 quantization, where weights are stored as int8 and
+    activations are quantized on the fly, which suits CPUs without a GPU.
+
+    Needs torch, sentence-transformers, onnx and onnxruntime; serving from
+    an existing export only needs onnxruntime and transformers.
+
+    Args:
+        model_name: SentenceTransformer model name
+        export_dir: Root directory of ONNX exports
+        quantize: Whether to also write the int8 variant
+
+    Returns:
+        Path of the model's export directory
+    """
+    path = export_path(export_dir, model_name)
+    config = read_export_config(path)
+    variants = ('onnx', 'onnx-int8') if quantize else ('onnx',)
+    if config is not None and all(variant in config['parity'] for variant in variants):
+        return path
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    start_time = time.time()
+    os.makedirs(path, exist_ok=True)
+    reference = SentenceTransformer(model_name, device='cpu')
+    transformer, pooling = reference[0], reference[1]
+    pooling_mode = _pooling_mode(pooling)
+    if pooling_mode not in ('mean', 'cls'):
+        raise ValueError(f"Pooling mode '{pooling_mode}' of {model_name} is not supported by the ONNX backend")
+
+    if config is None:
+        class TokenEmbeddings(torch.nn.Module):
+            # The encoder's forward() returns a model output object; export only the token embeddings
+            def __init__(self, model):
+                super().__init__()
+                self.model = model
+
+            def forward(self, *inputs):
+                return self.model(**dict(zip(input_names, inputs)))[0]
+
+        sample = transformer.tokenizer(["An example sentence to trace the model with."], return_tensors='pt')
+        input_names = [name for name in _INPUT_NAMES if name in sample]
+        dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+        dynamic_axes['token_embeddings'] = {0: 'batch', 1: 'sequence'}
+
+        # Recent torch versions default to the dynamo exporter, which needs onnxscript;
+        # the TorchScript exporter handles these encoders with no extra dependency
+        options = {'dynamo': False} if 'dynamo' in inspect.signature(torch.onnx.export).parameters else {}
+
+        logger.info(f"Exporting {model_name} to ONNX at {path}")
+        with torch.no_grad():
+            torch.onnx.export(TokenEmbeddings(transformer.auto_model.eval()),
+                              tuple(sample[name] for name in input_names),
+                              os.path.join(path, ONNX_FILE),
+                              input_names=input_names, output_names=['token_embeddings'],
+                              dynamic_axes=dynamic_axes, opset_version=ONNX_OPSET, do_constant_folding=True,
+                              **options)
+        transformer.tokenizer.save_pretrained(path)
+        config = {
+            'version': EXPORT_VERSION,
+            'model_name': model_name,
+            'input_names': input_names,
+            'pooling': pooling_mode,
+            'normalize': any(type(module).__name__ == 'Normalize' for module in reference),
+            'max_seq_length': reference.max_seq_length,
+            'dimension': reference.get_sentence_embedding_dimension(),
+            'parity': {},
+        }
+        _write_export_config(path, config)
+
+    if quantize and not os.path.exists(os.path.join(path, ONNX_INT8_FILE)):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        logger.info(f"Quantizing the ONNX export of {model_name} to int8")
+        tmp_path = os.path.join(path, ONNX_INT8_FILE + '.tmp')
+        quantize_dynamic(os.path.join(path, ONNX_FILE), tmp_path, weight_type=QuantType.QInt8)
+        os.replace(tmp_path, os.path.join(path, ONNX_INT8_FILE))
+
+    # The export is only kept if it reproduces the PyTorch model; see embedding.check_parity()
+    from app.utils.embedding import check_parity
+    for variant in variants:
+        if variant not in config['parity']:
+            model = OnnxEmbeddingModel(path, quantized=variant == 'onnx-int8')
+            try:
+                config['parity'][variant] = check_parity(model, reference, variant)
+            except ValueError:
+                # Drop the failed variant so it is not loaded by mistake
+                if variant == 'onnx':
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(model.model_path)
+                raise
+    _write_export_config(path, config)
+
+    logger.info(f"Exported {model_name} to ONNX in {time.time() - start_time:.1f}s")
+    return path
+
+class OnnxEmbeddingModel:
+    """
+    Sentence embeddings from an ONNX Runtime session on CPU.
+
+    A drop-in replacement for the parts of SentenceTransformer this project
+    uses: encode(), get_sentence_embedding_dimension(), tokenizer and
+    max_seq_length. Loading it needs neither sentence-transformers nor the
+    PyTorch weights. The tokenizer comes from transformers, which imports
+    torch whenever it is installed, so start-up only saves the model load.
+    """
+    def __init__(self, path: str, quantized: bool = False, threads: int = 0):
+        """
+        Load an export written by export_onnx_model()
+
+        Args:
+            path: Export directory of the model
+            quantized: Use the dynamic int8 variant instead of float32
+            threads: Intra-op threads of the session (0 for ONNX Runtime's default, one per core)
+
+        Raises:
+            ValueError: If the directory holds no up-to-date export
+        """
+        from transformers import AutoTokenizer
+
+        config = read_export_config(path)
+        if config is None:
+            raise ValueError(f"No ONNX export at {path}, run export_onnx_model() first")
+
+        self.path = path
+        self.quantized = quantized
+        self.model_path = os.path.join(path, ONNX_INT8_FILE if quantized else ONNX_FILE)
+        self.input_names: List[str] = config['input_names']
+        self.pooling = config['pooling']
+        self.normalize = config['normalize']
+        self.max_seq_length = config['max_seq_length']
+        self.dimension = config['dimension']
+        self.tokenizer = AutoTokenizer.from_pretrained(path)
+        # A fast tokenizer changes its truncation settings on every call, so
+        # concurrent calls from several threads must not overlap
+        self._tokenizer_lock = threading.Lock()
+        self.threads = threads
+        self.session = self._create_session(threads)
+
+    def _create_session(self, threads: int):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        return ort.InferenceSession(self.model_path, options, providers=['CPUExecutionProvider'])
+
+    def set_num_threads(self, threads: int):
+        """
+        Recreate the session with another number of intra-op threads, e.g.
+        in a forked server worker: a session's thread pool is not inherited
+        across fork()
+
+        Args:
+            threads: Intra-op threads (0 for ONNX Runtime's default)
+        """
+        if threads != self.threads:
+            self.session = self._create_session(threads)
+            self.threads = threads
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        with self._tokenizer_lock:
+            encoded = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_seq_length,
+                                     return_tensors='np')
+        mask = encoded['attention_mask']
+        feeds = {}
+        for name in self.input_names:
+            values = encoded[name] if name in encoded else np.zeros_like(mask)
+            feeds[name] = values.astype(np.int64)
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        if self.pooling == 'cls':
+            embeddings = token_embeddings[:, 0]
+        else:
+            weights = mask[..., None].astype(np.float32)
+            embeddings = (token_embeddings * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        if self.normalize:
+            embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=-1, keepdims=True), 1e-12)
+        return embeddings.astype(np.float32)
+
+    def encode(self, sentences: Union[str, Sequence[str]], batch_size: int = 32, convert_to_numpy: bool = True,
+               show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        """
+        Embed one text or a list of texts, like SentenceTransformer.encode()
+
+        Args:
+            sentences: Text or list of texts
+            batch_size: Number of texts per forward pass
+
+        Returns:
+            float32 array of shape (dimension,) for one text, or (len(sentences), dimension)
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        batch_size = max(1, batch_size)
+        batches = [self._encode_batch(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)]
+        embeddings = np.concatenate(batches, axis=0) if batches else np.zeros((0, self.dimension), dtype=np.float32)
+        return embeddings[0] if single else embeddings
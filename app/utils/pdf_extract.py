@@ -0,0 +1,227 @@
+import os
+import logging
+import multiprocessing
+import PyPDF2
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger('pdf_extract')
+
+# Documents longer than this are split into page ranges that run in parallel
+DEFAULT_PAGES_PER_TASK = 8
+
+def count_pages(pdf_path: str) -> int:
+    """
+    Count the pages of a PDF without extracting any text
+
+    Args:
+        pdf_path: Path to the PDF file
+
+    Returns:
+        Number of pages, or 0 if the file cannot be read
+    """
+    try:
+        with open(pdf_path, 'rb') as file:
+            return len(PyPDF2.PdfReader(file).pages)
+    except Exception as e:
+        logger.error(f"Error reading {pdf_path}: {str(e)}")
+        return 0
+
+def extract_page_range(pdf_path: str, start: int, end: int) -> List[Optional[str]]:
+    """
+    Extract the text of pages [start, end) of a PDF
+
+    Runs inside worker processes, so it opens the file itself.
+
+    Args:
+        pdf_path: Path to the PDF file
+        start: First page number (0-based)
+        end: One past the last page number
+
+    Returns:
+        Text of each page, or None for pages that failed to extract
+    """
+    pages = []
+    try:
+        with open(pdf_path, 'rb') as file:
+            reader = PyPDF2.PdfReader(file)
+            for page_num in range(start, min(end, len(reader.pages))):
+                try:
+                    pages.append(reader.pages[page_num].extract_text())
+                except Exception as e:
+                    logger.warning(f"Error extracting text from page {page_num+1} of {pdf_path}: {str(e)}")
+                    pages.append(None)
+    except Exception as e:
+        logger.error(f"Error extracting text from {pdf_path}: {str(e)}")
+    return pages
+
+def join_pages(pages: Sequence[Optional[str]]) -> str:
+    """
+    Join page texts into one document in a single pass
+
+    Args:
+        pages: Page texts, with None for pages that failed to extract
+
+    Returns:
+        Document text with pages separated by blank lines
+    """
+    return "".join(f"{page}\n\n" for page in pages if page is not None)
+
+class PDFExtractor:
+    """
+    Extracts PDF text on a process pool, fanning out both across files and
+    across page ranges of long documents.
+    """
+    def __init__(self, workers: Optional[int] = None, pages_per_task: int = DEFAULT_PAGES_PER_TASK):
+        """
+        Initialize the extractor
+
+        Args:
+            workers: Number of worker processes (defaults to the CPU count; 1 extracts in-process)
+            pages_per_task: Maximum number of pages handled by one task
+        """
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.pages_per_task = max(1, pages_per_task)
+        self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Spawned (not forked) workers never inherit the parent's embedding
+        # model or thread pools. They do re-import the parent's main script
+        # (as __mp_main__), so scripts using the extractor keep heavy imports
+        # such as torch, and their logging setup, inside main()
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    def close(self):
+        """
+        Shut down the worker processes
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _page_ranges(self, total_pages: int) -> List[Tuple[int, int]]:
+        return [(start, min(start + self.pages_per_task, total_pages))
+                for start in range(0, total_pages, self.pages_per_task)]
+
+    def iter_pages(self, pdf_path: str) -> Iterator[Tuple[int, Optional[str]]]:
+        """
+        Extract a PDF page by page, yielding pages in order as they become available
+
+        Args:
+            pdf_path: Path to the PDF file
+
+        Yields:
+            (page_num, text) tuples, with text None for pages that failed
+        """
+        total_pages = count_pages(pdf_path)
+        logger.info(f"Extracting text from {pdf_path} ({total_pages} pages)")
+        ranges = self._page_ranges(total_pages)
+
+        if self.workers == 1 or len(ranges) <= 1:
+            for start, end in ranges:
+                for offset, text in enumerate(extract_page_range(pdf_path, start, end)):
+                    yield start + offset, text
+            return
+
+        executor = self._get_executor()
+        futures = [executor.submit(extract_page_range, pdf_path, start, end) for start, end in ranges]
+        for (start, _), future in zip(ranges, futures):
+            for offset, text in enumerate(future.result()):
+                yield start + offset, text
+
+    def extract_text(self, pdf_path: str) -> str:
+        """
+        Extract the full text of a PDF
+
+        Args:
+            pdf_path: Path to the PDF file
+
+        Returns:
+            Extracted text, or an empty string if nothing could be extracted
+        """
+        text = join_pages([page for _, page in self.iter_pages(pdf_path)])
+        logger.info(f"Extracted {len(text)} characters from {pdf_path}")
+        return text
+
+    def iter_documents(self, pdf_paths: Sequence[str], max_pending: Optional[int] = None) -> Iterator[Tuple[str, str]]:
+        """
+        Extract many PDFs concurrently, yielding each as soon as all of its pages are done
+
+        Args:
+            pdf_paths: Paths to the PDF files
+            max_pending: Maximum number of documents being extracted at once
+                (default: all of them); finished documents wait for the caller,
+                so this bounds the extracted text held in memory
+
+        Yields:
+            (pdf_path, text) tuples in completion order
+        """
+        if self.workers == 1:
+            for pdf_path in pdf_paths:
+                yield pdf_path, self.extract_text(pdf_path)
+            return
+
+        executor = self._get_executor()
+        # future -> (pdf_path, position of its page range, or None for the page count)
+        pending: Dict = {}
+        pages: Dict[str, List[List[Optional[str]]]] = {}
+        remaining: Dict[str, int] = {}
+        paths = iter(pdf_paths)
+        exhausted = False
+
+        while True:
+            while not exhausted and (max_pending is None or len(remaining) < max(1, max_pending)):
+                pdf_path = next(paths, None)
+                if pdf_path is None:
+                    exhausted = True
+                    break
+                # Pages are counted on the pool too, since opening a PDF parses its page tree
+                remaining[pdf_path] = 1
+                pending[executor.submit(count_pages, pdf_path)] = (pdf_path, None)
+
+            if not pending:
+                return
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pdf_path, position = pending.pop(future)
+                if position is None:
+                    try:
+                        ranges = self._page_ranges(future.result())
+                    except Exception as e:
+                        logger.error(f"Worker failed counting the pages of {pdf_path}: {str(e)}")
+                        ranges = []
+                    if not ranges:
+                        del remaining[pdf_path]
+                        yield pdf_path, ""
+                        continue
+                    logger.info(f"Extracting text from {pdf_path} ({ranges[-1][1]} pages)")
+                    pages[pdf_path] = [None] * len(ranges)
+                    remaining[pdf_path] = len(ranges)
+                    for range_position, (start, end) in enumerate(ranges):
+                        pending[executor.submit(extract_page_range, pdf_path, start, end)] = (pdf_path, range_position)
+                    continue
+
+                try:
+                    pages[pdf_path][position] = future.result()
+                except Exception as e:
+                    logger.error(f"Worker failed extracting part of {pdf_path}: {str(e)}")
+                    pages[pdf_path][position] = []
+
+                remaining[pdf_path] -= 1
+                if remaining[pdf_path] == 0:
+                    del remaining[pdf_path]
+                    text = join_pages([page for part in pages.pop(pdf_path) for page in part])
+                    logger.info(f"Extracted {len(text)} characters from {pdf_path}")
+                    yield pdf_path, text
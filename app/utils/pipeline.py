@@ -0,0 +1,308 @@
+import time
+import queue
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+logger = logging.getLogger('pipeline')
+
+DEFAULT_QUEUE_SIZE = 8
+# How often a worker blocked on a queue checks whether the pipeline was stopped
+_POLL_SECONDS = 0.1
+
+_DONE = object()
+
+class Stage:
+    """
+    One step of a Pipeline: a function applied to every item by its own
+    pool of worker threads, fed by a bounded queue.
+    """
+    def __init__(self,
+                 name: str,
+                 fn: Callable[[Any], Any],
+                 workers: int = 1,
+                 queue_size: int = DEFAULT_QUEUE_SIZE,
+                 fan_out: bool = False,
+                 size: Optional[Callable[[Any], int]] = None):
+        """
+        Initialize the stage
+
+        Args:
+            name: Name used for the worker threads, logs and stats
+            fn: Function applied to each input item; returns the output item,
+                or an iterable of output items if fan_out is set
+            workers: Number of worker threads
+            queue_size: Capacity of the queue feeding this stage
+            fan_out: Whether fn produces any number of outputs per input
+            size: Optional function giving the number of units (e.g. chunks)
+                in an input item, to report throughput in units as well as items
+        """
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.fan_out = fan_out
+        self.size = size
+
+class StageMetrics:
+    """
+    Counters of one stage, updated by its workers.
+
+    Busy time is spent inside the stage function; blocked time is spent
+    waiting for room in the next queue, i.e. held back by a slower stage
+    downstream. Queue depth is sampled each time a worker takes an item.
+    """
+    def __init__(self, name: str, workers: int, inbox: Optional[queue.Queue] = None):
+        self.name = name
+        self.workers = workers
+        self.inbox = inbox
+        self.items_in = 0
+        self.items_out = 0
+        self.units = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self.max_depth = 0
+        self._depth_total = 0
+        self._depth_samples = 0
+        self._lock = threading.Lock()
+
+    def record_take(self, depth: int, units: int):
+        with self._lock:
+            self.items_in += 1
+            self.units += units
+            self.max_depth = max(self.max_depth, depth)
+            self._depth_total += depth
+            self._depth_samples += 1
+
+    def record_output(self, busy: float, blocked: float):
+        with self._lock:
+            self.items_out += 1
+            self.busy_seconds += busy
+            self.blocked_seconds += blocked
+
+    def record_busy(self, busy: float):
+        with self._lock:
+            self.busy_seconds += busy
+
+    def stats(self, elapsed: float) -> Dict:
+        with self._lock:
+            stats = {
+                "workers": self.workers,
+                "items_in": self.items_in,
+                "items_out": self.items_out,
+                "units": self.units,
+                "items_per_second": self.items_out / elapsed if elapsed > 0 else 0.0,
+                "units_per_second": self.units / elapsed if elapsed > 0 else 0.0,
+                # Share of the workers' time spent working rather than waiting
+                "utilization": self.busy_seconds / (elapsed * self.workers) if elapsed > 0 else 0.0,
+                "busy_seconds": self.busy_seconds,
+                "blocked_seconds": self.blocked_seconds,
+            }
+            if self.inbox is not None:
+                stats["queue"] = {
+                    "size": self.inbox.qsize(),
+                    "maxsize": self.inbox.maxsize,
+                    "max_depth": self.max_depth,
+                    "mean_depth": self._depth_total / self._depth_samples if self._depth_samples else 0.0,
+                }
+        return stats
+
+class Pipeline:
+    """
+    Stream items from a source through a chain of stages connected by
+    bounded queues.
+
+    The source is iterated on its own thread and each stage runs on its
+    own worker threads, so a slow network stage overlaps with CPU-bound
+    stages upstream. A full queue blocks the stage feeding it, which
+    holds back everything upstream down to the source: the number of
+    items in flight, and so memory, stays bounded however large the input.
+
+    Outputs of the last stage are yielded by run() in the caller's thread.
+    If a stage function raises, the pipeline stops and run() re-raises the
+    exception; stage functions that expect per-item failures should record
+    them on the item instead.
+    """
+    def __init__(self,
+                 stages: Sequence[Stage],
+                 source_name: str = 'source',
+                 output_queue_size: int = DEFAULT_QUEUE_SIZE):
+        """
+        Initialize the pipeline
+
+        Args:
+            stages: Stages in processing order
+            source_name: Name of the source in thread names, logs and stats
+            output_queue_size: Capacity of the queue between the last stage and the caller
+        """
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.stages = list(stages)
+        self.source_name = source_name
+        self.output_queue_size = max(1, output_queue_size)
+        self._metrics: List[StageMetrics] = []
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._started: Optional[float] = None
+        self._finished: Optional[float] = None
+
+    def _put(self, target: queue.Queue, item: Any) -> bool:
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source: queue.Queue) -> Any:
+        while not self._stop.is_set():
+            try:
+                return source.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _fail(self, name: str, error: BaseException):
+        if self._error is None:
+            self._error = error
+            logger.error(f"Pipeline stage '{name}' failed: {str(error)}")
+        self._stop.set()
+
+    def _feed(self, source: Iterable, outbox: queue.Queue, metrics: StageMetrics, consumers: int):
+        try:
+            iterator = iter(source)
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    metrics.record_busy(time.perf_counter() - start)
+                    break
+                produced = time.perf_counter()
+                if not self._put(outbox, item):
+                    return
+                metrics.record_output(produced - start, time.perf_counter() - produced)
+        except BaseException as e:
+            self._fail(metrics.name, e)
+            return
+        for _ in range(consumers):
+            self._put(outbox, _DONE)
+
+    def _work(self, stage: Stage, inbox: queue.Queue, outbox: queue.Queue, metrics: StageMetrics,
+              remaining: List[int], lock: threading.Lock, consumers: int):
+        while True:
+            depth = inbox.qsize()
+            item = self._get(inbox)
+            if item is _DONE:
+                break
+            metrics.record_take(depth, stage.size(item) if stage.size else 1)
+
+            try:
+                start = time.perf_counter()
+                outputs = iter(stage.fn(item)) if stage.fan_out else iter((stage.fn(item),))
+                while True:
+                    try:
+                        output = next(outputs)
+                    except StopIteration:
+                        metrics.record_busy(time.perf_counter() - start)
+                        break
+                    produced = time.perf_counter()
+                    if not self._put(outbox, output):
+                        return
+                    metrics.record_output(produced - start, time.perf_counter() - produced)
+                    start = time.perf_counter()
+            except BaseException as e:
+                self._fail(stage.name, e)
+                return
+
+        # The last worker of a stage to finish passes the end of input on
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            for _ in range(consumers):
+                self._put(outbox, _DONE)
+
+    def run(self, source: Iterable) -> Iterator[Any]:
+        """
+        Push every item of the source through the stages
+
+        Args:
+            source: Iterable of input items for the first stage
+
+        Yields:
+            Outputs of the last stage, in completion order
+
+        Raises:
+            Exception: The first exception raised by the source or a stage function
+        """
+        self._stop.clear()
+        self._error = None
+        self._started = time.perf_counter()
+        self._finished = None
+
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        queues.append(queue.Queue(maxsize=self.output_queue_size))
+        self._metrics = [StageMetrics(self.source_name, 1)]
+        self._metrics += [StageMetrics(stage.name, stage.workers, queues[i]) for i, stage in enumerate(self.stages)]
+
+        threads = [threading.Thread(target=self._feed, name=f"pipeline-{self.source_name}", daemon=True,
+                                    args=(source, queues[0], self._metrics[0], self.stages[0].workers))]
+        for i, stage in enumerate(self.stages):
+            consumers = self.stages[i + 1].workers if i + 1 < len(self.stages) else 1
+            remaining, lock = [stage.workers], threading.Lock()
+            for worker in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._work, name=f"pipeline-{stage.name}-{worker}", daemon=True,
+                    args=(stage, queues[i], queues[i + 1], self._metrics[i + 1], remaining, lock, consumers)
+                ))
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                item = self._get(queues[-1])
+                if item is _DONE:
+                    break
+                yield item
+            if self._error is not None:
+                raise self._error
+        finally:
+            # Also reached when the caller stops early: release blocked workers
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            self._finished = time.perf_counter()
+
+    def stats(self) -> Dict:
+        """
+        Per-stage throughput, utilization and queue depth of the current or last run
+
+        Returns:
+            Dictionary of pipeline statistics, stages in processing order
+        """
+        if self._started is None:
+            return {"elapsed_seconds": 0.0, "stages": {}}
+        elapsed = (self._finished or time.perf_counter()) - self._started
+        return {
+            "elapsed_seconds": elapsed,
+            "stages": {metrics.name: metrics.stats(elapsed) for metrics in self._metrics},
+        }
+
+    def log_stats(self, log: logging.Logger = logger):
+        """
+        Log one line of statistics per stage
+
+        Args:
+            log: Logger to write to
+        """
+        stats = self.stats()
+        for name, stage in stats["stages"].items():
+            line = (f"Stage {name}: {stage['items_out']} items out ({stage['items_per_second']:.1f}/s), "
+                    f"{stage['units_per_second']:.1f} units/s, utilization {stage['utilization']:.0%}, "
+                    f"blocked {stage['blocked_seconds']:.1f}s")
+            if "queue" in stage:
+                line += (f", queue depth mean {stage['queue']['mean_depth']:.1f} "
+                         f"max {stage['queue']['max_depth']}/{stage['queue']['maxsize']}")
+            log.info(line)
@@ -0,0 +1,189 @@
+import numpy as np
+from typing import Dict, Optional
+
+QUANTIZATION_TYPES = ('none', 'int8', 'binary')
+# Candidates rescored at full precision per requested result, by quantization type;
+# sign bits lose much more than int8, so binary needs a deeper candidate pool
+DEFAULT_RESCORE_FACTORS = {'int8': 4, 'binary': 16}
+# Rows scored per block, so temporaries stay small (and in cache) whatever the corpus size
+SCORE_BLOCK_SIZE = 1024
+
+if hasattr(np, 'bitwise_count'):
+    _popcount = np.bitwise_count
+else:
+    _POPCOUNT_TABLE = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+    def _popcount(values: np.ndarray) -> np.ndarray:
+        return _POPCOUNT_TABLE[values]
+
+class Quantizer:
+    """
+    Compact codes for L2-normalized embeddings.
+
+    Codes are only used to shortlist candidates: scores() gives an
+    approximation of the cosine similarity that is good enough to rank
+    the corpus, and the shortlist is then rescored with the full-precision
+    vectors.
+    """
+    kind = 'none'
+    dtype = np.float32
+    # Whether fit() learns parameters from the data (encoding needs them first)
+    trainable = False
+
+    def fit(self, vectors: np.ndarray):
+        """
+        Learn the quantization parameters from a sample of the corpus
+
+        Args:
+            vectors: L2-normalized vectors
+        """
+
+    @property
+    def is_fitted(self) -> bool:
+        return True
+
+    def code_size(self, dimension: int) -> int:
+        """
+        Number of code elements per vector
+        """
+        raise NotImplementedError
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Quantize vectors
+
+        Args:
+            vectors: L2-normalized vectors of shape (n, dimension)
+
+        Returns:
+            Codes of shape (n, code_size(dimension))
+        """
+        raise NotImplementedError
+
+    def encode_all(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Quantize a large, possibly memory-mapped matrix block by block
+
+        Args:
+            vectors: L2-normalized vectors of shape (n, dimension)
+
+        Returns:
+            Codes of shape (n, code_size(dimension))
+        """
+        codes = np.empty((vectors.shape[0], self.code_size(vectors.shape[1])), dtype=self.dtype)
+        for start in range(0, vectors.shape[0], SCORE_BLOCK_SIZE):
+            codes[start:start + SCORE_BLOCK_SIZE] = self.encode(vectors[start:start + SCORE_BLOCK_SIZE])
+        return codes
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """
+        Approximate similarity of a query to every row of a code matrix
+
+        Args:
+            codes: Codes from encode()
+            query: L2-normalized query vector
+
+        Returns:
+            float32 array with one score per row (higher is more similar)
+        """
+        raise NotImplementedError
+
+    def state(self) -> Dict:
+        """
+        JSON-serializable parameters, restored by create_quantizer()
+        """
+        return {'type': self.kind}
+
+class ScalarQuantizer(Quantizer):
+    """
+    int8 quantization with one scale per dimension.
+
+    Each dimension is scaled so its largest absolute value in the corpus
+    maps to 127, which keeps 1 byte per dimension (4x smaller than
+    float32) while preserving the ranking almost exactly. The query stays
+    in float32 and absorbs the scales, so scoring is one product of the
+    int8 codes with a float vector.
+    """
+    kind = 'int8'
+    dtype = np.int8
+    trainable = True
+
+    def __init__(self, scale: Optional[np.ndarray] = None):
+        self.scale = None if scale is None else np.asarray(scale, dtype=np.float32)
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.scale is not None
+
+    def fit(self, vectors):
+        peak = np.zeros(vectors.shape[1], dtype=np.float32)
+        for start in range(0, vectors.shape[0], SCORE_BLOCK_SIZE):
+            block = np.asarray(vectors[start:start + SCORE_BLOCK_SIZE], dtype=np.float32)
+            peak = np.maximum(peak, np.abs(block).max(axis=0))
+        self.scale = np.maximum(peak, 1e-6) / 127.0
+
+    def code_size(self, dimension):
+        return dimension
+
+    def encode(self, vectors):
+        scaled = np.asarray(vectors, dtype=np.float32) / self.scale
+        return np.clip(np.rint(scaled), -127, 127).astype(np.int8)
+
+    def scores(self, codes, query):
+        weights = (np.asarray(query, dtype=np.float32) * self.scale).astype(np.float32)
+        scores = np.empty(codes.shape[0], dtype=np.float32)
+        for start in range(0, codes.shape[0], SCORE_BLOCK_SIZE):
+            block = codes[start:start + SCORE_BLOCK_SIZE]
+            scores[start:start + len(block)] = block.astype(np.float32) @ weights
+        return scores
+
+    def state(self):
+        return {'type': self.kind, 'scale': self.scale.tolist()}
+
+class BinaryQuantizer(Quantizer):
+    """
+    1-bit (sign) quantization, packed 8 dimensions per byte.
+
+    A 384-dimensional embedding takes 48 bytes (32x smaller than float32).
+    Rows are ranked by Hamming distance to the query's sign bits, which
+    only tracks the angle roughly, so it needs a larger rescoring pool
+    than int8.
+    """
+    kind = 'binary'
+    dtype = np.uint8
+
+    def code_size(self, dimension):
+        return (dimension + 7) // 8
+
+    def encode(self, vectors):
+        return np.packbits(np.asarray(vectors) > 0, axis=-1)
+
+    def scores(self, codes, query):
+        query_code = self.encode(np.asarray(query)[None, :])[0]
+        bits = codes.shape[1] * 8
+        scores = np.empty(codes.shape[0], dtype=np.float32)
+        for start in range(0, codes.shape[0], SCORE_BLOCK_SIZE):
+            block = codes[start:start + SCORE_BLOCK_SIZE]
+            distances = _popcount(np.bitwise_xor(block, query_code)).sum(axis=1, dtype=np.int32)
+            # Map the Hamming distance onto the cosine scale: 0 bits differ -> 1, all differ -> -1
+            scores[start:start + len(block)] = 1.0 - 2.0 * distances / bits
+        return scores
+
+def create_quantizer(kind: Optional[str], state: Optional[Dict] = None) -> Optional[Quantizer]:
+    """
+    Create a quantizer by type, optionally restoring saved parameters
+
+    Args:
+        kind: 'int8', 'binary', or 'none'/None for no quantization
+        state: Parameters from Quantizer.state()
+
+    Returns:
+        Quantizer instance, or None for no quantization
+    """
+    if kind in (None, 'none'):
+        return None
+    if kind == 'int8':
+        return ScalarQuantizer(scale=(state or {}).get('scale'))
+    if kind == 'binary':
+        return BinaryQuantizer()
+    raise ValueError(f"Unknown quantization '{kind}', expected one of {', '.join(QUANTIZATION_TYPES)}")
@@ -0,0 +1,228 @@
+import time
+import logging
+import threading
+import numpy as np
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+from app.utils.cache import normalize_query
+from app.utils.results import RetrievedChunk, RerankFallback
+
+logger = logging.getLogger('rerank')
+
+DEFAULT_RERANK_MODEL = 'cross-encoder/ms-marco-MiniLM-L-6-v2'
+DEFAULT_RERANK_BATCH_SIZE = 16
+DEFAULT_RERANK_BUDGET_MS = 150.0
+DEFAULT_RERANK_CACHE_SIZE = 8192
+DEFAULT_LATENCY_WINDOW = 10000
+# Weight of the newest batch in the running estimate of the time per scored pair
+_PAIR_TIME_SMOOTHING = 0.2
+# Factor applied to the estimate on every fallback, so an estimate inflated by
+# one slow batch shrinks until a batch is scored and re-measures it
+_PAIR_TIME_DECAY = 0.8
+
+class CrossEncoderReranker:
+    """
+    Re-score retrieval candidates with a cross-encoder.
+
+    The cross-encoder reads the query and the chunk together, which ranks
+    far more precisely than comparing two independent embeddings but costs
+    one forward pass per (query, chunk) pair. Scores are therefore cached
+    per (normalized query, chunk ID); chunk IDs are derived from the chunk
+    content, so a cached score stays valid across re-ingestion.
+
+    Each call has a time budget. Before scoring the next batch, the
+    reranker predicts its cost from the running time per pair and, if it
+    would not fit in what is left of the budget, gives up and returns the
+    candidates in their original bi-encoder order. Scores computed before
+    giving up are still cached, so a repeated query gets further.
+
+    warm_up() seeds the estimate with a timed batch. Until there is an
+    estimate, a call scores a single pair first to measure one. Every
+    fallback decays the estimate, so it is re-measured rather than left
+    stuck on a slow outlier.
+    """
+    def __init__(self,
+                 model_name: str = DEFAULT_RERANK_MODEL,
+                 batch_size: int = DEFAULT_RERANK_BATCH_SIZE,
+                 budget_ms: float = DEFAULT_RERANK_BUDGET_MS,
+                 cache_size: int = DEFAULT_RERANK_CACHE_SIZE,
+                 latency_window: int = DEFAULT_LATENCY_WINDOW):
+        """
+        Load the cross-encoder
+
+        Args:
+            model_name: sentence-transformers cross-encoder model
+            batch_size: Number of (query, chunk) pairs per forward pass
+            budget_ms: Time a single rerank() call may spend scoring (0 or less means no limit)
+            cache_size: Number of (query, chunk) scores kept in the LRU cache (0 disables it)
+            latency_window: Number of recent rerank latencies kept for percentiles
+        """
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self.budget_ms = budget_ms
+        self.cache_size = cache_size
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model_name)
+        self.requests = 0
+        self.fallbacks = 0
+        self.pairs_scored = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._pair_seconds: Optional[float] = None
+        self._scores: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._latencies = deque(maxlen=latency_window)
+        self._lock = threading.Lock()
+
+        logger.info(f"Loaded cross-encoder {model_name} (batch_size={self.batch_size}, budget_ms={budget_ms})")
+
+    def warm_up(self):
+        """
+        Run one forward pass so the first request does not pay for it, then
+        time a full batch to seed the estimate of the time per pair
+        """
+        self.model.predict([("warm-up", "warm-up")], show_progress_bar=False)
+
+        pairs = [("warm-up query", "warm-up chunk " * 64)] * self.batch_size
+        start = time.perf_counter()
+        self.model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._pair_seconds = elapsed / len(pairs)
+        logger.info(f"Cross-encoder warm-up: {self._pair_seconds * 1000:.2f} ms per pair")
+
+    def _cached_scores(self, query_key: str, candidates: List[RetrievedChunk]) -> List[Optional[float]]:
+        with self._lock:
+            scores = []
+            for chunk in candidates:
+                score = self._scores.get((query_key, chunk.id))
+                if score is None:
+                    self.cache_misses += 1
+                else:
+                    self._scores.move_to_end((query_key, chunk.id))
+                    self.cache_hits += 1
+                scores.append(score)
+            return scores
+
+    def _store(self, query_key: str, chunks: List[RetrievedChunk], scores: np.ndarray, elapsed: float):
+        with self._lock:
+            self.pairs_scored += len(chunks)
+            # Follow slowdowns at once but speed-ups only gradually, so the
+            # estimate errs towards falling back rather than overrunning
+            pair_seconds = elapsed / len(chunks)
+            if self._pair_seconds is None:
+                self._pair_seconds = pair_seconds
+            else:
+                smoothed = (1 - _PAIR_TIME_SMOOTHING) * self._pair_seconds + _PAIR_TIME_SMOOTHING * pair_seconds
+                self._pair_seconds = max(pair_seconds, smoothed)
+
+            if self.cache_size <= 0:
+                return
+            for chunk, score in zip(chunks, scores):
+                self._scores[(query_key, chunk.id)] = float(score)
+                self._scores.move_to_end((query_key, chunk.id))
+            while len(self._scores) > self.cache_size:
+                self._scores.popitem(last=False)
+
+    def rerank(self, query_text: str, candidates: List[RetrievedChunk], top_k: int,
+               budget_ms: Optional[float] = None) -> List[RetrievedChunk]:
+        """
+        Order candidates by cross-encoder score
+
+        Args:
+            query_text: The query text
+            candidates: Retrieved chunks, best first by bi-encoder score
+            top_k: Number of chunks to return
+            budget_ms: Overrides the reranker's time budget for this call
+
+        Returns:
+            The top_k chunks carrying their cross-encoder score, best first,
+            or, if the budget ran out, the first top_k candidates unchanged as
+            a RerankFallback
+        """
+        start = time.perf_counter()
+        budget_ms = self.budget_ms if budget_ms is None else budget_ms
+        deadline = start + budget_ms / 1000.0 if budget_ms > 0 else None
+
+        query_key = normalize_query(query_text)
+        scores = self._cached_scores(query_key, candidates)
+        missing = [i for i, score in enumerate(scores) if score is None]
+
+        # Candidates arrive best first, so the likeliest winners are scored first
+        completed = True
+        offset = 0
+        while offset < len(missing):
+            pair_seconds = self._pair_seconds
+            # Without an estimate, a single pair is scored to measure one
+            batch = missing[offset:offset + (self.batch_size if pair_seconds is not None else 1)]
+            offset += len(batch)
+            if deadline is not None and time.perf_counter() + len(batch) * (pair_seconds or 0.0) > deadline:
+                completed = False
+                break
+
+            batch_start = time.perf_counter()
+            predicted = self.model.predict([(query_text, candidates[i].text) for i in batch],
+                                           batch_size=len(batch), show_progress_bar=False)
+            predicted = np.asarray(predicted, dtype=np.float32).reshape(-1)
+            self._store(query_key, [candidates[i] for i in batch], predicted, time.perf_counter() - batch_start)
+            for i, score in zip(batch, predicted):
+                scores[i] = float(score)
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.requests += 1
+            self._latencies.append(elapsed)
+            if not completed:
+                self.fallbacks += 1
+                if self._pair_seconds is not None:
+                    self._pair_seconds *= _PAIR_TIME_DECAY
+
+        if not completed:
+            scored = sum(score is not None for score in scores)
+            logger.warning(f"Rerank budget of {budget_ms:.0f} ms exhausted after scoring {scored}/{len(candidates)} "
+                           f"candidates, keeping bi-encoder order")
+            return RerankFallback(candidates[:top_k])
+
+        order = sorted(range(len(candidates)), key=lambda i: scores[i], reverse=True)[:top_k]
+        logger.info(f"Reranked {len(candidates)} candidates in {elapsed * 1000:.1f} ms "
+                    f"({len(missing)} scored, {len(candidates) - len(missing)} from cache)")
+        return [RetrievedChunk(id=candidates[i].id, score=scores[i], text=candidates[i].text,
+                               source=candidates[i].source, chunk_index=candidates[i].chunk_index)
+                for i in order]
+
+    def stats(self) -> Dict:
+        """
+        Request, fallback and cache counters and rerank latency percentiles
+
+        Returns:
+            Dictionary of reranking statistics
+        """
+        with self._lock:
+            lookups = self.cache_hits + self.cache_misses
+            stats = {
+                "model": self.model_name,
+                "batch_size": self.batch_size,
+                "budget_ms": self.budget_ms,
+                "requests": self.requests,
+                "fallbacks": self.fallbacks,
+                "fallback_rate": self.fallbacks / self.requests if self.requests else 0.0,
+                "pairs_scored": self.pairs_scored,
+                "ms_per_pair": self._pair_seconds * 1000 if self._pair_seconds is not None else None,
+                "cache": {
+                    "size": len(self._scores),
+                    "maxsize": self.cache_size,
+                    "hits": self.cache_hits,
+                    "misses": self.cache_misses,
+                    "hit_rate": self.cache_hits / lookups if lookups else 0.0
+                }
+            }
+            latencies_ms = np.array(self._latencies) * 1000
+
+        if len(latencies_ms):
+            stats["latency_ms"] = {
+                "p50": float(np.percentile(latencies_ms, 50)),
+                "p90": float(np.percentile(latencies_ms, 90)),
+                "p99": float(np.percentile(latencies_ms, 99)),
+                "max": float(latencies_ms.max()),
+            }
+        return stats
@@ -0,0 +1,81 @@
+from typing import Any, Dict, Optional
+
+class RetrievedChunk:
+    """
+    A chunk returned by a vector store query, with its relevance score and
+    the document it came from.
+    """
+    __slots__ = ('id', 'score', 'source', 'chunk_index', 'text')
+
+    def __init__(self, id: str, score: float, text: str,
+                 source: Optional[str] = None, chunk_index: Optional[int] = None):
+        self.id = id
+        self.score = score
+        self.text = text
+        self.source = source
+        self.chunk_index = chunk_index
+
+    @classmethod
+    def from_match(cls, match: Any) -> 'RetrievedChunk':
+        """
+        Build a result from one match of an index backend query
+
+        Args:
+            match: {'id', 'score', 'metadata'} match (a dict or a Pinecone match)
+
+        Returns:
+            RetrievedChunk instance
+        """
+        metadata = match['metadata'] or {}
+        # Pinecone stores every metadata number as a float
+        chunk_index = metadata.get('chunk_index')
+        return cls(id=match['id'],
+                   score=float(match['score']),
+                   text=metadata['text'],
+                   source=metadata.get('source'),
+                   chunk_index=int(chunk_index) if chunk_index is not None else None)
+
+    def to_dict(self) -> Dict:
+        """
+        JSON-serializable form of the result
+        """
+        return {
+            "id": self.id,
+            "score": self.score,
+            "source": self.source,
+            "chunk_index": self.chunk_index,
+            "text": self.text
+        }
+
+    def __eq__(self, other):
+        if not isinstance(other, RetrievedChunk):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return (f"RetrievedChunk(id={self.id!r}, score={self.score:.4f}, source={self.source!r}, "
+                f"chunk_index={self.chunk_index!r})")
+
+class RerankFallback(list):
+    """
+    Retrieval results left in bi-encoder order because re-ranking ran out
+    of its time budget or failed.
+
+    A plain list of RetrievedChunk otherwise; the type tells callers that
+    a retry may do better, so the results should not be cached.
+    """
+
+def chunks_to_json(chunks, detailed: bool = False):
+    """
+    Serialize retrieval results for an API response
+
+    Args:
+        chunks: List of RetrievedChunk results
+        detailed: Return full result objects instead of just the texts
+
+    Returns:
+        List of result dictionaries, or of text chunks
+    """
+    if detailed:
+        return [chunk.to_dict() for chunk in chunks]
+    return [chunk.text for chunk in chunks]
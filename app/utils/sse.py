@@ -0,0 +1,17 @@
+import json
+
+# Response headers for server-sent events; proxies must not buffer the stream
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def format_sse(event: str, payload) -> str:
+    """
+    Format one server-sent event
+
+    Args:
+        event: Event name
+        payload: JSON-serializable event data
+
+    Returns:
+        The event as text
+    """
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
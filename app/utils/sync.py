@@ -0,0 +1,188 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from app.utils.chunking import chunking_key
+
+logger = logging.getLogger('sync')
+
+DELETE_BATCH_SIZE = 1000
+
+def document_id(filename: str) -> str:
+    """
+    Turn a PDF filename into the prefix used for its chunk IDs
+
+    Args:
+        filename: Name of the source document
+
+    Returns:
+        Filename without extension, with spaces replaced
+    """
+    return os.path.splitext(filename)[0].replace(' ', '_')
+
+def make_chunk_id(source: str, text: str) -> str:
+    """
+    Build a deterministic, content-derived ID for a chunk
+
+    The same chunk of the same document always gets the same ID, across
+    processes and runs, so re-ingesting overwrites vectors instead of
+    duplicating them.
+
+    Args:
+        source: Name of the source document
+        text: Chunk text
+
+    Returns:
+        Chunk ID of the form <document>_<digest>
+    """
+    digest = hashlib.sha256(f"{source}\x00{text}".encode('utf-8')).hexdigest()[:24]
+    return f"{document_id(source)}_{digest}"
+
+def params_key(chunk_size: int, chunk_overlap: int, model_name: str, chunk_unit: str = 'chars') -> str:
+    """
+    Describe the ingestion parameters that change a document's chunks
+
+    Args:
+        chunk_size: Chunk size
+        chunk_overlap: Chunk overlap
+        model_name: Embedding model name
+        chunk_unit: Unit of the chunk size and overlap, 'chars' or 'tokens'
+
+    Returns:
+        String stored in the manifest next to each document
+    """
+    return f"{chunking_key(chunk_size, chunk_overlap, chunk_unit)}|{model_name}"
+
+def delete_ids(index, ids: Sequence[str], batch_size: int = DELETE_BATCH_SIZE) -> int:
+    """
+    Delete vectors by ID in batches
+
+    Args:
+        index: Index to delete from
+        ids: Vector IDs
+        batch_size: Number of IDs per delete request
+
+    Returns:
+        Number of IDs deleted
+    """
+    ids = list(ids)
+    for i in range(0, len(ids), batch_size):
+        index.delete(ids=ids[i:i + batch_size])
+    return len(ids)
+
+class IndexManifest:
+    """
+    Local record of which chunk IDs each document currently has in the
+    index, used to upsert only new chunks and delete stale ones.
+    """
+    def __init__(self, path: str):
+        """
+        Load the manifest, starting empty if the file does not exist
+
+        Args:
+            path: Path to the manifest JSON file
+        """
+        self.path = path
+        self.documents: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as file:
+                self.documents = json.load(file).get('documents', {})
+
+    def save(self):
+        """
+        Write the manifest atomically
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump({'documents': self.documents}, file)
+        os.replace(tmp_path, self.path)
+
+    def is_unchanged(self, source: str, content_hash: Optional[str], params: str) -> bool:
+        """
+        Check whether a document was already synced with the same content and parameters
+
+        Args:
+            source: Name of the source document
+            content_hash: SHA-256 of the PDF content
+            params: Value from params_key()
+
+        Returns:
+            True if nothing needs to be written for this document
+        """
+        entry = self.documents.get(source)
+        return (entry is not None and content_hash is not None
+                and entry.get('content_hash') == content_hash and entry.get('params') == params)
+
+    def chunk_ids(self, source: str) -> Set[str]:
+        """
+        Chunk IDs recorded for a document
+        """
+        return set(self.documents.get(source, {}).get('chunk_ids', []))
+
+    def update(self, source: str, content_hash: Optional[str], params: str, chunk_ids: Iterable[str]):
+        """
+        Record the chunk IDs a document now has in the index
+        """
+        self.documents[source] = {
+            'content_hash': content_hash,
+            'params': params,
+            'chunk_ids': list(chunk_ids)
+        }
+
+    def remove(self, source: str):
+        """
+        Forget a document
+        """
+        self.documents.pop(source, None)
+
+    def removed_sources(self, current_sources: Iterable[str]) -> List[str]:
+        """
+        Documents recorded in the manifest that are no longer present
+
+        Args:
+            current_sources: Names of the documents being synced
+
+        Returns:
+            Names of documents whose chunks should be deleted
+        """
+        current = set(current_sources)
+        return [source for source in self.documents if source not in current]
+
+def diff_document(manifest: IndexManifest, source: str, chunks: Sequence[str]) -> Tuple[List[str], List[int], List[str]]:
+    """
+    Work out which chunks of a document to upsert and which IDs to delete
+
+    Chunks whose content already exists in the index are left untouched,
+    including their chunk_index/total_chunks metadata.
+
+    Args:
+        manifest: Manifest of what the index currently holds
+        source: Name of the source document
+        chunks: The document's current chunks
+
+    Returns:
+        (chunk_ids, positions_to_upsert, ids_to_delete), where chunk_ids
+        holds the unique IDs of the current chunks and positions index into chunks
+    """
+    existing = manifest.chunk_ids(source)
+
+    chunk_ids = []
+    seen = set()
+    new_positions = []
+    for position, chunk in enumerate(chunks):
+        if not chunk.strip():
+            continue
+        chunk_id = make_chunk_id(source, chunk)
+        if chunk_id in seen:
+            # Identical text repeated within a document maps to one vector
+            continue
+        seen.add(chunk_id)
+        chunk_ids.append(chunk_id)
+        if chunk_id not in existing:
+            new_positions.append(position)
+
+    stale_ids = sorted(existing - seen)
+    return chunk_ids, new_positions, stale_ids
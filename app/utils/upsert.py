@@ -0,0 +1,274 @@
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from app.utils.errors import IndexSchemaError
+
+logger = logging.getLogger('upsert')
+
+DEFAULT_UPSERT_BATCH_SIZE = 100
+DEFAULT_UPSERT_WORKERS = 4
+DEFAULT_MAX_RETRIES = 5
+
+# Status codes worth retrying: rate limiting and server-side failures
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+def get_status_code(error: Exception) -> Optional[int]:
+    """
+    Extract an HTTP status code from a vector store client exception
+
+    Args:
+        error: Exception raised by the client
+
+    Returns:
+        The status code, or None if the exception does not carry one
+    """
+    for attr in ('status', 'status_code', 'code'):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+
+    response = getattr(error, 'response', None)
+    value = getattr(response, 'status_code', None) or getattr(response, 'status', None)
+    if isinstance(value, int):
+        return value
+
+    return None
+
+def _transient_error_types() -> Tuple[type, ...]:
+    # Connection and timeout errors of the HTTP stacks the vector store clients use
+    types = [ConnectionError, TimeoutError]
+    try:
+        import urllib3.exceptions
+        types += [urllib3.exceptions.TimeoutError, urllib3.exceptions.ProtocolError,
+                  urllib3.exceptions.MaxRetryError, urllib3.exceptions.NewConnectionError]
+    except ImportError:
+        pass
+    try:
+        import requests.exceptions
+        types += [requests.exceptions.ConnectionError, requests.exceptions.Timeout]
+    except ImportError:
+        pass
+    return tuple(types)
+
+_TRANSIENT_ERROR_TYPES = _transient_error_types()
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Decide whether a failed upsert should be retried
+
+    Rate limiting, 5xx responses, dropped connections and timeouts are
+    retried. Other client errors such as a dimension mismatch (400), and
+    errors that are neither an HTTP response nor a network failure (e.g. a
+    TypeError serializing metadata), are not, since retrying cannot fix them.
+
+    Args:
+        error: Exception raised by the client
+
+    Returns:
+        True if the request should be retried
+    """
+    status = get_status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    return isinstance(error, _TRANSIENT_ERROR_TYPES)
+
+def is_schema_error(error: Exception) -> bool:
+    """
+    Decide whether a failed upsert was rejected for the vector dimension
+
+    Such a rejection applies to every vector the run will send, so the
+    upload should stop instead of failing one batch after another.
+
+    Args:
+        error: Exception raised by the client
+
+    Returns:
+        True if the index rejected the vectors' dimension
+    """
+    message = str(error).lower()
+    return (get_status_code(error) == 400 and 'dimension' in message) or 'does not match the dimension' in message
+
+class AdaptiveRateLimiter:
+    """
+    Spaces out requests from all writer threads and adapts the spacing to
+    the responses: throttling or server errors widen it multiplicatively,
+    successes shrink it back towards the minimum.
+    """
+    def __init__(self,
+                 min_delay: float = 0.0,
+                 max_delay: float = 5.0,
+                 initial_backoff: float = 0.1,
+                 increase_factor: float = 1.5,
+                 decrease_factor: float = 0.7):
+        """
+        Initialize the rate limiter
+
+        Args:
+            min_delay: Smallest gap between requests in seconds
+            max_delay: Largest gap between requests in seconds
+            initial_backoff: Gap used after the first throttling response
+            increase_factor: Multiplier applied to the gap after a throttling response
+            decrease_factor: Multiplier applied to the gap after a success
+        """
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.initial_backoff = initial_backoff
+        self.increase_factor = increase_factor
+        self.decrease_factor = decrease_factor
+        self.delay = min_delay
+        self._next_request_time = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """
+        Block until the caller may send its next request
+        """
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_request_time)
+            self._next_request_time = start + self.delay
+        if start > now:
+            time.sleep(start - now)
+
+    def record_success(self):
+        """
+        Shrink the gap after a successful request
+        """
+        with self._lock:
+            delay = self.delay * self.decrease_factor
+            self.delay = delay if delay > self.min_delay + 0.01 else self.min_delay
+
+    def record_throttle(self):
+        """
+        Grow the gap after a throttling or server error response
+        """
+        with self._lock:
+            self.delay = min(self.max_delay, max(self.delay * self.increase_factor, self.initial_backoff, self.min_delay))
+            logger.warning(f"Throttled by vector store, request gap is now {self.delay:.2f}s")
+
+class BatchUpserter:
+    """
+    Upserts vectors in multi-vector batches from a bounded pool of writer
+    threads, with adaptive rate limiting and jittered exponential backoff.
+
+    Works with any index object exposing upsert(vectors=[(id, values, metadata), ...]),
+    so it can be exercised against a local fake index.
+    """
+    def __init__(self,
+                 index,
+                 batch_size: int = DEFAULT_UPSERT_BATCH_SIZE,
+                 max_workers: int = DEFAULT_UPSERT_WORKERS,
+                 max_retries: int = DEFAULT_MAX_RETRIES,
+                 min_delay: float = 0.0,
+                 backoff_base: float = 0.5,
+                 backoff_cap: float = 30.0):
+        """
+        Initialize the batch upserter
+
+        Args:
+            index: Index to write to
+            batch_size: Number of vectors per upsert request
+            max_workers: Number of concurrent writer threads
+            max_retries: Retries per batch before it is reported as failed
+            min_delay: Minimum gap between requests in seconds
+            backoff_base: Base of the exponential backoff in seconds
+            backoff_cap: Upper bound of a single backoff sleep in seconds
+        """
+        self.index = index
+        self.batch_size = max(1, batch_size)
+        self.max_workers = max(1, max_workers)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.rate_limiter = AdaptiveRateLimiter(min_delay=min_delay)
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter": uniform over [0, min(cap, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    def upsert_batch(self, vectors: Sequence[Tuple]) -> Optional[str]:
+        """
+        Upsert one batch, retrying transient failures
+
+        Args:
+            vectors: List of (id, values, metadata) tuples
+
+        Returns:
+            None on success, otherwise the error message of the last attempt
+
+        Raises:
+            IndexSchemaError: If the index rejects the vectors' dimension, since
+                every later batch would be rejected too
+        """
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.wait()
+            try:
+                self.index.upsert(vectors=list(vectors))
+                self.rate_limiter.record_success()
+                return None
+            except Exception as e:
+                if is_schema_error(e):
+                    raise IndexSchemaError(f"Index rejected the vectors: {str(e)}") from e
+                if not is_retryable(e):
+                    logger.error(f"Upsert of {len(vectors)} vectors failed with non-retryable error: {str(e)}")
+                    return str(e)
+
+                self.rate_limiter.record_throttle()
+                if attempt == self.max_retries:
+                    logger.error(f"Upsert of {len(vectors)} vectors failed after {attempt + 1} attempts: {str(e)}")
+                    return str(e)
+
+                backoff = self._backoff(attempt)
+                logger.warning(f"Upsert attempt {attempt + 1} failed ({get_status_code(e)}): {str(e)}; retrying in {backoff:.2f}s")
+                time.sleep(backoff)
+
+    def upsert(self, vectors: Sequence[Tuple],
+               on_batch: Optional[Callable[[Sequence[Tuple], Optional[str]], None]] = None) -> List[Dict]:
+        """
+        Upsert vectors in batches across the writer pool
+
+        Args:
+            vectors: List of (id, values, metadata) tuples
+            on_batch: Optional function called in the caller's thread with each
+                batch and its error (None once acknowledged) as soon as the
+                batch finishes, e.g. to checkpoint progress
+
+        Returns:
+            One result dict per vector, in input order
+
+        Raises:
+            IndexSchemaError: If the index rejects the vectors' dimension
+        """
+        if not vectors:
+            return []
+
+        batches = [vectors[i:i + self.batch_size] for i in range(0, len(vectors), self.batch_size)]
+        start_time = time.time()
+
+        logger.info(f"Upserting {len(vectors)} vectors in {len(batches)} batches with {min(self.max_workers, len(batches))} writers")
+
+        errors: List[Optional[str]] = [None] * len(batches)
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as executor:
+            futures = {executor.submit(self.upsert_batch, batch): i for i, batch in enumerate(batches)}
+            for future in as_completed(futures):
+                i = futures[future]
+                errors[i] = future.result()
+                if on_batch is not None:
+                    on_batch(batches[i], errors[i])
+
+        results = []
+        for batch, error in zip(batches, errors):
+            for vector in batch:
+                if error is None:
+                    results.append({"success": True, "id": vector[0]})
+                else:
+                    results.append({"error": error, "id": vector[0]})
+
+        elapsed = time.time() - start_time
+        failed_batches = sum(1 for error in errors if error is not None)
+        logger.info(f"Upserted {len(vectors)} vectors in {elapsed:.2f}s ({failed_batches} failed batches)")
+
+        return results
@@ -1,14 +1,39 @@
 import os
 import json
 import requests
-import PyPDF2
 import time
 import logging
-from pinecone import Pinecone
-from sentence_transformers import SentenceTransformer
-from typing import Dict, List, Optional, Union
+import numpy as np
+from concurrent.futures import Future
+from typing import Callable, Dict, Generator, List, Optional, Union
 
-from app.config.config import PINECONE_API_KEY, PINECONE_ENVIRONMENT, PINECONE_INDEX_NAME
+from app.config.config import (PINECONE_API_KEY, PINECONE_ENVIRONMENT, PINECONE_INDEX_NAME,
+                               INGEST_CACHE_DIR, INGEST_CACHE_MAX_MB, INDEX_MANIFEST_PATH,
+                               INGEST_CHECKPOINT_PATH, QUERY_EMBEDDING_CACHE_SIZE, INDEX_VERSION_PATH,
+                               VECTOR_BACKEND, LOCAL_INDEX_PATH, LOCAL_INDEX_ANN,
+                               LOCAL_INDEX_NLIST, LOCAL_INDEX_NPROBE, LOCAL_INDEX_QUANTIZATION,
+                               LOCAL_INDEX_RESCORE_FACTOR, EMBED_BATCHER_MAX_BATCH,
+                               EMBED_BATCHER_MAX_WAIT_MS, LEXICAL_INDEX_PATH, RETRIEVAL_MODES,
+                               HYBRID_BUDGET_MS, HYBRID_RRF_K, RERANK_ENABLED, RERANK_MODEL,
+                               RERANK_CANDIDATES, RERANK_BATCH_SIZE, RERANK_BUDGET_MS, RERANK_CACHE_SIZE,
+                               EMBEDDING_MODEL, EMBEDDING_BACKEND, EMBEDDING_THREADS, EMBEDDING_ONNX_DIR)
+from app.utils.backends import create_backend, check_index_schema, DEFAULT_INDEX_METRIC
+from app.utils.embedding import encode_batched, load_embedding_model, embedding_model_key, DEFAULT_EMBED_BATCH_SIZE
+from app.utils.upsert import BatchUpserter, DEFAULT_UPSERT_BATCH_SIZE, DEFAULT_UPSERT_WORKERS
+from app.utils.pdf_extract import PDFExtractor
+from app.utils.chunking import chunk_text, model_tokenizer, CHUNK_UNITS
+from app.utils.ingest_cache import IngestCache, embedding_cache_key, file_sha256, iter_documents_cached, embed_cached
+from app.utils.cache import QueryEmbeddingCache
+from app.utils.batching import MicroBatcher
+from app.utils.errors import (VectorStoreError, BackendUnavailableError, EmbeddingError, IndexSchemaError,
+                              UNAVAILABLE_MESSAGE)
+from app.utils.results import RetrievedChunk, RerankFallback
+from app.utils.bm25 import BM25Index
+from app.utils.fusion import reciprocal_rank_fusion
+from app.utils.rerank import CrossEncoderReranker
+from app.utils.index_version import bump_index_version
+from app.utils.sync import IndexManifest, make_chunk_id, params_key, diff_document, delete_ids
+from app.utils.checkpoint import IngestCheckpoint
 
 # Configure logging
 logging.basicConfig(
@@ -21,6 +46,30 @@ logging.basicConfig(
 )
 logger = logging.getLogger('pinecone')
 
+# Hybrid retrieval fuses this many times k candidates from each of the dense and BM25 rankings
+HYBRID_CANDIDATE_FACTOR = 2
+
+def run_steps(steps: Generator):
+    """
+    Run the steps of PineconeVectorDB.retrieval_steps() in the calling thread
+
+    Args:
+        steps: Generator yielding (stage, function, args) steps
+
+    Returns:
+        The generator's return value
+    """
+    result, error = None, None
+    while True:
+        try:
+            stage, function, args = steps.send(result) if error is None else steps.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            result, error = function(*args), None
+        except Exception as e:
+            result, error = None, e
+
 class PineconeVectorDB:
     """
     A class to handle interactions with the Pinecone Vector Database
@@ -31,8 +80,32 @@ class PineconeVectorDB:
                  index_name: str = PINECONE_INDEX_NAME,
                  chunk_size: int = 600,
                  chunk_overlap: int = 150,
-                 upload_delay: float = 2.0,
-                 relevance_threshold: float = 0.35):
+                 chunk_unit: str = 'chars',
+                 upload_delay: float = 0.0,
+                 relevance_threshold: float = 0.35,
+                 embed_batch_size: int = DEFAULT_EMBED_BATCH_SIZE,
+                 upsert_batch_size: int = DEFAULT_UPSERT_BATCH_SIZE,
+                 upsert_workers: int = DEFAULT_UPSERT_WORKERS,
+                 extract_workers: Optional[int] = None,
+                 cache_dir: Optional[str] = INGEST_CACHE_DIR,
+                 query_cache_size: int = QUERY_EMBEDDING_CACHE_SIZE,
+                 index_version_path: str = INDEX_VERSION_PATH,
+                 backend: str = VECTOR_BACKEND,
+                 local_index_path: str = LOCAL_INDEX_PATH,
+                 query_batch_max_size: int = EMBED_BATCHER_MAX_BATCH,
+                 query_batch_max_wait_ms: float = EMBED_BATCHER_MAX_WAIT_MS,
+                 lexical_index_path: Optional[str] = LEXICAL_INDEX_PATH,
+                 hybrid_budget_ms: float = HYBRID_BUDGET_MS,
+                 rrf_k: int = HYBRID_RRF_K,
+                 rerank_model: Optional[str] = RERANK_MODEL if RERANK_ENABLED else None,
+                 rerank_candidates: int = RERANK_CANDIDATES,
+                 rerank_batch_size: int = RERANK_BATCH_SIZE,
+                 rerank_budget_ms: float = RERANK_BUDGET_MS,
+                 rerank_cache_size: int = RERANK_CACHE_SIZE,
+                 embedding_model: str = EMBEDDING_MODEL,
+                 embedding_backend: str = EMBEDDING_BACKEND,
+                 embedding_threads: int = EMBEDDING_THREADS,
+                 rebuild_index: bool = False):
         """
         Initialize the Pinecone Vector DB client
         
@@ -40,31 +113,170 @@ class PineconeVectorDB:
             api_key: Pinecone API key
             environment: Pinecone environment
             index_name: Pinecone index name
-            chunk_size: Size of text chunks in characters
-            chunk_overlap: Overlap between chunks in characters
-            upload_delay: Delay between uploads in seconds
+            chunk_size: Size of text chunks in chunk_unit
+            chunk_overlap: Overlap between chunks in chunk_unit
+            chunk_unit: 'chars', or 'tokens' of the embedding model's tokenizer so chunks fit its sequence limit
+            upload_delay: Minimum delay between upsert requests in seconds (throttling responses raise it adaptively)
             relevance_threshold: Minimum similarity score (0-1) for results to be considered relevant
+            embed_batch_size: Number of chunks embedded per forward pass during uploads
+            upsert_batch_size: Number of vectors sent per upsert request
+            upsert_workers: Number of concurrent upsert requests
+            extract_workers: Number of processes used for PDF text extraction (defaults to the CPU count)
+            cache_dir: Directory of the extraction/embedding cache used during uploads (None disables it)
+            query_cache_size: Number of query embeddings kept in the LRU cache (0 disables it)
+            index_version_path: File bumped after every write so servers drop cached retrieval results
+            backend: Vector index backend, 'pinecone' or 'local'
+            local_index_path: Directory of the local index when backend is 'local'
+            query_batch_max_size: Most concurrent query embeddings encoded together (1 disables micro-batching)
+            query_batch_max_wait_ms: Longest a query waits for others to join its batch
+            lexical_index_path: Directory of the BM25 index kept next to the vectors (None disables it)
+            hybrid_budget_ms: Time BM25 scoring may take per hybrid query
+            rrf_k: Rank offset of the reciprocal rank fusion in hybrid mode
+            rerank_model: Cross-encoder re-scoring the retrieved candidates (None disables re-ranking)
+            rerank_candidates: Number of candidates retrieved for the cross-encoder to choose k from
+            rerank_batch_size: Number of (query, chunk) pairs per cross-encoder forward pass
+            rerank_budget_ms: Time re-ranking may take per query before falling back to bi-encoder order
+            rerank_cache_size: Number of (query, chunk) cross-encoder scores kept in memory
+            embedding_model: SentenceTransformer model embedding chunks and queries
+            embedding_backend: How the model runs: 'torch', 'onnx' or 'onnx-int8' (ONNX Runtime on CPU)
+            embedding_threads: Inference threads (0 for the library default)
+            rebuild_index: Delete and recreate the index if its dimension or metric does not
+                match the embedding model, instead of raising IndexSchemaError
+        
+        Raises:
+            IndexSchemaError: If the index does not match the embedding model and rebuild_index is not set
         """
         self.api_key = api_key
         self.environment = environment
         self.index_name = index_name
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        if chunk_unit not in CHUNK_UNITS:
+            raise ValueError(f"chunk_unit must be one of {', '.join(CHUNK_UNITS)}, got '{chunk_unit}'")
+        self.chunk_unit = chunk_unit
         self.upload_delay = upload_delay
         self.relevance_threshold = relevance_threshold
+        self.embed_batch_size = embed_batch_size
+        self.upsert_batch_size = upsert_batch_size
+        self.upsert_workers = upsert_workers
+        self.extract_workers = extract_workers
+        self.cache_dir = cache_dir
+        self.query_cache_size = query_cache_size
+        self.index_version_path = index_version_path
+        self.backend = backend
+        self.local_index_path = local_index_path
+        self.hybrid_budget_ms = hybrid_budget_ms
+        self.rrf_k = rrf_k
+        self.rerank_candidates = rerank_candidates
+        
+        # Connect to the index through the configured backend
+        local_options = {}
+        if self.backend == 'local':
+            local_options = {'ann': LOCAL_INDEX_ANN, 'nlist': LOCAL_INDEX_NLIST or None, 'nprobe': LOCAL_INDEX_NPROBE,
+                             'quantization': LOCAL_INDEX_QUANTIZATION,
+                             'rescore_factor': LOCAL_INDEX_RESCORE_FACTOR or None}
+        self.index = create_backend(self.backend, self.index_name, api_key=self.api_key,
+                                    local_path=self.local_index_path, **local_options)
+        self.pc = getattr(self.index, 'pc', None)
+        
+        # BM25 index over the same chunks, for hybrid retrieval
+        self.lexical_index = BM25Index(lexical_index_path) if lexical_index_path else None
+        
+        # PDF text extraction; worker processes are only started on first use
+        self.extractor = PDFExtractor(workers=self.extract_workers)
+        
+        # Content-addressed cache so re-ingesting unchanged PDFs skips extraction and embedding
+        self.ingest_cache = IngestCache(self.cache_dir, INGEST_CACHE_MAX_MB * 1024 * 1024) if self.cache_dir else None
+        
+        # Repeated questions in one user turn reuse the query embedding
+        self.query_embedding_cache = QueryEmbeddingCache(self.query_cache_size)
+        
+        # Concurrent requests share one forward pass for their query embeddings
+        self.query_batcher = None
+        if query_batch_max_size > 1:
+            self.query_batcher = MicroBatcher(self._encode_queries, max_batch=query_batch_max_size,
+                                              max_wait_ms=query_batch_max_wait_ms, name='query-embedding-batcher')
+        
+        # Batched, rate-limited writer for uploads
+        self.upserter = BatchUpserter(
+            self.index,
+            batch_size=self.upsert_batch_size,
+            max_workers=self.upsert_workers,
+            min_delay=self.upload_delay
+        )
         
-        # Initialize Pinecone with the new API
-        self.pc = Pinecone(api_key=self.api_key)
+        # Initialize the embedding model; the key identifies its embeddings in caches and the manifest
+        self.embedding_model_name = embedding_model
+        self.embedding_backend = embedding_backend
+        self.embedding_key = embedding_model_key(embedding_model, embedding_backend)
+        self.embedding_model = load_embedding_model(embedding_model, backend=embedding_backend,
+                                                    threads=embedding_threads, onnx_dir=EMBEDDING_ONNX_DIR)
+        self.chunk_tokenizer = None
+        if self.chunk_unit == 'tokens':
+            self.chunk_tokenizer = model_tokenizer(self.embedding_model, self.chunk_size)
         
-        # Connect to the index
-        self.index = self.pc.Index(self.index_name)
+        # An index built for another model rejects every write and query, so check once up front
+        self.embedding_dimension = self.embedding_model.get_sentence_embedding_dimension()
+        self.index_rebuilt = self.validate_index_schema(rebuild=rebuild_index)
         
-        # Initialize the embedding model
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')  # This model produces 384-dimensional embeddings
+        # Optional second stage re-scoring the over-fetched candidates
+        self.reranker = None
+        if rerank_model:
+            self.reranker = CrossEncoderReranker(rerank_model, batch_size=rerank_batch_size,
+                                                 budget_ms=rerank_budget_ms, cache_size=rerank_cache_size)
         
-        logger.info(f"Initialized PineconeVectorDB with index_name={self.index_name}")
-        logger.info(f"Using chunk_size={self.chunk_size}, chunk_overlap={self.chunk_overlap}, upload_delay={self.upload_delay}s")
-        logger.info(f"Using relevance_threshold={self.relevance_threshold}")
+        logger.info(f"Initialized PineconeVectorDB with index_name={self.index_name}, backend={self.backend}")
+        logger.info(f"Using chunk_size={self.chunk_size}, chunk_overlap={self.chunk_overlap} {self.chunk_unit}, upload_delay={self.upload_delay}s")
+        logger.info(f"Using relevance_threshold={self.relevance_threshold}, embed_batch_size={self.embed_batch_size}")
+        logger.info(f"Using upsert_batch_size={self.upsert_batch_size}, upsert_workers={self.upsert_workers}")
+        logger.info(f"Using embedding model {self.embedding_model_name} with the {self.embedding_backend} backend")
+    
+    def validate_index_schema(self, rebuild: bool = False) -> bool:
+        """
+        Check the index dimension and metric against the embedding model
+        
+        Args:
+            rebuild: Delete and recreate the index with the model's schema on a mismatch
+            
+        Returns:
+            True if the index was rebuilt, and is now empty
+            
+        Raises:
+            IndexSchemaError: On a mismatch, unless rebuild is set
+        """
+        try:
+            schema = check_index_schema(self.index, self.embedding_dimension, DEFAULT_INDEX_METRIC)
+        except IndexSchemaError as e:
+            if not rebuild:
+                logger.error(f"{str(e)}. Recreate the index with upload_pdfs.py or create_pinecone_index.py --rebuild-index")
+                raise
+            logger.warning(f"{str(e)}, rebuilding the index")
+            self.index.recreate(self.embedding_dimension, DEFAULT_INDEX_METRIC)
+            # The BM25 index describes the same chunks, so it starts over too
+            if self.lexical_index is not None:
+                self.lexical_index.clear()
+            self.mark_index_changed()
+            return True
+        except Exception as e:
+            # An unreachable index surfaces on the first request; it should not block start-up
+            logger.warning(f"Could not check the index schema: {str(e)}")
+            return False
+        
+        logger.info(f"Index schema matches the embedding model: dimension={schema.get('dimension')}, metric={schema.get('metric')}")
+        return False
+    
+    def mark_index_changed(self):
+        """
+        Persist buffered index writes and bump the index version so cached
+        retrieval results are invalidated
+        """
+        self.index.flush()
+        if self.lexical_index is not None:
+            self.lexical_index.flush()
+        try:
+            bump_index_version(self.index_version_path)
+        except OSError as e:
+            logger.warning(f"Could not bump index version at {self.index_version_path}: {str(e)}")
     
     def extract_text_from_pdf(self, pdf_path: str) -> str:
         """
@@ -76,27 +288,7 @@ class PineconeVectorDB:
         Returns:
             Extracted text from the PDF
         """
-        try:
-            logger.info(f"Extracting text from {pdf_path}")
-            with open(pdf_path, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
-                text = ""
-                total_pages = len(reader.pages)
-                logger.info(f"PDF has {total_pages} pages")
-                
-                for page_num in range(total_pages):
-                    try:
-                        page = reader.pages[page_num]
-                        page_text = page.extract_text()
-                        text += page_text + "\n\n"
-                    except Exception as e:
-                        logger.warning(f"Error extracting text from page {page_num+1}: {str(e)}")
-                
-                logger.info(f"Extracted {len(text)} characters from {pdf_path}")
-                return text
-        except Exception as e:
-            logger.error(f"Error extracting text from {pdf_path}: {str(e)}")
-            return ""
+        return self.extractor.extract_text(pdf_path)
     
     def chunk_text(self, text: str, chunk_size: Optional[int] = None, overlap: Optional[int] = None) -> List[str]:
         """
@@ -108,54 +300,38 @@ class PineconeVectorDB:
             overlap: The overlap between chunks (defaults to self.chunk_overlap)
             
         Returns:
-            List of text chunks
+            List of text chunks, sized in self.chunk_unit
         """
-        if not text:
-            return []
-        
-        # Use instance defaults if not provided
-        chunk_size = chunk_size or self.chunk_size
-        overlap = overlap or self.chunk_overlap
-            
-        chunks = []
-        start = 0
-        text_length = len(text)
-        
-        logger.info(f"Chunking text of length {text_length} with chunk_size={chunk_size}, overlap={overlap}")
+        chunk_size = self.chunk_size if chunk_size is None else chunk_size
+        overlap = self.chunk_overlap if overlap is None else overlap
+        return chunk_text(text, chunk_size, overlap, tokenizer=self.chunk_tokenizer)
+    
+    def embed_texts(self, texts: List[str], cache_key: Optional[str] = None) -> np.ndarray:
+        """
+        Create embeddings for many texts using batched encoding
         
-        while start < text_length:
-            end = min(start + chunk_size, text_length)
+        Args:
+            texts: The texts to embed
+            cache_key: Optional ingest cache key under which the embeddings are stored
             
-            # Try to end at a sentence or paragraph boundary if possible
-            if end < text_length:
-                # Check for paragraph boundary
-                paragraph_end = text.find('\n\n', end - 100, end + 100)
-                if paragraph_end != -1 and paragraph_end < end + 100:
-                    end = paragraph_end + 2
-                else:
-                    # Check for sentence boundary
-                    sentence_end = max(
-                        text.find('. ', end - 50, end + 50),
-                        text.find('? ', end - 50, end + 50),
-                        text.find('! ', end - 50, end + 50)
-                    )
-                    if sentence_end != -1 and sentence_end < end + 50:
-                        end = sentence_end + 2
-            
-            chunk = text[start:end]
-            chunks.append(chunk)
-            start += chunk_size - overlap
-        
-        logger.info(f"Created {len(chunks)} chunks")
-        return chunks
+        Returns:
+            Array of embeddings, in the same order as texts
+        """
+        return embed_cached(
+            lambda batch: encode_batched(self.embedding_model, batch, batch_size=self.embed_batch_size),
+            texts,
+            key=cache_key,
+            cache=self.ingest_cache
+        )
     
-    def upload_text(self, text: str, metadata: Dict = None) -> Dict:
+    def upload_text(self, text: str, metadata: Dict = None, embedding: Optional[List[float]] = None) -> Dict:
         """
         Upload text to the vector database
         
         Args:
             text: The text to upload
             metadata: Optional metadata to associate with the text
+            embedding: Optional precomputed embedding for the text
             
         Returns:
             API response
@@ -165,11 +341,12 @@ class PineconeVectorDB:
             return {"error": "Empty text provided"}
         
         try:
-            # Generate a unique ID for this chunk
-            chunk_id = f"chunk_{int(time.time())}_{hash(text) % 10000}"
+            # Derive the ID from the content so re-uploads overwrite instead of duplicating
+            chunk_id = make_chunk_id((metadata or {}).get("source", ""), text)
             
-            # Create embedding for the text
-            embedding = self.embedding_model.encode(text).tolist()
+            # Create embedding for the text unless it was computed in a batch
+            if embedding is None:
+                embedding = self.embedding_model.encode(text).tolist()
             
             # Prepare metadata
             if metadata is None:
@@ -177,8 +354,15 @@ class PineconeVectorDB:
             
             metadata["text"] = text
             
-            # Upload to Pinecone with the new API
-            self.index.upsert(vectors=[(chunk_id, embedding, metadata)])
+            # Upload to Pinecone with the new API, retrying transient failures
+            error = self.upserter.upsert_batch([(chunk_id, embedding, metadata)])
+            if error is not None:
+                logger.error(f"Error uploading text: {error}")
+                return {"error": error}
+            
+            if self.lexical_index is not None:
+                self.lexical_index.add([(chunk_id, text, metadata.get("source"), metadata.get("chunk_index"))])
+            self.mark_index_changed()
             
             logger.info(f"Successfully uploaded chunk with ID {chunk_id}")
             return {"success": True, "id": chunk_id}
@@ -187,12 +371,51 @@ class PineconeVectorDB:
             logger.error(f"Error uploading text: {str(e)}")
             return {"error": str(e)}
     
-    def upload_pdf(self, pdf_path: str) -> List[Dict]:
+    def open_checkpoint(self, path: str = INGEST_CHECKPOINT_PATH, resume: bool = False,
+                        mode: str = 'full') -> IngestCheckpoint:
+        """
+        Open the progress checkpoint of an upload, keyed on everything that
+        changes what gets written
+        
+        Args:
+            path: Path to the checkpoint file
+            resume: Continue from the progress of an interrupted run
+            mode: 'full' for uploads, 'sync' for sync_directory()
+            
+        Returns:
+            IngestCheckpoint to pass to the upload methods
+        """
+        target = self.local_index_path if self.backend == 'local' else self.index_name
+        params = params_key(self.chunk_size, self.chunk_overlap, self.embedding_key, self.chunk_unit)
+        return IngestCheckpoint(path, params=f"{params}|{mode}|{self.backend}:{target}", resume=resume)
+    
+    def _batch_checkpointer(self, checkpoint: Optional[IngestCheckpoint], filename: str,
+                            content_hash: Optional[str]) -> Optional[Callable]:
+        """
+        on_batch callback for BatchUpserter.upsert() recording each acknowledged batch
+        
+        Pinecone upserts are durable once acknowledged, so they are checkpointed
+        batch by batch; a local index only persists when it is flushed after
+        each document, so it is checkpointed per document instead
+        
+        Returns:
+            The callback, or None if batches are not checkpointed one by one
+        """
+        if checkpoint is None or self.backend == 'local':
+            return None
+        
+        def record(batch, error):
+            if error is None:
+                checkpoint.record_batch(filename, content_hash, [vector[0] for vector in batch])
+        return record
+    
+    def upload_pdf(self, pdf_path: str, checkpoint: Optional[IngestCheckpoint] = None) -> List[Dict]:
         """
         Process a PDF file and upload its content to the vector database
         
         Args:
             pdf_path: Path to the PDF file
+            checkpoint: Optional checkpoint recording progress and skipping completed work
             
         Returns:
             List of API responses for each chunk
@@ -200,56 +423,225 @@ class PineconeVectorDB:
         filename = os.path.basename(pdf_path)
         logger.info(f"Starting upload process for {filename}")
         
-        text = self.extract_text_from_pdf(pdf_path)
+        _, text, content_hash = next(iter_documents_cached(self.extractor, [pdf_path], self.ingest_cache))
+        return self.upload_document_text(filename, text, content_hash=content_hash, checkpoint=checkpoint)
+    
+    def upload_document_text(self, filename: str, text: str, content_hash: Optional[str] = None,
+                             checkpoint: Optional[IngestCheckpoint] = None) -> List[Dict]:
+        """
+        Chunk, embed and upload the extracted text of one document
+        
+        Args:
+            filename: Name of the source document, stored as chunk metadata
+            text: The document text
+            content_hash: SHA-256 of the source PDF, used to cache the chunk embeddings
+            checkpoint: Optional checkpoint; chunks it records as upserted are skipped,
+                and the chunks written here are recorded once the index has persisted them
+            
+        Returns:
+            List of API responses for each chunk
+        """
         if not text:
             logger.error(f"Failed to extract text from {filename}")
             return [{"error": f"Failed to extract text from {filename}"}]
         
         chunks = self.chunk_text(text)
-        results = []
         
-        logger.info(f"Uploading {len(chunks)} chunks from {filename}")
+        # Embed all chunks up front so the model sees whole batches
+        try:
+            cache_key = None
+            if content_hash is not None:
+                cache_key = embedding_cache_key(content_hash, self.chunk_size, self.chunk_overlap, self.embedding_key,
+                                                self.chunk_unit)
+            embeddings = self.embed_texts(chunks, cache_key=cache_key)
+        except Exception as e:
+            logger.error(f"Error embedding chunks from {filename}: {str(e)}")
+            return [{"error": f"Failed to embed chunks from {filename}: {str(e)}"}]
+        
+        # Build all vectors for the file, then upsert them in batches
+        positions = [i for i, chunk in enumerate(chunks) if chunk.strip()]
+        resumed = 0
+        done = checkpoint.done_ids(filename, content_hash) if checkpoint is not None else set()
+        if done:
+            remaining = [i for i in positions if make_chunk_id(filename, chunks[i]) not in done]
+            resumed = len(positions) - len(remaining)
+            positions = remaining
+            logger.info(f"Resuming {filename}: {resumed} chunks already upserted")
+        vectors = self._build_vectors(filename, chunks, positions, [embeddings[i] for i in positions])
+        
+        logger.info(f"Uploading {len(vectors)} chunks from {filename}")
+        on_batch = self._batch_checkpointer(checkpoint, filename, content_hash)
+        results = self.upserter.upsert(vectors, on_batch=on_batch)
         
-        for i, chunk in enumerate(chunks):
-            logger.info(f"Uploading chunk {i+1}/{len(chunks)} from {filename}")
+        # Summarize results
+        success_count = sum(1 for r in results if 'success' in r)
+        if success_count or resumed:
+            self._update_lexical_index(filename, chunks)
+            self.mark_index_changed()
+        error_count = len(results) - success_count
+        
+        # Only after mark_index_changed() has flushed them are local writes durable
+        if checkpoint is not None:
+            if success_count and on_batch is None:
+                checkpoint.record_batch(filename, content_hash, [r['id'] for r in results if 'success' in r])
+            if not error_count:
+                checkpoint.record_complete(filename, content_hash)
+        logger.info(f"Upload completed for {filename}: {success_count} chunks succeeded, {error_count} chunks failed")
+        
+        return results
+    
+    def _build_vectors(self, filename: str, chunks: List[str], positions: List[int], embeddings) -> List[tuple]:
+        """
+        Build (id, values, metadata) tuples for the chunks at the given positions
+        
+        Args:
+            filename: Name of the source document
+            chunks: All chunks of the document
+            positions: Indices into chunks to build vectors for
+            embeddings: One embedding per position
+            
+        Returns:
+            List of vectors with content-derived IDs, without duplicate IDs
+        """
+        vectors = []
+        seen = set()
+        for position, embedding in zip(positions, embeddings):
+            chunk = chunks[position]
+            chunk_id = make_chunk_id(filename, chunk)
+            if chunk_id in seen:
+                continue
+            seen.add(chunk_id)
             
             # Add metadata about the source
             metadata = {
                 "source": filename,
-                "chunk_index": i,
-                "total_chunks": len(chunks)
+                "chunk_index": position,
+                "total_chunks": len(chunks),
+                "text": chunk
             }
+            vectors.append((chunk_id, np.asarray(embedding).tolist(), metadata))
+        return vectors
+    
+    def _update_lexical_index(self, filename: str, chunks: List[str]):
+        """
+        Replace the chunks of a document in the BM25 index
+        
+        Args:
+            filename: Name of the source document
+            chunks: All chunks of the document
+        """
+        if self.lexical_index is None:
+            return
+        self.lexical_index.replace_source(filename, [(make_chunk_id(filename, chunk), chunk, filename, position)
+                                                     for position, chunk in enumerate(chunks) if chunk.strip()])
+    
+    def sync_directory(self, directory_path: str, manifest_path: str = INDEX_MANIFEST_PATH,
+                       checkpoint: Optional[IngestCheckpoint] = None) -> Dict[str, Dict]:
+        """
+        Bring the index in line with a directory of PDFs, writing only the difference
+        
+        Unchanged PDFs are skipped without extraction. For changed PDFs only
+        chunks whose content is new are embedded and upserted, and chunks that
+        disappeared are deleted. PDFs removed from the directory have all
+        their chunks deleted. A local manifest records what the index holds.
+        
+        Args:
+            directory_path: Path to the directory containing PDF files
+            manifest_path: Path to the local index manifest
+            checkpoint: Optional checkpoint from open_checkpoint(mode='sync'); chunks an
+                interrupted sync already upserted are not written again
             
-            result = self.upload_text(chunk, metadata)
-            results.append(result)
-            
-            # Log success or failure
-            if 'error' in result:
-                logger.warning(f"Failed to upload chunk {i+1}/{len(chunks)} from {filename}: {result['error']}")
-            else:
-                logger.info(f"Successfully uploaded chunk {i+1}/{len(chunks)} from {filename}")
-            
-            # Always add a delay between uploads to avoid overwhelming the API
-            # Use a longer delay after failures
-            if 'error' in result:
-                time.sleep(self.upload_delay * 2)
+        Returns:
+            Dictionary mapping filenames to counts of upserted, deleted and unchanged chunks
+        """
+        logger.info(f"Starting directory sync from {directory_path}")
+        
+        manifest = IndexManifest(manifest_path)
+        params = params_key(self.chunk_size, self.chunk_overlap, self.embedding_key, self.chunk_unit)
+        pdf_files = [f for f in os.listdir(directory_path) if f.lower().endswith('.pdf')]
+        results = {}
+        
+        # Documents that no longer exist lose all their chunks
+        for source in manifest.removed_sources(pdf_files):
+            stale_ids = manifest.chunk_ids(source)
+            delete_ids(self.index, sorted(stale_ids))
+            if self.lexical_index is not None:
+                self.lexical_index.remove_source(source)
+            self.mark_index_changed()
+            manifest.remove(source)
+            manifest.save()
+            results[source] = {"upserted": 0, "deleted": len(stale_ids), "unchanged": 0}
+            logger.info(f"Deleted {len(stale_ids)} chunks of removed document {source}")
+        
+        changed_paths = []
+        for filename in pdf_files:
+            file_path = os.path.join(directory_path, filename)
+            if manifest.is_unchanged(filename, file_sha256(file_path), params):
+                results[filename] = {"upserted": 0, "deleted": 0, "unchanged": len(manifest.chunk_ids(filename))}
             else:
-                time.sleep(self.upload_delay)
+                changed_paths.append(file_path)
         
-        # Summarize results
-        success_count = sum(1 for r in results if 'success' in r)
-        error_count = len(results) - success_count
-        logger.info(f"Upload completed for {filename}: {success_count} chunks succeeded, {error_count} chunks failed")
+        logger.info(f"{len(changed_paths)} of {len(pdf_files)} PDF files changed since the last sync")
+        if self.lexical_index is not None and len(self.lexical_index) == 0 and len(changed_paths) < len(pdf_files):
+            logger.warning("The BM25 index is empty and sync skips unchanged PDFs; run a full upload to build it")
+        
+        for file_path, text, content_hash in iter_documents_cached(self.extractor, changed_paths, self.ingest_cache):
+            filename = os.path.basename(file_path)
+            if not text:
+                logger.error(f"Failed to extract text from {filename}, leaving its chunks untouched")
+                results[filename] = {"error": f"Failed to extract text from {filename}"}
+                continue
+            
+            chunks = self.chunk_text(text)
+            chunk_ids, new_positions, stale_ids = diff_document(manifest, filename, chunks)
+            done = checkpoint.done_ids(filename, content_hash) if checkpoint is not None else set()
+            if done:
+                new_positions = [i for i in new_positions if make_chunk_id(filename, chunks[i]) not in done]
+            
+            # Only chunks with new content are embedded and written
+            embeddings = self.embed_texts([chunks[i] for i in new_positions])
+            vectors = self._build_vectors(filename, chunks, new_positions, embeddings)
+            on_batch = self._batch_checkpointer(checkpoint, filename, content_hash)
+            upsert_results = self.upserter.upsert(vectors, on_batch=on_batch)
+            if vectors:
+                self.mark_index_changed()
+            if checkpoint is not None and vectors and on_batch is None:
+                checkpoint.record_batch(filename, content_hash, [r['id'] for r in upsert_results if 'success' in r])
+            failed = [r for r in upsert_results if 'success' not in r]
+            if failed:
+                # Keep the old manifest entry so the next sync retries this document
+                logger.error(f"{len(failed)} chunks of {filename} failed to upload, not recording it in the manifest")
+                results[filename] = {"error": failed[0]['error']}
+                continue
+            
+            if stale_ids:
+                delete_ids(self.index, stale_ids)
+            self._update_lexical_index(filename, chunks)
+            self.mark_index_changed()
+            manifest.update(filename, content_hash, params, chunk_ids)
+            manifest.save()
+            if checkpoint is not None:
+                checkpoint.record_complete(filename, content_hash)
+            
+            results[filename] = {
+                "upserted": len(vectors),
+                "deleted": len(stale_ids),
+                "unchanged": len(chunk_ids) - len(vectors)
+            }
+            logger.info(f"Synced {filename}: {results[filename]}")
         
         return results
     
-    def upload_directory(self, directory_path: str, skip_on_error: bool = True) -> Dict[str, List[Dict]]:
+    def upload_directory(self, directory_path: str, skip_on_error: bool = True,
+                         checkpoint: Optional[IngestCheckpoint] = None) -> Dict[str, List[Dict]]:
         """
         Process all PDF files in a directory and upload their content
         
         Args:
             directory_path: Path to the directory containing PDF files
             skip_on_error: Whether to skip files that fail completely
+            checkpoint: Optional checkpoint; files it records as complete are skipped
+                and only the failed chunks of the others are uploaded again
             
         Returns:
             Dictionary mapping filenames to API responses
@@ -258,20 +650,31 @@ class PineconeVectorDB:
         
         results = {}
         pdf_files = [f for f in os.listdir(directory_path) if f.lower().endswith('.pdf')]
+        pdf_paths = [os.path.join(directory_path, f) for f in pdf_files]
         
         logger.info(f"Found {len(pdf_files)} PDF files in {directory_path}")
         
-        for i, filename in enumerate(pdf_files):
-            file_path = os.path.join(directory_path, filename)
-            logger.info(f"Processing file {i+1}/{len(pdf_files)}: {filename}")
+        if checkpoint is not None:
+            remaining = [path for path in pdf_paths
+                         if not checkpoint.is_complete(os.path.basename(path), file_sha256(path))]
+            if len(remaining) < len(pdf_paths):
+                logger.info(f"Skipping {len(pdf_paths) - len(remaining)} PDF files completed by an earlier run")
+            pdf_paths = remaining
+        
+        # Files are extracted in parallel and uploaded in the order they finish
+        documents = iter_documents_cached(self.extractor, pdf_paths, self.ingest_cache)
+        for i, (file_path, text, content_hash) in enumerate(documents):
+            filename = os.path.basename(file_path)
+            logger.info(f"Processing file {i+1}/{len(pdf_paths)}: {filename}")
             
             try:
-                file_results = self.upload_pdf(file_path)
+                file_results = self.upload_document_text(filename, text, content_hash=content_hash,
+                                                         checkpoint=checkpoint)
                 results[filename] = file_results
                 
-                # Add extra delay between files
-                time.sleep(self.upload_delay * 2)
-                
+            except IndexSchemaError:
+                # Every other file would be rejected the same way
+                raise
             except Exception as e:
                 error_msg = f"Error processing {filename}: {str(e)}"
                 logger.error(error_msg)
@@ -284,55 +687,344 @@ class PineconeVectorDB:
         
         return results
     
-    def query(self, query_text: str, k: int = 5) -> List[str]:
+    def embed_query(self, query_text: str) -> np.ndarray:
+        """
+        Create the embedding for a query, served from the LRU cache when possible
+        
+        Args:
+            query_text: The query text
+            
+        Returns:
+            Read-only embedding array
+        """
+        return self.query_embedding_cache.get_or_compute(query_text, self._encode_query)
+    
+    def _encode_query(self, query_text: str) -> np.ndarray:
+        if self.query_batcher is not None:
+            return self.query_batcher.process(query_text)
+        return self.embedding_model.encode(query_text)
+    
+    def _encode_queries(self, query_texts: List[str]) -> List[np.ndarray]:
+        # Batch function of the micro-batcher: one forward pass for everything queued
+        return list(encode_batched(self.embedding_model, query_texts, batch_size=len(query_texts)))
+    
+    def submit_query_embedding(self, query_text: str) -> Future:
+        """
+        Request a query embedding without blocking, for async callers
+        
+        Args:
+            query_text: The query text
+            
+        Returns:
+            Future resolved with the read-only embedding
+        """
+        future = Future()
+        embedding = self.query_embedding_cache.get(query_text)
+        if embedding is not None:
+            future.set_result(embedding)
+            return future
+        
+        if self.query_batcher is None:
+            try:
+                future.set_result(self.query_embedding_cache.put(query_text, self.embedding_model.encode(query_text)))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        
+        def store(encoded: Future):
+            try:
+                future.set_result(self.query_embedding_cache.put(query_text, encoded.result()))
+            except Exception as e:
+                future.set_exception(e)
+        
+        self.query_batcher.submit(query_text).add_done_callback(store)
+        return future
+    
+    def embed_queries(self, query_texts: List[str]) -> List[np.ndarray]:
+        """
+        Create embeddings for several queries, encoding all cache misses in one forward pass
+        
+        Args:
+            query_texts: The query texts
+            
+        Returns:
+            Read-only embedding arrays, in input order
+        """
+        embeddings = [self.query_embedding_cache.get(text) for text in query_texts]
+        
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            encoded = encode_batched(self.embedding_model, [query_texts[i] for i in missing],
+                                     batch_size=self.embed_batch_size)
+            for i, embedding in zip(missing, encoded):
+                embeddings[i] = self.query_embedding_cache.put(query_texts[i], embedding)
+        
+        return embeddings
+    
+    def _relevant_chunks(self, results: Dict) -> List[RetrievedChunk]:
+        """
+        Filter query matches by the relevance threshold
+        
+        Args:
+            results: Query result from the index backend
+            
+        Returns:
+            List of RetrievedChunk results, most relevant first
+        """
+        # Filter results by relevance threshold
+        relevant_chunks = [RetrievedChunk.from_match(match) for match in results['matches']
+                           if match['score'] >= self.relevance_threshold]
+        
+        # Log the scores for debugging
+        if relevant_chunks:
+            scores_formatted = [f"{chunk.score:.4f}" for chunk in relevant_chunks]
+            logger.info(f"Relevance scores: {scores_formatted}")
+            logger.info(f"Retrieved {len(relevant_chunks)} relevant chunks from vector store (threshold: {self.relevance_threshold})")
+        else:
+            logger.warning(f"No chunks met the relevance threshold of {self.relevance_threshold}")
+        
+        return relevant_chunks
+    
+    def query(self, query_text: str, k: int = 5, mode: str = 'dense') -> List[RetrievedChunk]:
         """
         Query the vector store for relevant chunks
         
         Args:
             query_text: The query text
             k: Number of chunks to retrieve
+            mode: 'dense' (embeddings only) or 'hybrid' (dense fused with BM25)
             
         Returns:
-            List of relevant text chunks
+            List of RetrievedChunk results, most relevant first
+            
+        Raises:
+            EmbeddingError: If the query could not be embedded
+            BackendUnavailableError: If the index backend query failed
+        """
+        return run_steps(self.retrieval_steps(query_text, k, mode))
+    
+    def retrieval_steps(self, query_text: str, k: int = 5, mode: str = 'dense') -> Generator:
         """
-        logger.info(f"Querying vector store with: '{query_text}', k={k}")
+        The steps of query() as a generator, so the threaded and async serving
+        paths share one definition of retrieval
+        
+        Each step is yielded as (stage, function, args): 'embed' (CPU-bound,
+        args is (query_text,)), 'search' (waits on the index) and 'rerank'
+        (CPU-bound, skipped without a re-ranker). The caller runs
+        function(*args) wherever suits the stage and sends back its result,
+        or throws in the exception it raised; run_steps() runs them all in
+        the calling thread.
+        
+        Args:
+            query_text: The query text
+            k: Number of chunks to retrieve
+            mode: 'dense' (embeddings only) or 'hybrid' (dense fused with BM25)
+            
+        Returns:
+            List of RetrievedChunk results, most relevant first, as the generator's value
+            
+        Raises:
+            EmbeddingError: If the query could not be embedded
+            BackendUnavailableError: If the index backend query failed
+        """
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode '{mode}', expected one of {', '.join(RETRIEVAL_MODES)}")
+        
+        logger.info(f"Querying vector store with: '{query_text}', k={k}, mode={mode}")
         
         try:
             # Create embedding for the query
-            query_embedding = self.embedding_model.encode(query_text).tolist()
+            query_embedding = yield 'embed', self.embed_query, (query_text,)
+        except Exception as e:
+            logger.error(f"Error embedding query: {str(e)}")
+            raise EmbeddingError(f"Could not embed the query: {str(e)}") from e
+        
+        fetch_k = self.candidate_count(k)
+        if mode == 'hybrid':
+            candidates = yield 'search', self.search_hybrid, (query_text, query_embedding, fetch_k)
+        else:
+            candidates = yield 'search', self.search, (query_embedding, fetch_k)
+        if self.reranker is None or len(candidates) <= 1:
+            return candidates[:k]
+        return (yield 'rerank', self.rerank, (query_text, candidates, k))
+    
+    def candidate_count(self, k: int) -> int:
+        """
+        Number of candidates to retrieve so the re-ranker has enough to choose k from
+        
+        Args:
+            k: Number of chunks that will be returned
+            
+        Returns:
+            k, or the re-ranking candidate count if re-ranking is enabled and it is larger
+        """
+        if self.reranker is None:
+            return k
+        return max(k, self.rerank_candidates)
+    
+    def rerank(self, query_text: str, candidates: List[RetrievedChunk], k: int) -> List[RetrievedChunk]:
+        """
+        Keep the k best candidates according to the cross-encoder
+        
+        Re-ranking is best effort: if it is disabled, fails, or runs out of
+        its time budget, the first k candidates are returned in their
+        original order. Those of a failure or an exhausted budget come as a
+        RerankFallback, so callers can tell them apart and not cache them.
+        
+        Args:
+            query_text: The query text
+            candidates: Candidates from search() or search_hybrid(), best first
+            k: Number of chunks to return
+            
+        Returns:
+            List of RetrievedChunk results, best first
+        """
+        if self.reranker is None or len(candidates) <= 1:
+            return candidates[:k]
+        
+        try:
+            return self.reranker.rerank(query_text, candidates, k)
+        except Exception as e:
+            logger.error(f"Error re-ranking candidates, keeping bi-encoder order: {str(e)}")
+            return RerankFallback(candidates[:k])
+    
+    def search(self, query_embedding: np.ndarray, k: int = 5) -> List[RetrievedChunk]:
+        """
+        Look up the chunks nearest to an already computed query embedding
+        
+        This is the I/O half of query(), split out so callers can run the
+        CPU-bound embedding and the index lookup on different executors.
+        
+        Args:
+            query_embedding: Embedding from embed_query()
+            k: Number of chunks to retrieve
             
-            # Query Pinecone with the new API
+        Returns:
+            List of RetrievedChunk results, most relevant first
+            
+        Raises:
+            BackendUnavailableError: If the index backend query failed
+        """
+        try:
+            # Query the vector index backend
             results = self.index.query(
-                vector=query_embedding,
+                vector=np.asarray(query_embedding).tolist(),
                 top_k=k,
                 include_metadata=True
             )
+            return self._relevant_chunks(results)
             
-            # Filter results by relevance threshold and extract text from metadata
-            relevant_chunks = []
-            for match in results['matches']:
-                score = match['score']
-                if score >= self.relevance_threshold:
-                    relevant_chunks.append({
-                        'text': match['metadata']['text'],
-                        'score': score
-                    })
-            
-            # Log the scores for debugging
-            if relevant_chunks:
-                scores_formatted = [f"{score:.4f}" for score in [chunk['score'] for chunk in relevant_chunks]]
-                logger.info(f"Relevance scores: {scores_formatted}")
-                logger.info(f"Retrieved {len(relevant_chunks)} relevant chunks from vector store (threshold: {self.relevance_threshold})")
-            else:
-                logger.warning(f"No chunks met the relevance threshold of {self.relevance_threshold}")
+        except Exception as e:
+            logger.error(f"Error querying vector store: {str(e)}")
+            raise BackendUnavailableError(UNAVAILABLE_MESSAGE) from e
+    
+    def search_hybrid(self, query_text: str, query_embedding: np.ndarray, k: int = 5) -> List[RetrievedChunk]:
+        """
+        Look up chunks by embedding and by BM25, fusing both rankings
+        
+        Args:
+            query_text: The query text, for the BM25 side
+            query_embedding: Embedding from embed_query()
+            k: Number of chunks to retrieve
+            
+        Returns:
+            List of RetrievedChunk results carrying their fused score, best first
+            
+        Raises:
+            BackendUnavailableError: If the index backend query failed
+        """
+        dense = self.search(query_embedding, k * HYBRID_CANDIDATE_FACTOR)
+        return self._fuse_lexical(query_text, dense, k)
+    
+    def _fuse_lexical(self, query_text: str, dense: List[RetrievedChunk], k: int) -> List[RetrievedChunk]:
+        """
+        Fuse dense candidates with BM25 candidates for the same query
+        
+        The BM25 side is best effort: without a lexical index, or if it
+        fails, the dense ranking is returned on its own.
+        
+        Args:
+            query_text: The query text
+            dense: Dense candidates, best first
+            k: Number of chunks to return
             
-            # Return just the text for backward compatibility
-            return [chunk['text'] for chunk in relevant_chunks]
+        Returns:
+            List of RetrievedChunk results, best first
+        """
+        if self.lexical_index is None:
+            return dense[:k]
+        
+        start = time.perf_counter()
+        try:
+            lexical = self.lexical_index.search(query_text, k * HYBRID_CANDIDATE_FACTOR,
+                                                budget_ms=self.hybrid_budget_ms)
+        except Exception as e:
+            logger.error(f"Error searching the BM25 index, using dense results only: {str(e)}")
+            return dense[:k]
+        
+        fused = reciprocal_rank_fusion([dense, lexical], k, rrf_k=self.rrf_k)
+        logger.info(f"Fused {len(dense)} dense and {len(lexical)} BM25 candidates in "
+                    f"{(time.perf_counter() - start) * 1000:.2f} ms")
+        return fused
+    
+    def query_many(self, query_texts: List[str], k: int = 5,
+                   mode: str = 'dense') -> List[Union[List[RetrievedChunk], VectorStoreError]]:
+        """
+        Query the vector store for several queries at once
+        
+        All queries are embedded in one forward pass, then looked up in a
+        single call to the index backend (concurrent requests for Pinecone,
+        one matrix product for the local backend).
+        
+        Args:
+            query_texts: The query texts
+            k: Number of chunks to retrieve per query
+            mode: 'dense' (embeddings only) or 'hybrid' (dense fused with BM25)
             
+        Returns:
+            One entry per query, in order: its list of RetrievedChunk results,
+            or the VectorStoreError that made it fail
+        """
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode '{mode}', expected one of {', '.join(RETRIEVAL_MODES)}")
+        
+        logger.info(f"Querying vector store with a batch of {len(query_texts)} queries, k={k}, mode={mode}")
+        
+        if not query_texts:
+            return []
+        
+        try:
+            embeddings = self.embed_queries(query_texts)
+        except Exception as e:
+            logger.error(f"Error embedding queries: {str(e)}")
+            error = EmbeddingError(f"Could not embed the query: {str(e)}")
+            error.__cause__ = e
+            return [error for _ in query_texts]
+        
+        fetch_k = self.candidate_count(k)
+        try:
+            top_k = fetch_k * HYBRID_CANDIDATE_FACTOR if mode == 'hybrid' else fetch_k
+            results = self.index.query_many([embedding.tolist() for embedding in embeddings],
+                                            top_k=top_k, include_metadata=True)
         except Exception as e:
-            error_msg = f"API_ERROR: Vector database API is currently unavailable. Please try again later."
             logger.error(f"Error querying vector store: {str(e)}")
-            return [error_msg]
+            results = [e for _ in query_texts]
+        
+        chunks = []
+        for query_text, result in zip(query_texts, results):
+            try:
+                if isinstance(result, Exception):
+                    raise result
+                candidates = self._relevant_chunks(result)
+                if mode == 'hybrid':
+                    candidates = self._fuse_lexical(query_text, candidates, fetch_k)
+                chunks.append(self.rerank(query_text, candidates, k))
+            except Exception as e:
+                logger.error(f"Error querying vector store for '{query_text}': {str(e)}")
+                error = BackendUnavailableError(UNAVAILABLE_MESSAGE)
+                error.__cause__ = e
+                chunks.append(error)
+        return chunks
     
     def ask_question(self, question: str, context_chunks: List[str] = None) -> str:
         """
@@ -340,47 +1032,34 @@ class PineconeVectorDB:
         
         Args:
             question: The question to ask
-            context_chunks: Optional pre-retrieved context chunks (for RAG)
+            context_chunks: Optional pre-retrieved context chunk texts (for RAG)
             
         Returns:
             Answer to the question
+            
+        Raises:
+            VectorStoreError: If context had to be retrieved and retrieval failed
         """
         logger.info(f"Asking question: '{question}'")
         
         # Get context chunks if not provided
         if context_chunks is None or len(context_chunks) == 0:
             logger.info("No context provided, retrieving context first")
-            context_chunks = self.query(question, k=5)
-            
-            # Check if we got an API error
-            if context_chunks and len(context_chunks) == 1 and context_chunks[0].startswith("API_ERROR:"):
-                logger.error("Cannot ask question due to API error")
-                return context_chunks[0]
+            context_chunks = [chunk.text for chunk in self.query(question, k=5)]
             
             if not context_chunks or len(context_chunks) == 0:
                 logger.warning("No context found for question, cannot provide accurate answer")
                 return "I don't have information about this topic in my knowledge base."
         
-        # Check for API error in provided context chunks
-        if context_chunks and len(context_chunks) == 1 and context_chunks[0].startswith("API_ERROR:"):
-            logger.error("Cannot ask question with provided context due to API error")
-            return context_chunks[0]
-        
         logger.info(f"Using {len(context_chunks)} context chunks to answer question")
         
-        try:
-            # For now, we'll just return the most relevant context chunk as the answer
-            # In a real implementation, you would use an LLM to generate an answer based on the context
-            answer = context_chunks[0]
-            
-            if answer:
-                logger.info(f"Received answer of length {len(answer)}")
-            else:
-                logger.warning("Received empty answer")
-                
-            return answer
+        # For now, we'll just return the most relevant context chunk as the answer
+        # In a real implementation, you would use an LLM to generate an answer based on the context
+        answer = context_chunks[0]
+        
+        if answer:
+            logger.info(f"Received answer of length {len(answer)}")
+        else:
+            logger.warning("Received empty answer")
             
-        except Exception as e:
-            error_msg = f"API_ERROR: Vector database API is currently unavailable. Please try again later."
-            logger.error(f"Error asking question: {str(e)}")
-            return error_msg 
\ No newline at end of file
+        return answer
@@ -0,0 +1,33 @@
+import gc
+import os
+import sys
+import logging
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config.config import validate_config
+
+logger = logging.getLogger('wsgi')
+
+from app.utils.embedding import set_embedding_threads
+
+# Keep the embedding model single-threaded while warming up in the master
+# process: an intra-op thread pool (torch or ONNX Runtime) started before
+# fork() is not inherited by the workers and can leave them hanging. Each
+# worker sets its own thread count after the fork (see gunicorn.conf.py).
+set_embedding_threads(1)
+
+from app.server import create_app
+
+validate_config()
+
+# Built once in the master when gunicorn preloads the app: the embedding
+# model, the index client and a memory-mapped local index are inherited by
+# every worker and shared copy-on-write
+app = create_app(warm_up=True, background_warm_up=False)
+
+# Move everything allocated so far out of the garbage collector's reach, so
+# collections in the workers do not write to (and thereby copy) the shared pages
+gc.freeze()
+logger.info(f"Preloaded application, {gc.get_freeze_count()} objects frozen")
@@ -0,0 +1,113 @@
+import os
+import sys
+import glob
+import time
+import argparse
+import numpy as np
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.utils.ann import IVFFlatIndex, auto_nlist
+from app.utils.backends import read_local_vectors
+
+index_name = os.environ.get('PINECONE_INDEX_NAME', 'sfold')
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+def load_embeddings(args):
+    """
+    Load the corpus embeddings written by create_pinecone_index.py, either
+    from a local index (--backend local) or from the ingestion cache
+    """
+    if args.synthetic:
+        # Clustered Gaussian data, to look at scale beyond the current corpus
+        rng = np.random.default_rng(args.seed)
+        centers = rng.normal(size=(max(1, args.synthetic // 100), args.dimension))
+        labels = rng.integers(0, len(centers), args.synthetic)
+        return centers[labels] + 1.5 * rng.normal(size=(args.synthetic, args.dimension)), 'synthetic'
+
+    vectors = read_local_vectors(args.index_path)
+    if vectors is not None:
+        return np.asarray(vectors), args.index_path
+
+    files = sorted(glob.glob(os.path.join(args.cache_dir, 'embeddings', '*.npy')))
+    if files:
+        return np.concatenate([np.load(path) for path in files]), f"{len(files)} files in {args.cache_dir}"
+
+    sys.exit(f"No embeddings found in {args.index_path} or {args.cache_dir}; run "
+             f"'python create_pinecone_index.py --backend local' first, or pass --synthetic N")
+
+def top_k(matrix, rows, query, k):
+    # rows=None scores the whole matrix, without gathering it first
+    scores = matrix @ query if rows is None else matrix[rows] @ query
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top if rows is None else rows[top]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark recall@k and latency of the IVF index against exact search')
+    parser.add_argument('--index-path', type=str, default=os.path.join('local_index', index_name),
+                        help='Local index written by create_pinecone_index.py --backend local')
+    parser.add_argument('--cache-dir', type=str, default=os.environ.get('INGEST_CACHE_DIR', '.ingest_cache'),
+                        help='Ingestion cache to read embeddings from if there is no local index')
+    parser.add_argument('--synthetic', type=int, default=0, help='Use N synthetic vectors instead')
+    parser.add_argument('--dimension', type=int, default=384, help='Dimension of synthetic vectors')
+    parser.add_argument('--queries', type=int, default=200, help='Number of held-out query vectors')
+    parser.add_argument('--k', type=int, default=5, help='Number of neighbours to retrieve')
+    parser.add_argument('--nlist', type=int, default=0, help='Number of IVF lists, 0 for about sqrt(n)')
+    parser.add_argument('--nprobe', type=str, default='1,2,4,8,16,32', help='Comma-separated nprobe values')
+    parser.add_argument('--incremental', type=float, default=0.0,
+                        help='Share of vectors inserted after training, as the ingestion scripts do')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    args = parser.parse_args()
+
+    vectors, origin = load_embeddings(args)
+    vectors = normalize(vectors)
+    rng = np.random.default_rng(args.seed)
+
+    # Held-out corpus vectors serve as queries, so they are not their own nearest neighbour
+    order = rng.permutation(len(vectors))
+    query_count = min(args.queries, len(vectors) // 10)
+    queries = vectors[order[:query_count]]
+    corpus = np.ascontiguousarray(vectors[order[query_count:]])
+    print(f"Corpus: {len(corpus)} vectors of dimension {corpus.shape[1]} from {origin}, {query_count} queries, k={args.k}")
+
+    start = time.perf_counter()
+    truth = [set(top_k(corpus, None, query, args.k).tolist()) for query in queries]
+    exact_ms = (time.perf_counter() - start) / query_count * 1000
+    print(f"Exact search: {exact_ms:.3f} ms/query")
+
+    trained_count = len(corpus) - int(len(corpus) * args.incremental)
+    ivf = IVFFlatIndex(nlist=args.nlist or auto_nlist(trained_count))
+    start = time.perf_counter()
+    ivf.train(corpus[:trained_count])
+    build_s = time.perf_counter() - start
+    if trained_count < len(corpus):
+        start = time.perf_counter()
+        ivf.set_rows(np.arange(trained_count, len(corpus)), corpus[trained_count:])
+        print(f"Inserted {len(corpus) - trained_count} vectors incrementally in {time.perf_counter() - start:.3f}s")
+    print(f"IVF build: nlist={ivf.nlist}, trained on {trained_count} vectors in {build_s:.2f}s")
+
+    print(f"{'nprobe':>6} {'recall@k':>9} {'ms/query':>9} {'p99 ms':>8} {'scanned':>8} {'speedup':>8}")
+    for nprobe in [int(value) for value in args.nprobe.split(',')]:
+        if nprobe > ivf.nlist:
+            continue
+        latencies = []
+        recall = 0.0
+        scanned = 0
+        for query, expected in zip(queries, truth):
+            start = time.perf_counter()
+            rows = ivf.candidates(query, nprobe)
+            found = top_k(corpus, rows, query, args.k) if len(rows) else rows
+            latencies.append(time.perf_counter() - start)
+            recall += len(expected & set(found.tolist())) / len(expected)
+            scanned += len(rows)
+        mean_ms = np.mean(latencies) * 1000
+        print(f"{nprobe:>6} {recall / query_count:>9.3f} {mean_ms:>9.3f} {np.percentile(latencies, 99) * 1000:>8.3f} "
+              f"{scanned / query_count / len(corpus):>7.1%} {exact_ms / mean_ms:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
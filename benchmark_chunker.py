@@ -0,0 +1,197 @@
+import os
+import re
+import sys
+import glob
+import time
+import random
+import argparse
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.utils.chunking import iter_chunk_spans
+
+def legacy_chunk_text(text, chunk_size, overlap):
+    """
+    The chunker used before app/utils/chunking.py, kept for comparison:
+    several windowed find() calls per chunk, and a fixed stride whatever
+    boundary was picked
+    """
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            paragraph_end = text.find('\n\n', end - 100, end + 100)
+            if paragraph_end != -1 and paragraph_end < end + 100:
+                end = paragraph_end + 2
+            else:
+                sentence_end = max(text.find('. ', end - 50, end + 50),
+                                   text.find('? ', end - 50, end + 50),
+                                   text.find('! ', end - 50, end + 50))
+                if sentence_end != -1 and sentence_end < end + 50:
+                    end = sentence_end + 2
+        chunks.append((start, end))
+        start += chunk_size - overlap
+    return chunks
+
+class WordTokenizer:
+    """
+    Stand-in for a fast Hugging Face tokenizer: one token per word or
+    punctuation mark, with character offsets
+    """
+    is_fast = True
+    _TOKEN = re.compile(r'\w+|[^\w\s]')
+
+    def __call__(self, text, **kwargs):
+        return {'offset_mapping': [match.span() for match in self._TOKEN.finditer(text)]}
+
+def load_tokenizer(name):
+    if name == 'words':
+        return WordTokenizer()
+    from app.utils.chunking import model_tokenizer
+    from app.utils.embedding import load_embedding_model
+    return model_tokenizer(load_embedding_model(name))
+
+def synthetic_text(rng, length):
+    words = ("RNA secondary structure folding energy Sfold ensemble probability hybridization siRNA target "
+             "accessibility mRNA sampling Boltzmann nucleotide").split()
+    parts = []
+    size = 0
+    while size < length:
+        sentence = " ".join(rng.choice(words) for _ in range(rng.randint(4, 30)))
+        sentence += rng.choice([". ", ". ", "? ", ".\n", "\n\n", ", "])
+        parts.append(sentence)
+        size += len(sentence)
+    return "".join(parts)[:length]
+
+def load_texts(args, rng):
+    files = sorted(glob.glob(os.path.join(args.cache_dir, 'text', '*.txt')))
+    if files and not args.synthetic:
+        texts = []
+        for path in files[:args.max_docs]:
+            with open(path, 'r', encoding='utf-8') as file:
+                texts.append(file.read())
+        return texts, f"{len(texts)} cached documents from {args.cache_dir}"
+    size = args.synthetic or 200000
+    return [synthetic_text(rng, size) for _ in range(args.max_docs)], f"{args.max_docs} synthetic documents"
+
+def check_spans(text, spans, chunk_size, tokenizer=None):
+    """
+    Properties every chunking must have: the chunks start at the beginning,
+    end at the end, never leave a gap, always move forward, and stay
+    within chunk_size
+
+    Returns:
+        Description of the first violation, or None
+    """
+    if not text:
+        return None if not spans else "chunks for empty text"
+    if not spans or spans[0][0] != 0:
+        return "text before the first chunk"
+    if spans[-1][1] != len(text):
+        return f"text after the last chunk ({spans[-1][1]} < {len(text)})"
+    for (start, end), (next_start, next_end) in zip(spans, spans[1:]):
+        if next_start > end:
+            return f"gap between {end} and {next_start}"
+        if next_start <= start or next_end <= end:
+            return f"chunk at {next_start} does not move forward from {start}"
+    for start, end in spans:
+        size = end - start if tokenizer is None else len(tokenizer(text[start:end])['offset_mapping'])
+        if size > chunk_size:
+            return f"chunk at {start} has size {size} > {chunk_size}"
+    return None
+
+def run_checks(count, seed):
+    """
+    Randomized property checks over adversarial texts and parameters
+    """
+    rng = random.Random(seed)
+    tokenizer = WordTokenizer()
+    alphabet = "abcdefgh"
+    separators = [" ", "  ", "\n", "\n\n", ". ", "? ", "!\n", "\t"]
+    for case in range(count):
+        length = rng.choice([0, 1, 5, rng.randint(1, 200), rng.randint(200, 5000)])
+        text = "".join(rng.choice(separators) if rng.random() < rng.random() * 0.5 else rng.choice(alphabet)
+                       for _ in range(length))
+        chunk_size = rng.randint(1, 500)
+        chunk_overlap = rng.randint(0, chunk_size - 1)
+        for unit_tokenizer in (None, tokenizer):
+            spans = list(iter_chunk_spans(text, chunk_size, chunk_overlap, unit_tokenizer))
+            problem = check_spans(text, spans, chunk_size, unit_tokenizer)
+            if problem:
+                unit = 'tokens' if unit_tokenizer else 'chars'
+                sys.exit(f"Case {case} failed ({unit}, length={length}, chunk_size={chunk_size}, "
+                         f"chunk_overlap={chunk_overlap}): {problem}")
+    print(f"{count} random cases passed: full coverage, no gaps, forward progress, size bound (chars and tokens)")
+
+def describe(name, texts, all_spans, elapsed, chunk_size, tokenizer, model_limit):
+    chunks = sum(len(spans) for spans in all_spans)
+    megabytes = sum(len(text) for text in texts) / 1e6
+    gaps = sum(max(0, next_start - end)
+               for spans in all_spans for (_, end), (next_start, _) in zip(spans, spans[1:]))
+    missing_tail = sum(len(text) - spans[-1][1] for text, spans in zip(texts, all_spans) if spans)
+    oversized = 0
+    truncated = 0
+    if tokenizer is not None:
+        for text, spans in zip(texts, all_spans):
+            for start, end in spans:
+                tokens = len(tokenizer(text[start:end])['offset_mapping'])
+                oversized += tokens > chunk_size
+                truncated += max(0, tokens - model_limit)
+    print(f"{name:>8} {elapsed * 1000 / megabytes:>9.1f} {chunks:>8} "
+          f"{sum(end - start for spans in all_spans for start, end in spans) / max(chunks, 1):>11.0f} "
+          f"{gaps + missing_tail:>10} {oversized:>10} {truncated:>14}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the chunker against the previous implementation '
+                                                 'and check its coverage properties')
+    parser.add_argument('--cache-dir', type=str, default=os.environ.get('INGEST_CACHE_DIR', '.ingest_cache'),
+                        help='Ingestion cache whose extracted texts are chunked')
+    parser.add_argument('--synthetic', type=int, default=0, help='Chunk synthetic documents of N characters instead')
+    parser.add_argument('--max-docs', type=int, default=20, help='Number of documents')
+    parser.add_argument('--chunk-size', type=int, default=1200, help='Chunk size in characters')
+    parser.add_argument('--chunk-overlap', type=int, default=200, help='Chunk overlap in characters')
+    parser.add_argument('--token-chunk-size', type=int, default=254, help='Chunk size in tokens')
+    parser.add_argument('--token-chunk-overlap', type=int, default=32, help='Chunk overlap in tokens')
+    parser.add_argument('--tokenizer', type=str, default='words',
+                        help="Tokenizer for token sizing: 'words' (no model needed) or a sentence-transformers "
+                             "model name such as all-MiniLM-L6-v2")
+    parser.add_argument('--model-limit', type=int, default=254,
+                        help='Tokens the embedding model reads per chunk; the rest is truncated')
+    parser.add_argument('--repeat', type=int, default=3, help='Timing repetitions (best is reported)')
+    parser.add_argument('--check', type=int, default=2000, help='Number of random property-check cases (0 skips)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    args = parser.parse_args()
+
+    if args.check:
+        run_checks(args.check, args.seed)
+
+    rng = random.Random(args.seed)
+    texts, origin = load_texts(args, rng)
+    tokenizer = load_tokenizer(args.tokenizer)
+    print(f"Corpus: {origin}, {sum(len(text) for text in texts) / 1e6:.1f} MB")
+
+    candidates = [
+        ('legacy', lambda text: legacy_chunk_text(text, args.chunk_size, args.chunk_overlap)),
+        ('chars', lambda text: list(iter_chunk_spans(text, args.chunk_size, args.chunk_overlap))),
+        ('tokens', lambda text: list(iter_chunk_spans(text, args.token_chunk_size, args.token_chunk_overlap,
+                                                      tokenizer))),
+    ]
+    print(f"{'chunker':>8} {'ms/MB':>9} {'chunks':>8} {'mean chars':>11} {'gap chars':>10} "
+          f"{'oversized':>10} {'truncated tok':>14}")
+    for name, chunker in candidates:
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            all_spans = [chunker(text) for text in texts]
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        limit = args.token_chunk_size if name == 'tokens' else args.model_limit
+        describe(name, texts, all_spans, best, limit, tokenizer, args.model_limit)
+
+    print(f"oversized: chunks over the size limit in tokens ({args.tokenizer}); truncated tok: tokens past "
+          f"the model's {args.model_limit}-token limit, which are never embedded")
+
+if __name__ == "__main__":
+    main()
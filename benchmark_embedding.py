@@ -0,0 +1,131 @@
+import os
+import sys
+import glob
+import json
+import time
+import random
+import argparse
+import subprocess
+import numpy as np
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.utils.chunking import chunk_text
+from app.utils.embedding import (EMBEDDING_BACKENDS, DEFAULT_EMBEDDING_MODEL, DEFAULT_ONNX_DIR,
+                                 load_embedding_model)
+
+def synthetic_chunks(rng, count):
+    words = ("RNA secondary structure folding energy Sfold ensemble probability hybridization siRNA target "
+             "accessibility mRNA sampling Boltzmann nucleotide microRNA binding site seed").split()
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(20, 180))) + "." for _ in range(count)]
+
+def load_chunks(args, rng):
+    """
+    Chunks of the cached PDF texts as create_pinecone_index.py would embed
+    them, or synthetic ones if there is no cache
+    """
+    files = sorted(glob.glob(os.path.join(args.cache_dir, 'text', '*.txt')))
+    chunks = []
+    if not args.synthetic:
+        for path in files:
+            with open(path, 'r', encoding='utf-8') as file:
+                chunks.extend(chunk for chunk in chunk_text(file.read(), 1200, 200) if chunk.strip())
+            if len(chunks) >= args.chunks:
+                return chunks[:args.chunks], f"{args.chunks} chunks of cached documents from {args.cache_dir}"
+        if chunks:
+            return chunks, f"{len(chunks)} chunks of cached documents from {args.cache_dir}"
+    return synthetic_chunks(rng, args.chunks), f"{args.chunks} synthetic chunks"
+
+def measure_load(args, backend):
+    """
+    Import the serving code and load a model in a fresh interpreter, as a
+    server start-up would, so imports and session creation are counted
+    """
+    command = [sys.executable, os.path.abspath(__file__), '--measure-load', backend, '--model', args.model,
+               '--onnx-dir', args.onnx_dir, '--threads', str(args.threads)]
+    start = time.perf_counter()
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    total = time.perf_counter() - start
+    return json.loads(output.strip().splitlines()[-1]), total
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark model load time, query latency, batch throughput '
+                                                 'and parity of the embedding backends on CPU')
+    parser.add_argument('--model', type=str, default=os.environ.get('EMBEDDING_MODEL', DEFAULT_EMBEDDING_MODEL),
+                        help='SentenceTransformer model name')
+    parser.add_argument('--backends', type=str, default=','.join(EMBEDDING_BACKENDS),
+                        help='Comma-separated embedding backends to compare')
+    parser.add_argument('--onnx-dir', type=str, default=os.environ.get('EMBEDDING_ONNX_DIR', DEFAULT_ONNX_DIR),
+                        help='Directory of ONNX exports')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('EMBEDDING_THREADS', '0')),
+                        help='Inference threads, 0 for the library default')
+    parser.add_argument('--cache-dir', type=str, default=os.environ.get('INGEST_CACHE_DIR', '.ingest_cache'),
+                        help='Ingestion cache whose extracted texts are chunked and embedded')
+    parser.add_argument('--synthetic', action='store_true', help='Embed synthetic chunks instead')
+    parser.add_argument('--chunks', type=int, default=512, help='Number of chunks embedded for throughput')
+    parser.add_argument('--batch-size', type=int, default=64, help='Chunks per forward pass')
+    parser.add_argument('--queries', type=int, default=200, help='Number of single-query encodes timed')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--measure-load', type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure_load:
+        # This process already imported the chunker and the embedding module; the
+        # serving path adds the vector store, retrieval and reranking modules
+        start = time.perf_counter()
+        import app.utils.vector
+        imported = time.perf_counter()
+        model = load_embedding_model(args.model, args.measure_load, threads=args.threads, onnx_dir=args.onnx_dir)
+        model.encode("warm up")
+        print(json.dumps({'import': imported - start, 'load': time.perf_counter() - imported,
+                          'torch': 'torch' in sys.modules}))
+        return
+
+    rng = random.Random(args.seed)
+    chunks, origin = load_chunks(args, rng)
+    queries = [chunk[:rng.randint(40, 120)] for chunk in rng.sample(chunks, min(args.queries, len(chunks)))]
+    backends = args.backends.split(',')
+    print(f"Model: {args.model}, {origin}, {len(queries)} queries, batch size {args.batch_size}, "
+          f"threads={args.threads or 'default'}")
+
+    # The reference for parity
+    reference = load_embedding_model(args.model, 'torch', threads=args.threads)
+    reference_embeddings = reference.encode(chunks, batch_size=args.batch_size)
+
+    print(f"{'backend':>10} {'import s':>8} {'load s':>7} {'start s':>8} {'torch':>6} {'p50 ms':>7} {'p95 ms':>7} "
+          f"{'chunks/s':>9} {'min cos':>8} {'mean cos':>9}")
+    for backend in backends:
+        model = reference if backend == 'torch' else load_embedding_model(args.model, backend, threads=args.threads,
+                                                                          onnx_dir=args.onnx_dir)
+        # Loading above wrote any missing ONNX export, so this is the load time of a later start-up
+        load, total = measure_load(args, backend)
+
+        model.encode(queries[0])
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            model.encode(query)
+            latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        embeddings = model.encode(chunks, batch_size=args.batch_size)
+        throughput = len(chunks) / (time.perf_counter() - start)
+
+        if backend == 'torch':
+            min_cosine = mean_cosine = 1.0
+        else:
+            similarities = np.sum(embeddings * reference_embeddings, axis=1) / np.maximum(
+                np.linalg.norm(embeddings, axis=1) * np.linalg.norm(reference_embeddings, axis=1), 1e-12)
+            min_cosine, mean_cosine = float(similarities.min()), float(similarities.mean())
+        print(f"{backend:>10} {load['import']:>8.2f} {load['load']:>7.2f} {total:>8.2f} "
+              f"{'yes' if load['torch'] else 'no':>6} {np.percentile(latencies, 50) * 1000:>7.2f} "
+              f"{np.percentile(latencies, 95) * 1000:>7.2f} {throughput:>9.1f} {min_cosine:>8.5f} "
+              f"{mean_cosine:>9.5f}")
+
+    print("In a fresh process: import s: importing the serving code (app.utils.vector); load s: loading the model "
+          "and one encode; start s: both plus interpreter start-up; torch: whether torch ended up imported. "
+          "cos: cosine similarity to the PyTorch embeddings of the same chunks")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+import requests
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+QUESTIONS = [
+    "What are microRNA sponges?",
+    "Explain the MicroRNA inhibition technique",
+    "What technique is used for rapid generation of microRNA sponges?",
+    "How does sFold predict RNA secondary structure?",
+    "What is the role of target accessibility in siRNA design?",
+    "How are Boltzmann-weighted structure samples used?",
+    "What is STarMir?",
+    "How does sFold identify microRNA binding sites?",
+]
+
+_session = threading.local()
+
+def get_session():
+    # One keep-alive connection per client thread
+    if not hasattr(_session, 'value'):
+        _session.value = requests.Session()
+    return _session.value
+
+def make_payload(endpoint, i, args):
+    question = QUESTIONS[i % min(args.distinct, len(QUESTIONS))] if args.distinct else random.choice(QUESTIONS)
+    if args.unique:
+        # A per-request suffix defeats the retrieval cache and coalescing
+        question = f"{question} ({i})"
+    if endpoint == '/api/rag/ask':
+        return {"question": question}
+    if endpoint == '/api/rag/context' and args.mode:
+        return {"query": question, "k": args.k, "mode": args.mode}
+    return {"query": question, "k": args.k}
+
+def send(url, endpoint, payload, timeout):
+    start = time.perf_counter()
+    try:
+        response = get_session().post(url + endpoint, json=payload, timeout=timeout)
+        ok = response.status_code == 200
+    except requests.RequestException:
+        ok = False
+    return time.perf_counter() - start, ok
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test a running API server with concurrent clients')
+    parser.add_argument('--url', type=str, default=f"http://localhost:{os.environ.get('FLASK_PORT', 5000)}",
+                        help='Base URL of the server')
+    parser.add_argument('--endpoint', type=str, default='/api/rag/context',
+                        choices=['/api/rag/context', '/api/rag/ask', '/api/vector/query'],
+                        help='Endpoint to exercise')
+    parser.add_argument('--requests', '-n', type=int, default=200, help='Total number of requests')
+    parser.add_argument('--concurrency', '-c', type=int, default=16, help='Number of concurrent clients')
+    parser.add_argument('--k', type=int, default=5, help='Number of chunks to retrieve per query')
+    parser.add_argument('--distinct', type=int, default=0,
+                        help='Cycle through this many distinct questions (0 picks at random)')
+    parser.add_argument('--unique', action='store_true', help='Make every question unique')
+    parser.add_argument('--mode', choices=['dense', 'hybrid'], default=None,
+                        help='Retrieval mode for /api/rag/context (server default if omitted)')
+    parser.add_argument('--timeout', type=float, default=60.0, help='Request timeout in seconds')
+    args = parser.parse_args()
+
+    try:
+        requests.get(args.url + '/health', timeout=args.timeout).raise_for_status()
+    except requests.RequestException as e:
+        sys.exit(f"Server at {args.url} is not reachable: {str(e)}")
+
+    print(f"Sending {args.requests} requests to {args.url}{args.endpoint} from {args.concurrency} concurrent clients")
+    payloads = [make_payload(args.endpoint, i, args) for i in range(args.requests)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(lambda payload: send(args.url, args.endpoint, payload, args.timeout), payloads))
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array([latency for latency, _ in results]) * 1000
+    failures = sum(1 for _, ok in results if not ok)
+    print(f"Completed in {elapsed:.2f}s: {args.requests / elapsed:.1f} requests/s, {failures} failed")
+    print(f"Latency ms: p50={np.percentile(latencies, 50):.1f} p90={np.percentile(latencies, 90):.1f} "
+          f"p99={np.percentile(latencies, 99):.1f} max={latencies.max():.1f}")
+
+if __name__ == "__main__":
+    main()
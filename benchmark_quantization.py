@@ -0,0 +1,127 @@
+import os
+import sys
+import glob
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.utils.backends import LocalBackend, read_local_vectors
+from app.utils.quantization import DEFAULT_RESCORE_FACTORS
+
+index_name = os.environ.get('PINECONE_INDEX_NAME', 'sfold')
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+def load_embeddings(args):
+    """
+    Load the corpus embeddings written by create_pinecone_index.py, either
+    from a local index (--backend local) or from the ingestion cache
+    """
+    if args.synthetic:
+        # Clustered Gaussian data, to look at scale beyond the current corpus
+        rng = np.random.default_rng(args.seed)
+        centers = rng.normal(size=(max(1, args.synthetic // 100), args.dimension))
+        labels = rng.integers(0, len(centers), args.synthetic)
+        return centers[labels] + 1.5 * rng.normal(size=(args.synthetic, args.dimension)), 'synthetic'
+
+    vectors = read_local_vectors(args.index_path)
+    if vectors is not None:
+        return np.asarray(vectors), args.index_path
+
+    files = sorted(glob.glob(os.path.join(args.cache_dir, 'embeddings', '*.npy')))
+    if files:
+        return np.concatenate([np.load(path) for path in files]), f"{len(files)} files in {args.cache_dir}"
+
+    sys.exit(f"No embeddings found in {args.index_path} or {args.cache_dir}; run "
+             f"'python create_pinecone_index.py --backend local' first, or pass --synthetic N")
+
+def directory_mb(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / (1024 * 1024)
+
+def build(path, corpus, quantization, batch_size=1000):
+    backend = LocalBackend(path, dimension=corpus.shape[1], autosave=False, quantization=quantization)
+    for start in range(0, len(corpus), batch_size):
+        backend.upsert([(f"v{row}", corpus[row], {}) for row in range(start, min(start + batch_size, len(corpus)))])
+    backend.save()
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark memory, latency and recall@k of int8 and binary '
+                                                 'quantization of the local index against float32')
+    parser.add_argument('--index-path', type=str, default=os.path.join('local_index', index_name),
+                        help='Local index written by create_pinecone_index.py --backend local')
+    parser.add_argument('--cache-dir', type=str, default=os.environ.get('INGEST_CACHE_DIR', '.ingest_cache'),
+                        help='Ingestion cache to read embeddings from if there is no local index')
+    parser.add_argument('--synthetic', type=int, default=0, help='Use N synthetic vectors instead')
+    parser.add_argument('--dimension', type=int, default=384, help='Dimension of synthetic vectors')
+    parser.add_argument('--queries', type=int, default=200, help='Number of held-out query vectors')
+    parser.add_argument('--k', type=int, default=5, help='Number of neighbours to retrieve')
+    parser.add_argument('--quantization', type=str, default='none,int8,binary',
+                        help='Comma-separated quantization types to compare')
+    parser.add_argument('--rescore-factor', type=int, default=0,
+                        help=f'Candidates rescored per result, 0 for the defaults {DEFAULT_RESCORE_FACTORS}')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    args = parser.parse_args()
+
+    vectors, origin = load_embeddings(args)
+    vectors = normalize(vectors)
+    rng = np.random.default_rng(args.seed)
+
+    # Held-out corpus vectors serve as queries, so they are not their own nearest neighbour
+    order = rng.permutation(len(vectors))
+    query_count = min(args.queries, len(vectors) // 10)
+    queries = vectors[order[:query_count]]
+    corpus = np.ascontiguousarray(vectors[order[query_count:]])
+    print(f"Corpus: {len(corpus)} vectors of dimension {corpus.shape[1]} from {origin}, {query_count} queries, k={args.k}")
+
+    truth = []
+    for query in queries:
+        scores = corpus @ query
+        truth.append(set(np.argpartition(-scores, args.k - 1)[:args.k].tolist()))
+
+    workdir = tempfile.mkdtemp(prefix='benchmark_quantization_')
+    try:
+        print(f"{'codes':>7} {'B/vector':>9} {'hot MB':>8} {'rescore KB':>11} {'disk MB':>8} {'recall@k':>9} "
+              f"{'ms/query':>9} {'p99 ms':>8}")
+        for quantization in args.quantization.split(','):
+            path = os.path.join(workdir, quantization)
+            build(path, corpus, quantization)
+
+            # Reopen as a server would: matrix and codes memory-mapped, nothing read yet
+            backend = LocalBackend(path, quantization=quantization, rescore_factor=args.rescore_factor or None)
+            latencies = []
+            recall = 0.0
+            for query, expected in zip(queries, truth):
+                start = time.perf_counter()
+                matches = backend.query(query, args.k, include_metadata=False)['matches']
+                latencies.append(time.perf_counter() - start)
+                found = {int(match['id'][1:]) for match in matches}
+                recall += len(expected & found) / len(expected)
+
+            # What has to stay in memory for fast queries: the matrix that is
+            # scanned in full, and for quantized indexes the rows rescored per query
+            if backend.quantization:
+                bytes_per_vector = backend._codes.itemsize * backend._codes.shape[1]
+                rescored = min(len(corpus), args.k * backend.rescore_factor)
+            else:
+                bytes_per_vector = corpus.shape[1] * 4
+                rescored = 0
+            print(f"{quantization:>7} {bytes_per_vector:>9} {bytes_per_vector * len(corpus) / 2 ** 20:>8.1f} "
+                  f"{rescored * corpus.shape[1] * 4 / 1024:>11.1f} {directory_mb(path):>8.1f} "
+                  f"{recall / query_count:>9.3f} {np.mean(latencies) * 1000:>9.3f} "
+                  f"{np.percentile(latencies, 99) * 1000:>8.3f}")
+            del backend
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print("hot MB is scanned by every query and should stay resident; rescore KB is read from the "
+          "memory-mapped float32 vectors per query")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.utils.upsert import BatchUpserter
+
+class ThrottledError(Exception):
+    """
+    Error raised by FakeIndex, shaped like a client exception with a status code
+    """
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class FakeIndex:
+    """
+    Local stand-in for a Pinecone index that simulates request latency and
+    rejects a share of requests with 429 or 503, or when too many requests
+    are in flight at once.
+    """
+    def __init__(self, latency=0.05, error_rate=0.05, max_concurrent=4):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.max_concurrent = max_concurrent
+        self.vectors = {}
+        self.requests = 0
+        self.rejected = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors):
+        with self._lock:
+            self.requests += 1
+            self._in_flight += 1
+            overloaded = self._in_flight > self.max_concurrent
+        try:
+            time.sleep(self.latency)
+            if overloaded or random.random() < self.error_rate:
+                with self._lock:
+                    self.rejected += 1
+                status = 429 if overloaded else random.choice([429, 503])
+                raise ThrottledError(status, f"({status}) simulated failure")
+            with self._lock:
+                for vector_id, values, metadata in vectors:
+                    self.vectors[vector_id] = (values, metadata)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+def make_vectors(count, dimension):
+    return [(f"doc_{i}", [random.random() for _ in range(dimension)], {"chunk_index": i}) for i in range(count)]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark batched upserts against a local fake index')
+    parser.add_argument('--chunks', type=int, default=150, help='Number of vectors to upload')
+    parser.add_argument('--dimension', type=int, default=384, help='Vector dimension')
+    parser.add_argument('--latency', type=float, default=0.05, help='Simulated latency per request in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.05, help='Share of requests failing with 429/503')
+    parser.add_argument('--batch-size', type=int, default=50, help='Vectors per upsert request')
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent writers')
+    parser.add_argument('--legacy-delay', type=float, default=2.0, help='Fixed sleep per chunk in the old upload_pdf')
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.chunks, args.dimension)
+
+    # The old path sent one vector per request followed by a fixed sleep
+    legacy_estimate = args.chunks * (args.latency + args.legacy_delay)
+    print(f"Legacy one-vector-per-request estimate: {legacy_estimate:.1f}s")
+
+    index = FakeIndex(latency=args.latency, error_rate=args.error_rate, max_concurrent=args.workers)
+    upserter = BatchUpserter(index, batch_size=args.batch_size, max_workers=args.workers, backoff_base=0.05)
+
+    start = time.perf_counter()
+    results = upserter.upsert(vectors)
+    elapsed = time.perf_counter() - start
+
+    succeeded = sum(1 for result in results if 'success' in result)
+    print(f"Batched upsert: {elapsed:.2f}s for {args.chunks} vectors ({args.chunks / elapsed:.1f} vectors/sec)")
+    print(f"  requests sent: {index.requests}, rejected: {index.rejected}")
+    print(f"  vectors stored: {len(index.vectors)}, reported succeeded: {succeeded}")
+    print(f"  final request gap: {upserter.rate_limiter.delay:.3f}s")
+    return 0 if succeeded == args.chunks else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+import argparse
+import statistics
+from dotenv import load_dotenv
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_QUERIES = [
+    "What are microRNA sponges?",
+    "How does Sfold predict RNA secondary structure?",
+    "What is the STarMir model for microRNA binding sites?",
+    "Explain accessibility of target sites for siRNA design",
+]
+
+def summarize(label, latencies):
+    """
+    Print latency statistics for a benchmark run
+
+    Args:
+        label: Name of the run
+        latencies: List of per-request latencies in seconds
+    """
+    latencies_ms = sorted(latency * 1000 for latency in latencies)
+    p95_index = max(0, int(round(0.95 * len(latencies_ms))) - 1)
+    print(f"{label}:")
+    print(f"  requests: {len(latencies_ms)}")
+    print(f"  mean:     {statistics.mean(latencies_ms):.1f} ms")
+    print(f"  median:   {statistics.median(latencies_ms):.1f} ms")
+    print(f"  p95:      {latencies_ms[p95_index]:.1f} ms")
+
+def bench_per_request_instance(queries, k):
+    """
+    Old behaviour: build a new PineconeVectorDB for every request
+    """
+    from app.utils.vector import PineconeVectorDB
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        PineconeVectorDB().query(query, k)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def bench_shared_instance(queries, k):
+    """
+    New behaviour: every request goes through the shared instance
+    """
+    from app.controllers.vector_controller import warm_up_vector_db, get_vector_db
+
+    start = time.perf_counter()
+    warm_up_vector_db()
+    print(f"Warm-up took {(time.perf_counter() - start) * 1000:.1f} ms (paid once at start-up)")
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        get_vector_db().query(query, k)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description='Benchmark per-request latency of vector store queries')
+    parser.add_argument('--requests', '-n', type=int, default=8, help='Number of requests per run')
+    parser.add_argument('--k', type=int, default=5, help='Number of chunks to retrieve per query')
+    args = parser.parse_args()
+
+    queries = [DEFAULT_QUERIES[i % len(DEFAULT_QUERIES)] for i in range(args.requests)]
+
+    summarize("Before (new PineconeVectorDB per request)", bench_per_request_instance(queries, args.k))
+    summarize("After (shared PineconeVectorDB)", bench_shared_instance(queries, args.k))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
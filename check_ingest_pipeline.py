@@ -0,0 +1,220 @@
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+import numpy as np
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.utils.ingest_pipeline import build_ingest_pipeline, run_ingest
+
+class FakeStore:
+    """
+    Local stand-in for the embedding model and the index: embeds texts as
+    random vectors, records every upsert in call order and can be made slow
+    or made to fail for chosen documents.
+    """
+    def __init__(self, dimension=8, upsert_latency=0.0, failing_sources=(), crashing_sources=()):
+        self.dimension = dimension
+        self.upsert_latency = upsert_latency
+        self.failing_sources = set(failing_sources)
+        self.crashing_sources = set(crashing_sources)
+        self.upserts = []
+        self._lock = threading.Lock()
+
+    def embed(self, texts):
+        if any(text.split(':')[0] in self.crashing_sources for text in texts):
+            raise RuntimeError("simulated embedding failure")
+        return np.random.rand(len(texts), self.dimension)
+
+    def upsert(self, vectors):
+        time.sleep(self.upsert_latency)
+        source = vectors[0][2]["source"]
+        if source in self.failing_sources:
+            return f"simulated upsert failure for {source}"
+        with self._lock:
+            self.upserts.append([(metadata["source"], metadata["chunk_index"]) for _, _, metadata in vectors])
+        return None
+
+def make_documents(count, max_chunks, rng):
+    """
+    (pdf_path, text, content_hash) tuples whose text is one line per chunk,
+    each chunk prefixed by its document so the fakes can tell them apart
+    """
+    documents = []
+    for i in range(count):
+        source = f"doc_{i:04d}.pdf"
+        chunks = [f"{source}:{j}" for j in range(rng.randint(1, max_chunks))]
+        documents.append((source, "\n".join(chunks), f"hash_{i}"))
+    return documents
+
+def split_lines(text):
+    return text.split("\n")
+
+class Tracked:
+    """
+    Source that counts how many documents the pipeline pulled from it
+    """
+    def __init__(self, documents, fail_after=None):
+        self.documents = documents
+        self.fail_after = fail_after
+        self.pulled = 0
+
+    def __iter__(self):
+        for document in self.documents:
+            if self.fail_after is not None and self.pulled == self.fail_after:
+                raise RuntimeError("simulated extraction failure")
+            self.pulled += 1
+            yield document
+
+def check_ordering(args, rng):
+    """
+    With one worker per stage, documents come out in input order, each
+    exactly once and only after all of its batches were upserted; with
+    several workers, each is still complete and yielded exactly once
+    """
+    failures = []
+    documents = make_documents(args.documents, args.max_chunks, rng)
+    expected = {source: len(split_lines(text)) for source, text, _ in documents}
+
+    for workers in (1, args.workers):
+        store = FakeStore()
+        pipeline = build_ingest_pipeline(split_lines, store.embed, store.upsert, batch_size=args.batch_size,
+                                         chunk_workers=workers, embed_workers=workers, upsert_workers=workers,
+                                         queue_size=args.queue_size)
+        order = []
+        for document in run_ingest(pipeline, documents):
+            with store._lock:
+                upserted = sum(1 for batch in store.upserts for source, _ in batch if source == document.source)
+            if upserted != expected[document.source] or document.uploaded != expected[document.source]:
+                failures.append(f"{workers} workers: {document.source} yielded with {upserted}/"
+                                f"{expected[document.source]} chunks upserted")
+            order.append(document.source)
+
+        if sorted(order) != sorted(expected) or len(order) != len(set(order)):
+            failures.append(f"{workers} workers: documents yielded {len(order)} times for {len(expected)} inputs")
+        if workers == 1:
+            if order != [source for source, _, _ in documents]:
+                failures.append("1 worker: documents were not yielded in input order")
+            flattened = [entry for batch in store.upserts for entry in batch]
+            if flattened != [(source, j) for source, _, _ in documents for j in range(expected[source])]:
+                failures.append("1 worker: chunks were not upserted in document order")
+    return failures
+
+def check_backpressure(args, rng):
+    """
+    A slow upsert stage holds the source back: the documents pulled but not
+    yet upserted never exceed what the queues and workers can hold
+    """
+    failures = []
+    # One batch per document, so every slot between the stages holds one document
+    documents = make_documents(args.documents, 1, rng)
+    store = FakeStore(upsert_latency=args.latency)
+    source = Tracked(documents)
+    pipeline = build_ingest_pipeline(split_lines, store.embed, store.upsert, batch_size=args.batch_size,
+                                     queue_size=args.queue_size, document_queue_size=2)
+
+    # The feeder holds one document, then the document queue, the chunk worker,
+    # the embed queue and worker, the upsert queue and worker
+    bound = 1 + 2 + 1 + args.queue_size + 1 + args.queue_size + 1
+    lead = 0
+    sampling = threading.Event()
+
+    def sample():
+        nonlocal lead
+        while not sampling.is_set():
+            # Read the source first, so an upsert finishing in between cannot inflate the lead
+            pulled = source.pulled
+            with store._lock:
+                upserted = len(store.upserts)
+            lead = max(lead, pulled - upserted)
+            time.sleep(args.latency / 4)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    count = sum(1 for _ in run_ingest(pipeline, source))
+    sampling.set()
+    sampler.join()
+
+    print(f"  backpressure: at most {lead} documents ahead of the upserts (bound {bound}, "
+          f"{len(documents)} documents)")
+    if count != len(documents):
+        failures.append(f"backpressure: {count}/{len(documents)} documents completed")
+    if lead > bound:
+        failures.append(f"backpressure: source ran {lead} documents ahead of the upserts, bound is {bound}")
+    return failures
+
+def check_failures(args, rng):
+    """
+    Failed batches are recorded on their document while the rest go through;
+    an exception in the source or a stage function stops the pipeline and
+    is re-raised by run_ingest()
+    """
+    failures = []
+    documents = make_documents(args.documents, args.max_chunks, rng)
+    failing, crashing = documents[1][0], documents[2][0]
+    store = FakeStore(failing_sources=[failing], crashing_sources=[crashing])
+    pipeline = build_ingest_pipeline(split_lines, store.embed, store.upsert, batch_size=args.batch_size,
+                                     embed_workers=args.workers, upsert_workers=args.workers)
+    results = {document.source: document for document in run_ingest(pipeline, documents)}
+
+    if len(results) != len(documents):
+        failures.append(f"per-batch failures: {len(results)}/{len(documents)} documents completed")
+    for source in (failing, crashing):
+        document = results.get(source)
+        if document is None or document.uploaded or document.failed != len(document.positions) or not document.errors:
+            failures.append(f"per-batch failures: failed batches of {source} were not recorded")
+    healthy = [document for source, document in results.items() if source not in (failing, crashing)]
+    if any(document.failed or document.uploaded != len(document.positions) for document in healthy):
+        failures.append("per-batch failures: a failure leaked into other documents")
+
+    def crash(text):
+        if text.startswith(documents[3][0]):
+            raise ValueError("simulated chunking crash")
+        return split_lines(text)
+
+    for name, chunk_fn, source in (("stage", crash, Tracked(documents)),
+                                   ("source", split_lines, Tracked(documents, fail_after=3))):
+        threads = threading.active_count()
+        pipeline = build_ingest_pipeline(chunk_fn, FakeStore().embed, FakeStore().upsert,
+                                         batch_size=args.batch_size)
+        try:
+            for _ in run_ingest(pipeline, source):
+                pass
+            failures.append(f"{name} exception: run_ingest() finished without raising")
+        except (ValueError, RuntimeError) as e:
+            print(f"  {name} exception re-raised: {type(e).__name__}: {e}")
+        if source.pulled == len(documents) and name == "stage":
+            failures.append(f"{name} exception: the source was drained after the failure")
+        if threading.active_count() > threads:
+            failures.append(f"{name} exception: pipeline threads still running")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description='Check ordering, backpressure and failure propagation of the '
+                                                 'ingestion pipeline with local fakes')
+    parser.add_argument('--documents', type=int, default=200, help='Number of fake documents')
+    parser.add_argument('--max-chunks', type=int, default=12, help='Maximum chunks per document')
+    parser.add_argument('--batch-size', type=int, default=4, help='Chunks per batch')
+    parser.add_argument('--workers', type=int, default=3, help='Workers per stage for the concurrent runs')
+    parser.add_argument('--queue-size', type=int, default=4, help='Batches buffered between stages')
+    parser.add_argument('--latency', type=float, default=0.005, help='Upsert latency for the backpressure check')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    failed = False
+    for name, check in (("ordering", check_ordering), ("backpressure", check_backpressure),
+                        ("failure propagation", check_failures)):
+        failures = check(args, rng)
+        print(f"{name}: {'FAIL' if failures else 'ok'}")
+        for failure in failures:
+            print(f"  {failure}")
+        failed = failed or bool(failures)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,21 +5,28 @@ import logging
 import argparse
 import numpy as np
 from dotenv import load_dotenv
-from pinecone import Pinecone, ServerlessSpec
-from sentence_transformers import SentenceTransformer
-import PyPDF2
 import traceback
 from tqdm import tqdm
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('pinecone_upload.log')
-    ]
-)
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.utils.embedding import (encode_batched, load_embedding_model, embedding_model_key, DEFAULT_EMBEDDING_MODEL,
+                                 DEFAULT_EMBED_BATCH_SIZE, DEFAULT_ONNX_DIR, EMBEDDING_BACKENDS)
+from app.utils.upsert import BatchUpserter, DEFAULT_UPSERT_WORKERS
+from app.utils.backends import (LocalBackend, PineconeBackend, create_serverless_index, check_index_schema,
+                                DEFAULT_INDEX_METRIC, DEFAULT_INDEX_READY_TIMEOUT)
+from app.utils.errors import IndexSchemaError
+from app.utils.bm25 import BM25Index
+from app.utils.pdf_extract import PDFExtractor
+from app.utils.chunking import chunk_text, model_tokenizer, CHUNK_UNITS
+from app.utils.ingest_cache import IngestCache, embedding_cache_key, file_sha256, iter_documents_cached
+from app.utils.checkpoint import IngestCheckpoint
+from app.utils.ingest_pipeline import build_ingest_pipeline, run_ingest, unique_positions, DEFAULT_EMBED_WORKERS
+from app.utils.pipeline import DEFAULT_QUEUE_SIZE
+from app.utils.index_version import bump_index_version
+from app.utils.sync import IndexManifest, make_chunk_id, params_key, diff_document, delete_ids
+
 logger = logging.getLogger('pinecone_upload')
 
 # Load environment variables
@@ -30,6 +37,22 @@ api_key = os.environ.get('PINECONE_API_KEY')
 environment = os.environ.get('PINECONE_ENVIRONMENT', 'gcp-starter')
 index_name = os.environ.get('PINECONE_INDEX_NAME', 'sfold')
 pdf_directory = os.environ.get('PDF_DIRECTORY', 'sFold-Data')
+vector_backend = os.environ.get('VECTOR_BACKEND', 'pinecone').lower()
+local_index_path = os.environ.get('LOCAL_INDEX_PATH', os.path.join('local_index', index_name))
+local_index_ann = os.environ.get('LOCAL_INDEX_ANN', 'none').lower()
+local_index_nlist = int(os.environ.get('LOCAL_INDEX_NLIST', '0'))
+local_index_nprobe = int(os.environ.get('LOCAL_INDEX_NPROBE', '8'))
+local_index_quantization = os.environ.get('LOCAL_INDEX_QUANTIZATION', 'none').lower()
+lexical_index_path = os.environ.get('LEXICAL_INDEX_PATH', os.path.join('lexical_index', index_name))
+cache_directory = os.environ.get('INGEST_CACHE_DIR', '.ingest_cache')
+cache_max_mb = int(os.environ.get('INGEST_CACHE_MAX_MB', 1024))
+manifest_path = os.environ.get('INDEX_MANIFEST_PATH', f'index_manifest_{index_name}.json')
+checkpoint_path = os.environ.get('INGEST_CHECKPOINT_PATH', f'.ingest_checkpoint_{index_name}.jsonl')
+embedding_model_name = os.environ.get('EMBEDDING_MODEL', DEFAULT_EMBEDDING_MODEL)
+embedding_backend = os.environ.get('EMBEDDING_BACKEND', 'torch').lower()
+embedding_threads = int(os.environ.get('EMBEDDING_THREADS', '0'))
+onnx_directory = os.environ.get('EMBEDDING_ONNX_DIR', DEFAULT_ONNX_DIR)
+index_version_path = os.environ.get('INDEX_VERSION_PATH', f'.index_version_{index_name}')
 
 # Default constants for text processing (can be overridden by command line args)
 DEFAULT_CHUNK_SIZE = 1200  # Increased from 600 to reduce number of chunks
@@ -38,180 +61,116 @@ DEFAULT_BATCH_SIZE = 100  # Number of vectors to upload in a single batch
 DEFAULT_UPLOAD_DELAY = 0.5  # Reduced delay between uploads
 DEFAULT_MAX_PDFS = None  # Process all PDFs by default
 
-def extract_text_from_pdf(pdf_path):
+def update_lexical_index(lexical_index, chunks, pdf_file):
     """
-    Extract text from a PDF file
+    Replace the chunks of a PDF in the BM25 index
     
     Args:
-        pdf_path: Path to the PDF file
-        
-    Returns:
-        Extracted text from the PDF
+        lexical_index: BM25Index, or None if disabled
+        chunks: All chunks of the PDF
+        pdf_file: Source PDF file name
     """
-    try:
-        logger.info(f"Extracting text from {pdf_path}")
-        with open(pdf_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            text = ""
-            total_pages = len(reader.pages)
-            logger.info(f"PDF has {total_pages} pages")
-            
-            for page_num in range(total_pages):
-                try:
-                    page = reader.pages[page_num]
-                    page_text = page.extract_text()
-                    text += page_text + "\n\n"
-                except Exception as e:
-                    logger.warning(f"Error extracting text from page {page_num+1}: {str(e)}")
-            
-            logger.info(f"Extracted {len(text)} characters from {pdf_path}")
-            return text
-    except Exception as e:
-        logger.error(f"Error extracting text from {pdf_path}: {str(e)}")
-        logger.error(traceback.format_exc())
-        return ""
+    if lexical_index is None:
+        return
+    lexical_index.replace_source(pdf_file, [(make_chunk_id(pdf_file, chunk), chunk, pdf_file, position)
+                                            for position, chunk in enumerate(chunks) if chunk.strip()])
 
-def chunk_text(text, chunk_size, overlap):
+def mark_index_changed(index, lexical_index=None):
     """
-    Split text into overlapping chunks
+    Persist buffered writes of a local index and the BM25 index, and bump
+    the index version so running servers drop cached retrieval results
     
     Args:
-        text: The text to chunk
-        chunk_size: The size of each chunk
-        overlap: The overlap between chunks
-        
-    Returns:
-        List of text chunks
+        index: Pinecone index or LocalBackend
+        lexical_index: BM25Index, or None if disabled
     """
-    if not text:
-        return []
-        
-    chunks = []
-    start = 0
-    text_length = len(text)
-    
-    logger.info(f"Chunking text of length {text_length} with chunk_size={chunk_size}, overlap={overlap}")
-    
-    while start < text_length:
-        end = min(start + chunk_size, text_length)
-        
-        # Try to end at a sentence or paragraph boundary if possible
-        if end < text_length:
-            # Check for paragraph boundary
-            paragraph_end = text.find('\n\n', end - 100, end + 100)
-            if paragraph_end != -1 and paragraph_end < end + 100:
-                end = paragraph_end + 2
-            else:
-                # Check for sentence boundary
-                sentence_end = max(
-                    text.find('. ', end - 50, end + 50),
-                    text.find('? ', end - 50, end + 50),
-                    text.find('! ', end - 50, end + 50)
-                )
-                if sentence_end != -1 and sentence_end < end + 50:
-                    end = sentence_end + 2
-        
-        chunk = text[start:end]
-        chunks.append(chunk)
-        start += chunk_size - overlap
-    
-    logger.info(f"Created {len(chunks)} chunks")
-    return chunks
-
-def batch_upload_chunks(index, chunks, pdf_file, model, batch_size, upload_delay):
-    """
-    Upload chunks to Pinecone in batches
-    
-    Args:
-        index: Pinecone index
-        chunks: List of text chunks
-        pdf_file: Source PDF file name
-        model: SentenceTransformer model
-        batch_size: Number of vectors to upload in a single batch
-        upload_delay: Delay between batch uploads in seconds
-        
-    Returns:
-        Number of successfully uploaded chunks
-    """
-    total_chunks = len(chunks)
-    success_count = 0
-    batch_count = 0
-    
-    # Process chunks in batches
-    for i in range(0, total_chunks, batch_size):
-        batch = chunks[i:i+batch_size]
-        batch_count += 1
-        
-        # Prepare vectors for batch upload
-        vectors = []
-        
-        # Create embeddings for the batch
-        logger.info(f"Creating embeddings for batch {batch_count} ({len(batch)} chunks)")
-        
-        # Process each chunk in the batch
-        for j, chunk in enumerate(batch):
-            chunk_index = i + j
-            try:
-                # Create a unique ID for this chunk
-                chunk_id = f"{pdf_file.replace('.pdf', '').replace(' ', '_')}_{chunk_index}"
-                
-                # Create embedding
-                embedding = model.encode(chunk).tolist()
-                
-                # Prepare metadata
-                metadata = {
-                    "source": pdf_file,
-                    "chunk_index": chunk_index,
-                    "total_chunks": total_chunks,
-                    "text": chunk  # Store full text in metadata
-                }
-                
-                # Add to vectors list for batch upload
-                vectors.append((chunk_id, embedding, metadata))
-                success_count += 1
-                
-            except Exception as e:
-                logger.error(f"Error processing chunk {chunk_index+1}/{total_chunks} from {pdf_file}: {str(e)}")
-        
-        # Upload batch to Pinecone
-        try:
-            if vectors:
-                logger.info(f"Uploading batch {batch_count} with {len(vectors)} vectors")
-                index.upsert(vectors=vectors)
-                logger.info(f"Successfully uploaded batch {batch_count}")
-                
-                # Add delay between batch uploads
-                if upload_delay > 0:
-                    time.sleep(upload_delay)
-        except Exception as e:
-            logger.error(f"Error uploading batch {batch_count}: {str(e)}")
-            logger.error(traceback.format_exc())
-    
-    logger.info(f"Completed processing {pdf_file}: {success_count}/{total_chunks} chunks uploaded successfully")
-    return success_count
+    if isinstance(index, LocalBackend):
+        index.flush()
+    if lexical_index is not None:
+        lexical_index.flush()
+    bump_index_version(index_version_path)
 
 def parse_arguments():
     """Parse command line arguments"""
     parser = argparse.ArgumentParser(description='Create Pinecone index and upload PDF documents')
     parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
-                        help=f'Size of text chunks in characters (default: {DEFAULT_CHUNK_SIZE})')
+                        help=f'Size of text chunks in --chunk-unit (default: {DEFAULT_CHUNK_SIZE})')
     parser.add_argument('--chunk-overlap', type=int, default=DEFAULT_CHUNK_OVERLAP,
-                        help=f'Overlap between chunks in characters (default: {DEFAULT_CHUNK_OVERLAP})')
+                        help=f'Overlap between chunks in --chunk-unit (default: {DEFAULT_CHUNK_OVERLAP})')
+    parser.add_argument('--chunk-unit', choices=CHUNK_UNITS, default='chars',
+                        help='Measure chunks in characters or in embedding model tokens, which keeps every chunk '
+                             'within the model\'s 256-token limit (e.g. --chunk-size 254 --chunk-overlap 32)')
     parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
                         help=f'Number of vectors to upload in a single batch (default: {DEFAULT_BATCH_SIZE})')
+    parser.add_argument('--embed-batch-size', type=int, default=DEFAULT_EMBED_BATCH_SIZE,
+                        help=f'Number of chunks embedded per forward pass (default: {DEFAULT_EMBED_BATCH_SIZE})')
     parser.add_argument('--upload-delay', type=float, default=DEFAULT_UPLOAD_DELAY,
-                        help=f'Delay between batch uploads in seconds (default: {DEFAULT_UPLOAD_DELAY})')
+                        help=f'Minimum delay between batch uploads in seconds (default: {DEFAULT_UPLOAD_DELAY})')
+    parser.add_argument('--upsert-workers', type=int, default=DEFAULT_UPSERT_WORKERS,
+                        help=f'Number of concurrent upsert requests (default: {DEFAULT_UPSERT_WORKERS})')
+    parser.add_argument('--embed-workers', type=int, default=DEFAULT_EMBED_WORKERS,
+                        help=f'Number of threads running the embedding model (default: {DEFAULT_EMBED_WORKERS})')
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help=f'Batches buffered between pipeline stages; bounds memory use (default: {DEFAULT_QUEUE_SIZE})')
+    parser.add_argument('--embedding-backend', choices=EMBEDDING_BACKENDS, default=embedding_backend,
+                        help='Run the embedding model with PyTorch, or with ONNX Runtime on CPU in float32 or '
+                             'dynamic int8 (default: %(default)s)')
+    parser.add_argument('--embedding-threads', type=int, default=embedding_threads,
+                        help='Threads used by the embedding model, 0 for the library default (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of processes for PDF text extraction (default: CPU count)')
+    parser.add_argument('--cache-dir', type=str, default=cache_directory,
+                        help=f'Directory of the extraction/embedding cache (default: {cache_directory})')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Re-extract and re-embed every PDF without using the cache')
+    parser.add_argument('--sync', action='store_true',
+                        help='Only upsert new/changed chunks and delete stale ones, based on the local index manifest')
+    parser.add_argument('--manifest', type=str, default=manifest_path,
+                        help=f'Path to the local index manifest used by --sync (default: {manifest_path})')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue an interrupted run: skip PDFs and batches it completed, retry the rest')
+    parser.add_argument('--checkpoint', type=str, default=checkpoint_path,
+                        help=f'Path to the progress checkpoint used by --resume (default: {checkpoint_path})')
     parser.add_argument('--max-pdfs', type=int, default=DEFAULT_MAX_PDFS,
                         help='Maximum number of PDFs to process (default: all)')
-    parser.add_argument('--wait-time', type=int, default=30,
-                        help='Wait time in seconds after creating index (default: 30)')
+    parser.add_argument('--wait-time', type=int, default=DEFAULT_INDEX_READY_TIMEOUT,
+                        help=f'Longest wait in seconds for a new index to become ready (default: {DEFAULT_INDEX_READY_TIMEOUT})')
+    parser.add_argument('--rebuild-index', action='store_true',
+                        help='Delete and recreate the index if its dimension or metric does not match the embedding model')
     parser.add_argument('--directory', type=str, default=pdf_directory,
                         help=f'Directory containing PDF files (default: {pdf_directory})')
+    parser.add_argument('--backend', choices=['pinecone', 'local'], default=vector_backend,
+                        help=f'Vector index backend to write to (default: {vector_backend})')
+    parser.add_argument('--local-index-path', type=str, default=local_index_path,
+                        help=f'Directory of the local index for --backend local (default: {local_index_path})')
+    parser.add_argument('--ann', choices=['none', 'ivf'], default=local_index_ann,
+                        help=f'Approximate search index maintained with the local backend (default: {local_index_ann})')
+    parser.add_argument('--nlist', type=int, default=local_index_nlist,
+                        help='Number of IVF lists, 0 for about sqrt(number of vectors) (default: %(default)s)')
+    parser.add_argument('--nprobe', type=int, default=local_index_nprobe,
+                        help='Number of IVF lists scanned per query (default: %(default)s)')
+    parser.add_argument('--quantization', choices=['none', 'int8', 'binary'], default=local_index_quantization,
+                        help='Compact codes written next to the local index for rescored search '
+                             '(default: %(default)s)')
+    parser.add_argument('--lexical-index-path', type=str, default=lexical_index_path,
+                        help='Directory of the BM25 index built next to the vectors for hybrid retrieval '
+                             '(empty string to skip it)')
     parser.add_argument('--verbose', '-v', action='store_true',
                         help='Enable verbose logging')
     return parser.parse_args()
 
 def main():
+    # Configured here rather than at import time: spawned PDF extraction
+    # workers re-import this script, and should not open the log file
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(),
+            logging.FileHandler('pinecone_upload.log')
+        ]
+    )
+    
     # Parse command line arguments
     args = parse_arguments()
     
@@ -223,46 +182,96 @@ def main():
     logger.info(f"Configuration:")
     logger.info(f"  Chunk size: {args.chunk_size}")
     logger.info(f"  Chunk overlap: {args.chunk_overlap}")
+    logger.info(f"  Chunk unit: {args.chunk_unit}")
     logger.info(f"  Batch size: {args.batch_size}")
+    logger.info(f"  Embedding batch size: {args.embed_batch_size}")
     logger.info(f"  Upload delay: {args.upload_delay}")
+    logger.info(f"  Upsert workers: {args.upsert_workers}")
+    logger.info(f"  Extraction workers: {args.workers if args.workers else 'auto'}")
+    logger.info(f"  Embedding model: {embedding_model_name} ({args.embedding_backend}, "
+                f"{args.embedding_threads or 'default'} threads)")
+    logger.info(f"  Embedding workers: {args.embed_workers}")
+    logger.info(f"  Queue size: {args.queue_size}")
+    logger.info(f"  Cache: {'disabled' if args.no_cache else args.cache_dir}")
+    logger.info(f"  Sync mode: {'on (' + args.manifest + ')' if args.sync else 'off'}")
+    logger.info(f"  Resume: {'on (' + args.checkpoint + ')' if args.resume else 'off'}")
     logger.info(f"  Max PDFs: {args.max_pdfs if args.max_pdfs else 'all'}")
     logger.info(f"  PDF directory: {args.directory}")
+    logger.info(f"  Backend: {args.backend}")
+    if args.backend == 'local':
+        logger.info(f"  Quantization: {args.quantization}")
+    logger.info(f"  BM25 index: {args.lexical_index_path or 'disabled'}")
     
+    checkpoint = None
     try:
-        # Initialize Pinecone
-        pc = Pinecone(api_key=api_key)
-        logger.info("Pinecone initialized successfully")
-        
-        # Check if index exists
-        indexes = pc.list_indexes()
+        # Initialize the embedding model first: its output size is the index dimension
+        model = load_embedding_model(embedding_model_name, backend=args.embedding_backend,
+                                     threads=args.embedding_threads, onnx_dir=onnx_directory)
+        model_key = embedding_model_key(embedding_model_name, args.embedding_backend)
+        dimension = model.get_sentence_embedding_dimension()
+        logger.info(f"Embedding model initialized ({dimension} dimensions)")
+        tokenizer = model_tokenizer(model, args.chunk_size) if args.chunk_unit == 'tokens' else None
         
-        # Create index if it doesn't exist
-        if index_name not in indexes.names():
-            logger.info(f"Creating index '{index_name}'")
-            pc.create_index(
-                name=index_name,
-                dimension=384,  # Dimension for all-MiniLM-L6-v2 is 384
-                metric='cosine',
-                spec=ServerlessSpec(cloud='aws', region='us-east-1')
-            )
-            logger.info(f"Index '{index_name}' created successfully")
-            # Wait for index to be ready
-            logger.info(f"Waiting {args.wait_time} seconds for index to be ready...")
-            time.sleep(args.wait_time)
+        if args.backend == 'local':
+            # In-process index, no Pinecone account needed
+            index = LocalBackend(args.local_index_path, dimension=dimension, autosave=False,
+                                 ann=args.ann, nlist=args.nlist or None, nprobe=args.nprobe,
+                                 quantization=args.quantization)
+            logger.info(f"Opened local index at '{args.local_index_path}'")
         else:
-            logger.info(f"Index '{index_name}' already exists")
+            # Initialize Pinecone
+            from pinecone import Pinecone
+            pc = Pinecone(api_key=api_key)
+            logger.info("Pinecone initialized successfully")
+        
+            # Check if index exists
+            indexes = pc.list_indexes()
+        
+            # Create index if it doesn't exist
+            if index_name not in indexes.names():
+                create_serverless_index(pc, index_name, dimension, DEFAULT_INDEX_METRIC, timeout=args.wait_time)
+            else:
+                logger.info(f"Index '{index_name}' already exists")
+        
+            # Connect to the index
+            index = PineconeBackend(api_key=api_key, index_name=index_name)
+            logger.info(f"Connected to index '{index_name}'")
         
-        # Connect to the index
-        index = pc.Index(index_name)
-        logger.info(f"Connected to index '{index_name}'")
+        # Check the index against the model once, before anything is written:
+        # a mismatched index rejects every batch
+        rebuilt = False
+        try:
+            schema = check_index_schema(index, dimension, DEFAULT_INDEX_METRIC)
+            logger.info(f"Index schema matches the embedding model: dimension={schema.get('dimension')}, "
+                        f"metric={schema.get('metric')}")
+        except IndexSchemaError as e:
+            if not args.rebuild_index:
+                logger.error(f"{str(e)}. Run again with --rebuild-index to delete and recreate the index")
+                return 1
+            logger.warning(f"{str(e)}, rebuilding the index")
+            index.recreate(dimension, DEFAULT_INDEX_METRIC)
+            bump_index_version(index_version_path)
+            rebuilt = True
         
         # Get initial stats
         initial_stats = index.describe_index_stats()
         logger.info(f"Initial index stats: {initial_stats}")
         
-        # Initialize the embedding model
-        model = SentenceTransformer('all-MiniLM-L6-v2')
-        logger.info("Embedding model initialized")
+        # BM25 index over the same chunks, for hybrid retrieval
+        lexical_index = BM25Index(args.lexical_index_path) if args.lexical_index_path else None
+        if rebuilt and lexical_index is not None:
+            # It describes the chunks of the previous index, which are gone
+            lexical_index.clear()
+            lexical_index.flush()
+            logger.info(f"Cleared BM25 index {args.lexical_index_path} of the previous index")
+        
+        # One writer pool and rate limiter for the whole run
+        upserter = BatchUpserter(
+            index,
+            batch_size=args.batch_size,
+            max_workers=args.upsert_workers,
+            min_delay=args.upload_delay
+        )
         
         # Get list of PDF files
         pdf_files = [f for f in os.listdir(args.directory) if f.lower().endswith('.pdf')]
@@ -276,49 +285,198 @@ def main():
         
         # Process each PDF file
         total_chunks_uploaded = 0
-        for i, pdf_file in enumerate(pdf_files):
-            logger.info(f"Processing file {i+1}/{len(pdf_files)}: {pdf_file}")
-            pdf_path = os.path.join(args.directory, pdf_file)
+        run_start_time = time.time()
+        extractor = PDFExtractor(workers=args.workers)
+        cache = None if args.no_cache else IngestCache(args.cache_dir, cache_max_mb * 1024 * 1024)
+        pdf_paths = [os.path.join(args.directory, pdf_file) for pdf_file in pdf_files]
+        
+        # In sync mode, skip PDFs the manifest already holds and drop documents
+        # that have disappeared from the directory
+        manifest = None
+        if rebuilt and os.path.exists(args.manifest):
+            # The rebuilt index is empty, so the manifest no longer describes it
+            os.remove(args.manifest)
+            logger.info(f"Removed manifest {args.manifest} of the previous index")
+        if args.sync:
+            manifest = IndexManifest(args.manifest)
+            params = params_key(args.chunk_size, args.chunk_overlap, model_key, args.chunk_unit)
+            if args.max_pdfs is None:
+                for source in manifest.removed_sources(pdf_files):
+                    deleted = delete_ids(index, sorted(manifest.chunk_ids(source)))
+                    if lexical_index is not None:
+                        lexical_index.remove_source(source)
+                    mark_index_changed(index, lexical_index)
+                    manifest.remove(source)
+                    manifest.save()
+                    logger.info(f"Deleted {deleted} chunks of removed document {source}")
+            pdf_paths = [pdf_path for pdf_path in pdf_paths
+                         if not manifest.is_unchanged(os.path.basename(pdf_path), file_sha256(pdf_path), params)]
+            logger.info(f"{len(pdf_paths)} of {len(pdf_files)} PDF files changed since the last sync")
+        
+        # Durable record of this run's progress, so a crashed or failed run can
+        # be continued with --resume instead of starting over
+        target = args.local_index_path if args.backend == 'local' else index_name
+        checkpoint = IngestCheckpoint(
+            args.checkpoint,
+            params=f"{params_key(args.chunk_size, args.chunk_overlap, model_key, args.chunk_unit)}"
+                   f"|{'sync' if args.sync else 'full'}|{args.backend}:{target}",
+            resume=args.resume and not rebuilt
+        )
+        if args.resume and not rebuilt:
+            remaining = [pdf_path for pdf_path in pdf_paths
+                         if not checkpoint.is_complete(os.path.basename(pdf_path), file_sha256(pdf_path))]
+            logger.info(f"Skipping {len(pdf_paths) - len(remaining)} PDF files completed by the interrupted run")
+            pdf_paths = remaining
+        
+        # Plan which chunks of each document to write: in sync mode only chunks
+        # with new content, otherwise all of them, reusing cached embeddings
+        # when the PDF and chunking parameters are unchanged. When resuming,
+        # chunks the interrupted run already upserted are left out
+        def plan(document):
+            if manifest is not None:
+                chunk_ids, positions, stale_ids = diff_document(manifest, document.source, document.chunks)
+                document.context.update(chunk_ids=chunk_ids, stale_ids=stale_ids)
+            else:
+                if cache is not None and document.content_hash is not None:
+                    cache_key = embedding_cache_key(document.content_hash, args.chunk_size, args.chunk_overlap,
+                                                    model_key, args.chunk_unit)
+                    document.context['cache_key'] = cache_key
+                    embeddings = cache.get_embeddings(cache_key, expected_rows=len(document.chunks))
+                    if embeddings is not None:
+                        logger.info(f"Using {len(document.chunks)} cached embeddings for {document.source}")
+                        document.use_embeddings(embeddings)
+                positions = unique_positions(document)
             
-            # Extract text from PDF
-            text = extract_text_from_pdf(pdf_path)
-            if not text:
+            done = checkpoint.done_ids(document.source, document.content_hash)
+            if done:
+                remaining = [position for position in positions
+                             if make_chunk_id(document.source, document.chunks[position]) not in done]
+                document.context['resumed'] = len(positions) - len(remaining)
+                logger.info(f"Resuming {document.source}: {document.context['resumed']} chunks already upserted")
+                positions = remaining
+            return positions
+        
+        # Pinecone upserts are durable once acknowledged, so they are checkpointed
+        # batch by batch; a local index only persists when it is flushed after
+        # each document, so it is checkpointed per document
+        def checkpoint_batch(batch):
+            if batch.positions and batch.error is None:
+                document = batch.document
+                checkpoint.record_batch(document.source, document.content_hash,
+                                        [make_chunk_id(document.source, document.chunks[position])
+                                         for position in batch.positions])
+        
+        # Extraction, chunking, embedding and upserts overlap, connected by
+        # bounded queues so a large corpus never piles up in memory
+        pipeline = build_ingest_pipeline(
+            chunk_fn=lambda text: chunk_text(text, args.chunk_size, args.chunk_overlap, tokenizer=tokenizer),
+            embed_fn=lambda texts: encode_batched(model, texts, batch_size=args.embed_batch_size),
+            upsert_fn=upserter.upsert_batch,
+            plan_fn=plan,
+            batch_size=args.batch_size,
+            embed_workers=args.embed_workers,
+            upsert_workers=args.upsert_workers,
+            queue_size=args.queue_size
+        )
+        
+        # Unchanged PDFs come from the cache; the rest are extracted in parallel
+        # and flow through the pipeline in the order they finish
+        documents = iter_documents_cached(extractor, pdf_paths, cache, max_pending=max(2, extractor.workers))
+        incomplete_files = 0
+        on_batch = None if isinstance(index, LocalBackend) else checkpoint_batch
+        for i, document in enumerate(run_ingest(pipeline, documents, on_batch=on_batch)):
+            pdf_file = document.source
+            logger.info(f"Processed file {i+1}/{len(pdf_paths)}: {pdf_file}")
+            
+            if not document.extracted:
                 logger.error(f"Failed to extract text from {pdf_file}")
+                incomplete_files += 1
                 continue
             
-            # Chunk the text
-            chunks = chunk_text(text, args.chunk_size, args.chunk_overlap)
-            logger.info(f"Created {len(chunks)} chunks from {pdf_file}")
+            total_chunks_uploaded += document.uploaded
+            
+            if manifest is not None:
+                chunk_ids = document.context['chunk_ids']
+                stale_ids = document.context['stale_ids']
+                if document.uploaded:
+                    mark_index_changed(index)
+                
+                if document.failed:
+                    # Keep the old manifest entry so the next sync retries this document
+                    logger.error(f"Some chunks of {pdf_file} failed to upload, not recording it in the manifest")
+                    incomplete_files += 1
+                    continue
+                
+                if stale_ids:
+                    delete_ids(index, stale_ids)
+                update_lexical_index(lexical_index, document.chunks, pdf_file)
+                mark_index_changed(index, lexical_index)
+                manifest.update(pdf_file, document.content_hash, params, chunk_ids)
+                manifest.save()
+                checkpoint.record_complete(pdf_file, document.content_hash)
+                logger.info(f"Synced {pdf_file}: {document.uploaded} upserted, {len(stale_ids)} deleted, "
+                            f"{len(chunk_ids) - document.uploaded} unchanged")
+                continue
             
-            # Upload chunks in batches
-            chunks_uploaded = batch_upload_chunks(
-                index=index,
-                chunks=chunks,
-                pdf_file=pdf_file,
-                model=model,
-                batch_size=args.batch_size,
-                upload_delay=args.upload_delay
-            )
+            logger.info(f"Completed processing {pdf_file}: {document.uploaded}/{len(document.positions)} "
+                        f"chunks uploaded successfully")
             
-            total_chunks_uploaded += chunks_uploaded
+            # Cache the embeddings of the whole document for the next run
+            cache_key = document.context.get('cache_key')
+            if cache_key is not None and not document.precomputed:
+                embeddings = document.embedding_matrix()
+                if embeddings is not None:
+                    cache.put_embeddings(cache_key, embeddings)
+            
+            # Let running servers know their cached retrieval results are stale
+            if document.uploaded or document.context.get('resumed'):
+                update_lexical_index(lexical_index, document.chunks, pdf_file)
+                mark_index_changed(index, lexical_index)
+            
+            if document.failed:
+                logger.error(f"{document.failed} chunks of {pdf_file} failed to upload: {document.errors[0]}")
+                incomplete_files += 1
+            else:
+                checkpoint.record_complete(pdf_file, document.content_hash)
             
             # Log progress
-            logger.info(f"Progress: {i+1}/{len(pdf_files)} files processed, {total_chunks_uploaded} total chunks uploaded")
+            logger.info(f"Progress: {i+1}/{len(pdf_paths)} files processed, {total_chunks_uploaded} total chunks uploaded")
             
             # Get intermediate stats every 5 files or for the last file
-            if (i+1) % 5 == 0 or i == len(pdf_files) - 1:
+            if (i+1) % 5 == 0 or i == len(pdf_paths) - 1:
                 stats = index.describe_index_stats()
                 logger.info(f"Intermediate index stats: {stats}")
+                pipeline.log_stats(logger)
+        
+        extractor.close()
+        
+        if incomplete_files:
+            checkpoint.close()
+            logger.warning(f"{incomplete_files} PDF files were not fully ingested; run again with --resume "
+                           f"to retry only what failed")
+        else:
+            checkpoint.clear()
         
         # Get final stats
         final_stats = index.describe_index_stats()
         logger.info(f"Final index stats: {final_stats}")
         
+        logger.info("Pipeline stage stats:")
+        pipeline.log_stats(logger)
         logger.info(f"Upload process completed successfully. Total chunks uploaded: {total_chunks_uploaded}")
+        elapsed = time.time() - run_start_time
+        if elapsed > 0:
+            logger.info(f"Overall throughput: {total_chunks_uploaded / elapsed:.1f} chunks/sec over {elapsed:.1f}s")
         
+    except IndexSchemaError as e:
+        # Raised by the upserter if the index is changed under a running upload
+        logger.error(f"Index schema mismatch: {str(e)}. Run again with --rebuild-index to recreate the index")
+        return 1
     except Exception as e:
         logger.error(f"Error: {str(e)}")
         logger.error(traceback.format_exc())
+        if checkpoint is not None:
+            logger.error(f"Progress so far is kept in {args.checkpoint}; run again with --resume to continue")
         return 1
     
     return 0
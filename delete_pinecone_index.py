@@ -1,13 +1,20 @@
 import os
+import sys
 from dotenv import load_dotenv
 from pinecone import Pinecone
 
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.utils.index_version import bump_index_version
+
 # Load environment variables
 load_dotenv()
 
 # Get Pinecone credentials from environment variables
 api_key = os.environ.get('PINECONE_API_KEY')
 index_name = os.environ.get('PINECONE_INDEX_NAME', 'sfold')
+index_version_path = os.environ.get('INDEX_VERSION_PATH', f'.index_version_{index_name}')
 
 # Initialize Pinecone
 pc = Pinecone(api_key=api_key)
@@ -20,6 +27,7 @@ print(f"Available indexes: {indexes.names()}")
 if index_name in indexes.names():
     print(f"Deleting index '{index_name}'")
     pc.delete_index(index_name)
+    bump_index_version(index_version_path)
     print(f"Index '{index_name}' deleted successfully")
 else:
     print(f"Index '{index_name}' does not exist") 
\ No newline at end of file
@@ -0,0 +1,52 @@
+import os
+import sys
+import logging
+
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.config.config import (FLASK_HOST, FLASK_PORT, SERVER_WORKERS, SERVER_THREADS, SERVER_TIMEOUT,
+                               TORCH_THREADS_PER_WORKER)
+from app.utils.memory import process_memory
+
+# Production server: python main.py --api --production
+# (or: gunicorn -c gunicorn.conf.py app.wsgi:app)
+
+bind = f"{FLASK_HOST}:{FLASK_PORT}"
+workers = SERVER_WORKERS
+threads = SERVER_THREADS
+worker_class = 'gthread'
+timeout = SERVER_TIMEOUT
+graceful_timeout = 30
+
+# Load the app, and with it the embedding model and index, once in the
+# master before forking so workers share those pages copy-on-write
+preload_app = True
+
+logger = logging.getLogger('gunicorn.error')
+
+def _log_memory(label, pid=None):
+    memory = process_memory(pid)
+    if memory is not None:
+        logger.info(f"{label} memory: {memory}")
+
+def when_ready(server):
+    _log_memory("Master (after preload)")
+
+def post_fork(server, worker):
+    # Split the cores between workers instead of every worker using all of them.
+    # An ONNX Runtime model preloaded in the master gets a fresh session here,
+    # since its thread pool does not survive the fork
+    from app.controllers.vector_controller import get_vector_db, is_vector_db_ready
+    from app.utils.embedding import set_embedding_threads
+
+    torch_threads = TORCH_THREADS_PER_WORKER or max(1, (os.cpu_count() or 1) // workers)
+    model = get_vector_db().embedding_model if is_vector_db_ready() else None
+    set_embedding_threads(torch_threads, model)
+    logger.info(f"Worker {worker.pid} started with {torch_threads} embedding threads")
+
+def post_worker_init(worker):
+    _log_memory(f"Worker {worker.pid}")
+
+def worker_exit(server, worker):
+    _log_memory(f"Worker {worker.pid} (exiting)")
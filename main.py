@@ -18,36 +18,50 @@ def main():
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='sFold Expert RAG Agent')
     parser.add_argument('--api', action='store_true', help='Start the API server')
+    parser.add_argument('--async', dest='async_mode', action='store_true',
+                        help='With --api, serve the same API from the async (ASGI) server')
+    parser.add_argument('--production', action='store_true',
+                        help='With --api, run the multi-worker gunicorn server (see gunicorn.conf.py)')
     parser.add_argument('--query', '-q', help='Test a query against the vector database (e.g., "What are microRNA sponges?")')
     parser.add_argument('--k', type=int, default=3, help='Number of chunks to retrieve for a query')
     args = parser.parse_args()
     
     if args.api:
         # Start the API server
-        print("Starting the API server...")
-        from app.server import main as server_main
+        if args.production:
+            # Replace this process with gunicorn, which preloads app.wsgi and forks the workers
+            print("Starting the production API server...")
+            base_dir = os.path.dirname(os.path.abspath(__file__))
+            os.chdir(base_dir)
+            os.execvp(sys.executable, [sys.executable, '-m', 'gunicorn',
+                                       '-c', os.path.join(base_dir, 'gunicorn.conf.py'), 'app.wsgi:app'])
+        elif args.async_mode:
+            print("Starting the async API server...")
+            from app.async_server import main as server_main
+        else:
+            print("Starting the API server...")
+            from app.server import main as server_main
         return server_main()
     
     elif args.query:
         # Test a query
         print(f"Testing query: {args.query}")
-        from app.controllers.rag_controller import ask_question, get_context
+        from app.controllers.rag_controller import answer_with_context
         
-        # Get context chunks
-        print("\nRetrieving context chunks...")
-        context_chunks = get_context(args.query, k=args.k)
+        # Retrieve context chunks once and answer from them
+        print("\nRetrieving context chunks and getting direct answer...")
+        result = answer_with_context(args.query, k=args.k)
         
-        print(f"\nRetrieved {len(context_chunks)} context chunks:")
-        for i, chunk in enumerate(context_chunks):
-            print(f"\n--- Chunk {i+1} ---")
-            print(chunk[:500] + "..." if len(chunk) > 500 else chunk)
+        if result["error"]:
+            print(f"\n{result['error']}")
         
-        # Get direct answer
-        print("\nGetting direct answer...")
-        answer = ask_question(args.query)
+        print(f"\nRetrieved {len(result['chunks'])} context chunks:")
+        for i, chunk in enumerate(result["chunks"]):
+            print(f"\n--- Chunk {i+1} (score {chunk.score:.3f}) from {chunk.source}, chunk {chunk.chunk_index} ---")
+            print(chunk.text[:500] + "..." if len(chunk.text) > 500 else chunk.text)
         
         print("\nDirect answer:")
-        print(answer)
+        print(result["answer"])
         
         return 0
     
@@ -58,6 +72,8 @@ def main():
         # Also suggest some example queries
         print("\nExample usage:")
         print("  Start API server:   python main.py --api")
+        print("  Async API server:   python main.py --api --async")
+        print("  Production server:  python main.py --api --production")
         print("  Query examples:")
         print("    python main.py --query \"What are microRNA sponges?\"")
         print("    python main.py --query \"Explain the MicroRNA inhibition technique\" --k 5")
@@ -1,7 +1,14 @@
 import os
+import sys
 from pinecone import Pinecone
 from dotenv import load_dotenv
 
+# Add the current directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.utils.embedding import DEFAULT_EMBEDDING_MODEL, DEFAULT_EMBEDDING_DIMENSION
+from app.utils.backends import DEFAULT_INDEX_METRIC
+
 # Load environment variables
 load_dotenv()
 
@@ -35,9 +42,16 @@ try:
         stats = index.describe_index_stats()
         print(f"Index stats: {stats}")
         
-        # Test a simple query with a random vector
+        # The index must match the embedding model, or every upsert and query is rejected
+        description = pc.describe_index(index_name)
+        print(f"Index dimension: {description.dimension}, metric: {description.metric}")
+        if description.dimension != DEFAULT_EMBEDDING_DIMENSION or description.metric != DEFAULT_INDEX_METRIC:
+            print(f"Index does not match {DEFAULT_EMBEDDING_MODEL} ({DEFAULT_EMBEDDING_DIMENSION} dimensions, "
+                  f"{DEFAULT_INDEX_METRIC}); recreate it with: python create_pinecone_index.py --rebuild-index")
+        
+        # Test a simple query with a random vector of the model's dimension
         import numpy as np
-        query_vector = np.random.rand(768).tolist()  # 768 dimensions for all-MiniLM-L6-v2
+        query_vector = np.random.rand(DEFAULT_EMBEDDING_DIMENSION).tolist()
         
         results = index.query(
             vector=query_vector,
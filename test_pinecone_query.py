@@ -1,9 +1,6 @@
-import os
 import sys
 import logging
 from dotenv import load_dotenv
-from pinecone import Pinecone
-from sentence_transformers import SentenceTransformer
 
 # Configure logging
 logging.basicConfig(
@@ -15,63 +12,24 @@ logger = logging.getLogger('pinecone_query')
 # Load environment variables
 load_dotenv()
 
-# Get Pinecone credentials from environment variables
-api_key = os.environ.get('PINECONE_API_KEY')
-index_name = os.environ.get('PINECONE_INDEX_NAME', 'sfold')
+from app.utils.vector import PineconeVectorDB
+from app.utils.errors import VectorStoreError
 
 def query_pinecone(query_text, k=5):
     """
-    Query the Pinecone vector database
+    Query the vector database through the same path the API uses
     
     Args:
         query_text: The query text
         k: Number of results to return
         
     Returns:
-        List of relevant text chunks
+        List of RetrievedChunk results above the relevance threshold
     """
     try:
-        logger.info(f"Querying Pinecone with: '{query_text}', k={k}")
-        
-        # Initialize Pinecone
-        pc = Pinecone(api_key=api_key)
-        logger.info("Pinecone initialized successfully")
-        
-        # Connect to the index
-        index = pc.Index(index_name)
-        logger.info(f"Connected to index '{index_name}'")
-        
-        # Initialize the embedding model
-        model = SentenceTransformer('all-MiniLM-L6-v2')  # This model produces 384-dimensional embeddings
-        logger.info("Embedding model initialized")
-        
-        # Create embedding for the query
-        query_embedding = model.encode(query_text).tolist()
-        
-        # Query Pinecone
-        results = index.query(
-            vector=query_embedding,
-            top_k=k,
-            include_metadata=True
-        )
-        
-        # Extract text from metadata
-        chunks = []
-        for match in results['matches']:
-            text = match['metadata'].get('text', '')
-            source = match['metadata'].get('source', 'unknown')
-            score = match['score']
-            chunks.append({
-                'text': text,
-                'source': source,
-                'score': score
-            })
-        
-        logger.info(f"Retrieved {len(chunks)} chunks from Pinecone")
-        return chunks
-        
-    except Exception as e:
-        logger.error(f"Error querying Pinecone: {str(e)}")
+        return PineconeVectorDB().query(query_text, k)
+    except VectorStoreError as e:
+        logger.error(f"Error querying vector store: {str(e)}")
         return []
 
 def main():
@@ -92,8 +50,8 @@ def main():
     
     print(f"\nFound {len(results)} relevant chunks:")
     for i, result in enumerate(results):
-        print(f"\n--- Result {i+1} (Score: {result['score']:.4f}) from {result['source']} ---")
-        print(result['text'])
+        print(f"\n--- Result {i+1} (Score: {result.score:.4f}) from {result.source}, chunk {result.chunk_index} [{result.id}] ---")
+        print(result.text)
     
     return 0
 
@@ -9,24 +9,31 @@ from dotenv import load_dotenv
 # Add the current directory to the Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from app.utils.vector import PineconeVectorDB
-from app.config.config import PINECONE_API_KEY, PINECONE_ENVIRONMENT, PINECONE_INDEX_NAME
+from app.config.config import (PINECONE_API_KEY, PINECONE_ENVIRONMENT, PINECONE_INDEX_NAME,
+                               INGEST_CACHE_DIR, INDEX_MANIFEST_PATH, INGEST_CHECKPOINT_PATH)
+from app.utils.embedding import DEFAULT_EMBED_BATCH_SIZE
+from app.utils.upsert import DEFAULT_UPSERT_BATCH_SIZE, DEFAULT_UPSERT_WORKERS
+from app.utils.chunking import CHUNK_UNITS
+from app.utils.errors import IndexSchemaError
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('upload_pdfs.log')
-    ]
-)
 logger = logging.getLogger('upload_script')
 
 def main():
     """
     Main entry point for the PDF upload script
     """
+    # Logging and the vector DB (which loads torch) are set up here rather than
+    # at import time: spawned PDF extraction workers re-import this script
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(),
+            logging.FileHandler('upload_pdfs.log')
+        ]
+    )
+    from app.utils.vector import PineconeVectorDB
+    
     # Load environment variables
     load_dotenv()
     
@@ -34,9 +41,22 @@ def main():
     parser = argparse.ArgumentParser(description='Upload PDF files to the Pinecone vector database')
     parser.add_argument('--directory', '-d', help='Directory containing PDF files', default='sFold-Data')
     parser.add_argument('--file', '-f', help='Single PDF file to upload')
-    parser.add_argument('--chunk-size', type=int, default=600, help='Size of text chunks in characters')
-    parser.add_argument('--chunk-overlap', type=int, default=150, help='Overlap between chunks in characters')
-    parser.add_argument('--upload-delay', type=float, default=2.0, help='Delay between uploads in seconds')
+    parser.add_argument('--chunk-size', type=int, default=600, help='Size of text chunks in --chunk-unit')
+    parser.add_argument('--chunk-overlap', type=int, default=150, help='Overlap between chunks in --chunk-unit')
+    parser.add_argument('--chunk-unit', choices=CHUNK_UNITS, default='chars',
+                        help="Measure chunks in characters or in embedding model tokens (e.g. --chunk-size 254 --chunk-overlap 32)")
+    parser.add_argument('--embed-batch-size', type=int, default=DEFAULT_EMBED_BATCH_SIZE, help='Number of chunks embedded per forward pass')
+    parser.add_argument('--upload-delay', type=float, default=0.0, help='Minimum delay between upsert requests in seconds')
+    parser.add_argument('--upsert-batch-size', type=int, default=DEFAULT_UPSERT_BATCH_SIZE, help='Number of vectors sent per upsert request')
+    parser.add_argument('--upsert-workers', type=int, default=DEFAULT_UPSERT_WORKERS, help='Number of concurrent upsert requests')
+    parser.add_argument('--workers', type=int, default=None, help='Number of processes for PDF text extraction (default: CPU count)')
+    parser.add_argument('--cache-dir', default=INGEST_CACHE_DIR, help='Directory of the extraction/embedding cache')
+    parser.add_argument('--no-cache', action='store_true', help='Re-extract and re-embed every PDF without using the cache')
+    parser.add_argument('--sync', action='store_true', help='Only upsert new/changed chunks of the directory and delete stale ones')
+    parser.add_argument('--manifest', default=INDEX_MANIFEST_PATH, help='Path to the local index manifest used by --sync')
+    parser.add_argument('--resume', action='store_true', help='Continue an interrupted upload: skip completed files and chunks, retry the rest')
+    parser.add_argument('--checkpoint', default=INGEST_CHECKPOINT_PATH, help='Path to the progress checkpoint used by --resume')
+    parser.add_argument('--rebuild-index', action='store_true', help='Delete and recreate the index if its dimension or metric does not match the embedding model')
     parser.add_argument('--skip-on-error', action='store_true', help='Skip files that fail completely')
     parser.add_argument('--verbose', '-v', action='store_true', help='Enable verbose logging')
     args = parser.parse_args()
@@ -50,8 +70,8 @@ def main():
     
     try:
         logger.info(f"Starting upload at {time.strftime('%Y-%m-%d %H:%M:%S')}")
-        logger.info(f"Using chunking settings: chunk_size={args.chunk_size}, chunk_overlap={args.chunk_overlap}")
-        logger.info(f"Using upload_delay={args.upload_delay}s between uploads")
+        logger.info(f"Using chunking settings: chunk_size={args.chunk_size}, chunk_overlap={args.chunk_overlap} {args.chunk_unit}")
+        logger.info(f"Using upload_delay={args.upload_delay}s, upsert_batch_size={args.upsert_batch_size}, upsert_workers={args.upsert_workers}")
         
         # Initialize vector database client with command line parameters
         vector_db = PineconeVectorDB(
@@ -60,22 +80,56 @@ def main():
             index_name=PINECONE_INDEX_NAME,
             chunk_size=args.chunk_size,
             chunk_overlap=args.chunk_overlap,
-            upload_delay=args.upload_delay
+            chunk_unit=args.chunk_unit,
+            upload_delay=args.upload_delay,
+            embed_batch_size=args.embed_batch_size,
+            upsert_batch_size=args.upsert_batch_size,
+            upsert_workers=args.upsert_workers,
+            extract_workers=args.workers,
+            cache_dir=None if args.no_cache else args.cache_dir,
+            rebuild_index=args.rebuild_index
         )
         
+        # A rebuilt index is empty, so earlier progress and the sync manifest no longer describe it
+        resume = args.resume
+        if vector_db.index_rebuilt:
+            resume = False
+            if os.path.exists(args.manifest):
+                os.remove(args.manifest)
+                logger.info(f"Removed manifest {args.manifest} of the previous index")
+        
+        # Progress is always recorded, so a failed run can be continued with --resume
+        checkpoint = vector_db.open_checkpoint(args.checkpoint, resume=resume, mode='sync' if args.sync else 'full')
+        
         if args.file:
             # Upload a single file
             logger.info(f"Uploading file: {args.file}")
-            results = vector_db.upload_pdf(args.file)
+            results = vector_db.upload_pdf(args.file, checkpoint=checkpoint)
             
             # Count successful and failed chunks
             success_count = sum(1 for chunk_result in results if 'success' in chunk_result)
             error_count = len(results) - success_count
+            incomplete = error_count > 0
             
             logger.info(f"Upload complete for file: {args.file}")
             logger.info(f"Successfully uploaded {success_count} chunks")
             logger.info(f"Failed to upload {error_count} chunks")
             
+        elif args.sync:
+            # Write only the difference between the directory and the index
+            logger.info(f"Syncing PDF files in directory: {args.directory}")
+            results = vector_db.sync_directory(args.directory, manifest_path=args.manifest, checkpoint=checkpoint)
+            
+            success_count = sum(r.get('upserted', 0) for r in results.values())
+            deleted_count = sum(r.get('deleted', 0) for r in results.values())
+            unchanged_count = sum(r.get('unchanged', 0) for r in results.values())
+            failed_files = [name for name, r in results.items() if 'error' in r]
+            
+            logger.info(f"Sync complete. {success_count} chunks upserted, {deleted_count} deleted, {unchanged_count} unchanged")
+            if failed_files:
+                logger.warning(f"Failed to sync {len(failed_files)} files: {', '.join(failed_files)}")
+            incomplete = bool(failed_files)
+            
         else:
             # Upload all PDF files in the directory
             logger.info(f"Uploading all PDF files in directory: {args.directory}")
@@ -87,7 +141,7 @@ def main():
             logger.info(f"Found {total_files} PDF files to process")
             
             # Process each file
-            results = vector_db.upload_directory(args.directory, skip_on_error=args.skip_on_error)
+            results = vector_db.upload_directory(args.directory, skip_on_error=args.skip_on_error, checkpoint=checkpoint)
             
             # Count successful and failed chunks
             success_count = 0
@@ -106,10 +160,23 @@ def main():
             logger.info(f"Upload complete. Processed {processed_files}/{total_files} files.")
             logger.info(f"Successfully uploaded {success_count} chunks")
             logger.info(f"Failed to upload {error_count} chunks")
+            incomplete = error_count > 0
+        
+        if incomplete:
+            checkpoint.close()
+            logger.warning(f"Some chunks failed; run again with --resume to retry only those (checkpoint: {args.checkpoint})")
+        else:
+            checkpoint.clear()
         
         elapsed_time = time.time() - start_time
         logger.info(f"Total time elapsed: {elapsed_time:.2f} seconds ({elapsed_time/60:.2f} minutes)")
+        if elapsed_time > 0:
+            logger.info(f"Throughput: {success_count / elapsed_time:.1f} chunks/sec")
     
+    except IndexSchemaError as e:
+        # Nothing can be written to this index; stop without retrying
+        logger.error(f"Index schema mismatch: {str(e)}. Run again with --rebuild-index to recreate the index")
+        return 1
     except Exception as e:
         logger.error(f"Error: {str(e)}", exc_info=True)
         return 1